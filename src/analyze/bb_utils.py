@@ -1,26 +1,80 @@
 #!/usr/bin/env python3
 
-from bisect import bisect_right
+import numpy as np
 
+# Basic blocks of read_basic_blocks sorted by address as NumPy arrays: starts, sizes (in instructions)
+# and last_instrs (address of the last instruction). A basic block id is its index in these arrays.
 class basic_block_size:
     def __init__(self, bb):
-        all_basic_block = []
-        max_bb_size = 0
+        all_basic_block = dict() # bb_addr => (size, last instruction address)
         for symbol in bb:
             for bb_addr in bb[symbol]['bb']:
-                all_basic_block.append((bb_addr, len(bb[symbol]['bb'][bb_addr])))
-                max_bb_size = max(max_bb_size, len(bb[symbol]['bb'][bb_addr]))
-        self.max_bb_size = max_bb_size
-        self.all_basic_block = sorted(set(all_basic_block))
+                instrs = bb[symbol]['bb'][bb_addr]
+                all_basic_block[bb_addr] = (len(instrs), max(instrs))
+        bb_addrs = sorted(all_basic_block)
+        self.starts = np.array(bb_addrs, dtype=np.uint64)
+        self.sizes = np.array([all_basic_block[bb_addr][0] for bb_addr in bb_addrs], dtype=np.int64)
+        self.last_instrs = np.array([all_basic_block[bb_addr][1] for bb_addr in bb_addrs], dtype=np.uint64)
+        self.max_bb_size = int(self.sizes.max()) if len(self.sizes) else 0
 
+    # Return an int64 array with the basic block id of each addr, -1 for addrs not inside any basic block
+    def lookup(self, addrs):
+        addrs = np.asarray(addrs, dtype=np.uint64)
+        ids = np.searchsorted(self.starts, addrs, side='right').astype(np.int64) - 1
+        inside = ids >= 0
+        inside[inside] = addrs[inside] <= self.last_instrs[ids[inside]]
+        ids[~inside] = -1
+        return ids
+
+    # Return the totals of counts (the count of each of pcs) per basic block id, pcs not inside any
+    # basic block are dropped. With event_ids (the event index of each of pcs) the result is an
+    # (events, basic blocks) array with one row per event, nr_events rows (default: the largest event index + 1).
+    def aggregate(self, pcs, counts, event_ids=None, nr_events=None):
+        ids = self.lookup(pcs)
+        counts = np.asarray(counts)
+        inside = ids >= 0
+        nr_bbs = len(self.starts)
+        keys = ids[inside]
+        if event_ids is None:
+            nr_events = 1
+        else:
+            event_ids = np.asarray(event_ids, dtype=np.int64)
+            if nr_events is None:
+                nr_events = int(event_ids.max()) + 1 if len(event_ids) else 0
+            keys = event_ids[inside] * nr_bbs + keys
+        if np.issubdtype(counts.dtype, np.integer):
+            # Sum integer counts exactly, bincount weights go through float64
+            totals = np.zeros(nr_events * nr_bbs, dtype=np.int64)
+            np.add.at(totals, keys, counts[inside])
+        else:
+            totals = np.bincount(keys, weights=counts[inside], minlength=nr_events * nr_bbs)
+        return totals if event_ids is None else totals.reshape(nr_events, nr_bbs)
+
+    # Return None if addr is not inside any basic block, e.g. it belongs to a symbol that was not split
     def query_bb_id(self, addr):
-        bb_index = bisect_right(self.all_basic_block, (addr, self.max_bb_size)) - 1
-        if bb_index == -1:
-            return None
-        return bb_index
+        bb_index = int(self.lookup([addr])[0])
+        return None if bb_index == -1 else bb_index
 
     def query_bb_addr(self, id):
-        return self.all_basic_block[id][0]
+        return int(self.starts[id])
 
     def query_bb_size(self, id):
-        return self.all_basic_block[id][1]
+        return int(self.sizes[id])
+
+# perf_extract: {event: {pc: count}} of one ELF file
+# return: {event: {bb_addr: count}} of the basic blocks with samples, the counts of instr_event are
+# divided by the basic block size (the number of times it was executed)
+def perf_to_bb_count(perf_extract, bb_size: basic_block_size, instr_event=None):
+    events = list(perf_extract)
+    pcs = np.concatenate([np.fromiter(perf_extract[event].keys(), dtype=np.uint64, count=len(perf_extract[event]))
+                          for event in events] or [np.zeros(0, dtype=np.uint64)])
+    counts = np.concatenate([np.fromiter(perf_extract[event].values(), dtype=np.int64, count=len(perf_extract[event]))
+                             for event in events] or [np.zeros(0, dtype=np.int64)])
+    event_ids = np.repeat(np.arange(len(events)), [len(perf_extract[event]) for event in events])
+    totals = bb_size.aggregate(pcs, counts, event_ids, len(events))
+    res = dict() # event => bb_addr => count
+    for idx, event in enumerate(events):
+        hit = np.flatnonzero(totals[idx])
+        event_totals = totals[idx][hit] / bb_size.sizes[hit] if event == instr_event else totals[idx][hit]
+        res[event] = dict(zip(bb_size.starts[hit].tolist(), event_totals.tolist()))
+    return res
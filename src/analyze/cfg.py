@@ -9,14 +9,13 @@ skip_file = set()
 
 class CFG:
     def __build_dwarf(self, dwarf):
-        self.dwarf_index = dict()
-        for filename in dwarf:
-            for entry in dwarf[filename]:
-                pc = entry['pc']
-                if pc not in self.dwarf_index:
-                    self.dwarf_index[pc] = []
-                entry['filename'] = filename
-                self.dwarf_index[pc].append(entry)
+        self.dwarf = dwarf
+
+    # Return the line table entries at exactly pc
+    def __dwarf_entries(self, pc):
+        if self.dwarf is None:
+            return []
+        return self.dwarf.entries_at(pc)
     
     def __build_bb_count(self, bb_count, bb_count_a=None):
         self.cmapR = None
@@ -31,6 +30,12 @@ class CFG:
             vmax = math.log2(1 + max([bb_count[bb] for bb in bb_count]))
             self.norm = Normalize(vmin=vmin, vmax=vmax)
 
+    # Return the start of the basic block containing addr, or addr itself if it is outside
+    # the basic blocks that were split (e.g. a call or tail jump into another symbol)
+    def __bb_addr(self, bb_size, addr):
+        bb_id = bb_size.query_bb_id(addr)
+        return bb_size.query_bb_addr(bb_id) if bb_id is not None else addr
+
     def __build_graph(self, trans_edge, bb, bb_size, all_bb, symbol_name):
         self.graph = dict()
         self.in_degree = dict()
@@ -38,27 +43,29 @@ class CFG:
             self.graph[u] = []
             self.in_degree[u] = set()
         for u in trans_edge:
-            u_bb_addr = bb_size.query_bb_addr(bb_size.query_bb_id(u))
+            u_bb_addr = self.__bb_addr(bb_size, u)
             if u_bb_addr in all_bb:
                 for v in trans_edge[u]:
-                    v_bb_addr = bb_size.query_bb_addr(bb_size.query_bb_id(v))
+                    v_bb_addr = self.__bb_addr(bb_size, v)
                     assert v_bb_addr == v, f"v_bb_addr: {v_bb_addr}, v: {v}"
                     if u_bb_addr not in self.graph:
                         self.graph[u_bb_addr] = []
                     edge_info = None
                     # Find last instr that has dwarf in u bb
                     for instr in reversed(bb[symbol_name]['bb'][u_bb_addr]):
-                        if instr in self.dwarf_index:
-                            dwarf_line, dwarf_col = self.dwarf_index[instr][0]['line'], self.dwarf_index[instr][0]['col']
+                        entries = self.__dwarf_entries(instr)
+                        if entries:
+                            dwarf_line, dwarf_col = entries[0]['line'], entries[0]['col']
                             edge_info = str((dwarf_line, dwarf_col))
                             break
                     # Find first instr that has dwarf in v bb
                     if v_bb_addr in bb[symbol_name]['bb']:
                         for instr in bb[symbol_name]['bb'][v_bb_addr]:
-                            if instr in self.dwarf_index:
+                            entries = self.__dwarf_entries(instr)
+                            if entries:
                                 if edge_info is None:
                                     edge_info = ""
-                                dwarf_line, dwarf_col = self.dwarf_index[instr][0]['line'], self.dwarf_index[instr][0]['col']
+                                dwarf_line, dwarf_col = entries[0]['line'], entries[0]['col']
                                 edge_info += "->" + str((dwarf_line, dwarf_col))
                                 break
                     else:
@@ -165,9 +172,7 @@ class CFG:
         res_buf = ""
         if bb_addr in self.bb_symbol:
             for each_pc in self.bb_symbol[bb_addr]:
-                if each_pc not in self.dwarf_index:
-                    continue
-                for each_dwarf in self.dwarf_index[each_pc]:
+                for each_dwarf in self.__dwarf_entries(each_pc):
                     filename, line, col = each_dwarf['filename'], each_dwarf['line'], each_dwarf['col']
                     flags = []
                     for key in each_dwarf:
@@ -252,7 +257,7 @@ class CFG:
         entry = entry[0] # use the first entry node
         self.dom_tree = build_dom_tree(trimmed_graph, entry)
         def dfs_dom_tree(node: dict, u, path: list):
-            bb_addr = bb_size.query_bb_addr(bb_size.query_bb_id(u))
+            bb_addr = self.__bb_addr(bb_size, u)
             self.dom_bb_size[u] = len(bb[symbol_name]['bb'][bb_addr]) if bb_addr in bb[symbol_name]['bb'] else 1
             self.dom_tree_size[u] = self.dom_bb_size[u]
             self.dom_path[u] = path
@@ -1,8 +1,20 @@
 #!/usr/bin/env python3
 
+import mmap
+import os
 import re
+import shutil
+import struct
 import sys
 import subprocess
+import tempfile
+from bisect import bisect_left, bisect_right
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from arch.arch import default_jobs
+from arch.elf_image import elf_image
+from arch.interval import interval_index
+from arch.symtab import symbol_table, STT_FUNC
 
 # return: (symbol, offset)
 def split_target_symbol(symbol_addr):
@@ -24,81 +36,602 @@ def split_target_symbol(symbol_addr):
         else:
             return None
 
-# file: perf.data
-# return: {file: {event: {pc: count}}}
-def extract_perf_from_file(file, aslr_map=None):
-    result = subprocess.run(
-        ['perf', 'script', '-i', file, '--no-demangle', '--full-source-path'],
-        capture_output=True, text=True
-    )
-    lines = result.stdout.splitlines()
+# perf.data reader used by extract_perf_from_file*: 'perf' (run perf script) or 'native' (parse perf.data
+# in-process with perf_data), $PYBINUTILS_PERF_READER. Without a perf binary the native reader is used.
+def perf_reader():
+    reader = os.environ.get('PYBINUTILS_PERF_READER')
+    if reader is None:
+        reader = 'perf' if shutil.which('perf') else 'native'
+    return reader
+
+PERF_MAGIC = b'PERFILE2'
+HEADER_EVENT_DESC = 12
+HEADER_SAMPLE_TIME = 21
+
+PERF_RECORD_MMAP = 1
+PERF_RECORD_COMM = 3
+PERF_RECORD_FORK = 7
+PERF_RECORD_SAMPLE = 9
+PERF_RECORD_MMAP2 = 10
+PERF_RECORD_COMPRESSED = 81
+PERF_RECORD_COMPRESSED2 = 83
+
+PERF_RECORD_MISC_COMM_EXEC = 1 << 13
+PERF_ATTR_FLAG_FREQ = 1 << 10
+PERF_ATTR_FLAG_SAMPLE_ID_ALL = 1 << 18
+
+PERF_SAMPLE_IP = 1 << 0
+PERF_SAMPLE_TID = 1 << 1
+PERF_SAMPLE_TIME = 1 << 2
+PERF_SAMPLE_ADDR = 1 << 3
+PERF_SAMPLE_ID = 1 << 6
+PERF_SAMPLE_CPU = 1 << 7
+PERF_SAMPLE_PERIOD = 1 << 8
+PERF_SAMPLE_STREAM_ID = 1 << 9
+PERF_SAMPLE_IDENTIFIER = 1 << 16
+
+# Names perf gives to PERF_TYPE_HARDWARE (0) and PERF_TYPE_SOFTWARE (1) events, for files without HEADER_EVENT_DESC
+generic_event_names = {
+    (0, 0): 'cycles', (0, 1): 'instructions', (0, 2): 'cache-references', (0, 3): 'cache-misses',
+    (0, 4): 'branches', (0, 5): 'branch-misses', (0, 6): 'bus-cycles', (0, 7): 'stalled-cycles-frontend',
+    (0, 8): 'stalled-cycles-backend', (0, 9): 'ref-cycles',
+    (1, 0): 'cpu-clock', (1, 1): 'task-clock', (1, 2): 'page-faults', (1, 3): 'context-switches',
+    (1, 4): 'cpu-migrations', (1, 5): 'minor-faults', (1, 6): 'major-faults',
+}
+
+# Return the offset of each of the u64 fields of a sample preceding PERF_SAMPLE_READ, {bit: offset}
+def sample_field_offsets(sample_type):
+    offsets = dict()
+    pos = 0
+    for bit, size in ((PERF_SAMPLE_IDENTIFIER, 8), (PERF_SAMPLE_IP, 8), (PERF_SAMPLE_TID, 8), (PERF_SAMPLE_TIME, 8),
+                      (PERF_SAMPLE_ADDR, 8), (PERF_SAMPLE_ID, 8), (PERF_SAMPLE_STREAM_ID, 8), (PERF_SAMPLE_CPU, 8),
+                      (PERF_SAMPLE_PERIOD, 8)):
+        if sample_type & bit:
+            offsets[bit] = pos
+            pos += size
+    return offsets
+
+# Return the distance from the end of a non-sample record to the time in its sample_id_all trailer
+# (TID, TIME, ID, STREAM_ID, CPU, IDENTIFIER fields of sample_type), None when time is not sampled
+def sample_id_time_offset(sample_type):
+    if not sample_type & PERF_SAMPLE_TIME:
+        return None
+    offset = 0
+    for bit in (PERF_SAMPLE_TIME, PERF_SAMPLE_ID, PERF_SAMPLE_STREAM_ID, PERF_SAMPLE_CPU, PERF_SAMPLE_IDENTIFIER):
+        if sample_type & bit:
+            offset += 8
+    return offset
+
+# Return (offset, size) of the section of a header feature of a perf.data buffer, None when it was not recorded.
+# The feature sections are listed after the data in feature bit order.
+def perf_feature_section(buf, feature):
+    data_offset, data_size = struct.unpack_from('<QQ', buf, 40)
+    features = int.from_bytes(buf[72:104], 'little')
+    if not features & (1 << feature):
+        return None
+    section = data_offset + data_size + 16 * bin(features & ((1 << feature) - 1)).count('1')
+    return struct.unpack_from('<QQ', buf, section)
+
+# Samples and memory maps of a perf.data file (perf record output, not pipe mode) parsed from a memory map.
+# events: event names; samples: {'pc', 'period', 'event', 'pid', 'tid', 'time', 'seq'} NumPy arrays, event is the
+# index in events, seq the index of the record in the file, fields the events did not sample are 0 (period: the
+# fixed sample period, or 1);
+# timed: whether records are ordered by time (all events sample time, also in non-sample records), otherwise
+# by seq; the key of a record below is its time or its seq accordingly;
+# mmaps: [(pid, start, end, pgoff, filename, key), ...] of MMAP/MMAP2 records in file order, pid -1 for the kernel;
+# execs: [(pid, key), ...] of exec COMM records; comms: {pid: comm};
+# parents: {child pid: parent pid} and fork_keys: {child pid: key} from FORK records.
+# Compressed records (perf record -z) are not supported.
+class perf_data:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.__parse(buf)
+        finally:
+            buf.close()
+
+    def __parse(self, buf):
+        if len(buf) < 104 or buf[:8] != PERF_MAGIC:
+            raise Exception('Not a perf.data file (or a pipe mode / big endian one)')
+        header_size, attr_size, attrs_offset, attrs_size, data_offset, data_size = struct.unpack_from('<QQQQQQ', buf, 8)
+        # perf_file_attr: perf_event_attr, then the section holding its sample ids
+        attrs = []
+        ids = dict() # sample id => attr index
+        for idx in range(attrs_size // attr_size):
+            offset = attrs_offset + idx * attr_size
+            attr_type, = struct.unpack_from('<I', buf, offset)
+            config, sample_period, sample_type, read_format, flags = struct.unpack_from('<QQQQQ', buf, offset + 8)
+            ids_offset, ids_size = struct.unpack_from('<QQ', buf, offset + attr_size - 16)
+            for sample_id in np.frombuffer(buf, dtype='<u8', count=ids_size // 8, offset=ids_offset).tolist():
+                ids[sample_id] = idx
+            attrs.append({'type': attr_type, 'config': config, 'sample_type': sample_type,
+                          'period': 1 if flags & PERF_ATTR_FLAG_FREQ else sample_period,
+                          'sample_id_all': bool(flags & PERF_ATTR_FLAG_SAMPLE_ID_ALL)})
+        self.events = self.__event_names(buf, attrs)
+        # Non-sample records only carry a time when every event appends the same sample_id_all trailer with it
+        time_offsets = set(sample_id_time_offset(attr['sample_type']) if attr['sample_id_all'] else None for attr in attrs)
+        time_offset = time_offsets.pop() if len(time_offsets) == 1 else None
+        self.timed = time_offset is not None
+        # Walk the records, samples are only located here and decoded below all at once
+        sample_offsets = []
+        sample_seqs = []
+        self.mmaps = []
+        self.execs = []
+        self.comms = dict()
+        self.parents = dict()
+        self.fork_keys = dict()
+        offset = data_offset
+        end = data_offset + data_size
+        seq = 0
+        unpack_header = struct.Struct('<IHH').unpack_from
+        unpack_time = struct.Struct('<Q').unpack_from
+        while offset + 8 <= end:
+            record_type, misc, size = unpack_header(buf, offset)
+            if size < 8:
+                break
+            key = seq
+            if self.timed and record_type != PERF_RECORD_SAMPLE and size >= 8 + time_offset:
+                key, = unpack_time(buf, offset + size - time_offset)
+            if record_type == PERF_RECORD_SAMPLE:
+                sample_offsets.append(offset + 8)
+                sample_seqs.append(seq)
+            elif record_type == PERF_RECORD_MMAP or record_type == PERF_RECORD_MMAP2:
+                pid, tid, start, length, pgoff = struct.unpack_from('<iIQQQ', buf, offset + 8)
+                name_offset = offset + (72 if record_type == PERF_RECORD_MMAP2 else 40)
+                name = buf[name_offset:buf.find(b'\0', name_offset, offset + size)].decode(errors='replace')
+                self.mmaps.append((pid, start, start + length, pgoff, name, key))
+            elif record_type == PERF_RECORD_COMM:
+                pid, tid = struct.unpack_from('<iI', buf, offset + 8)
+                if pid == tid:
+                    self.comms[pid] = buf[offset + 16:buf.find(b'\0', offset + 16, offset + size)].decode(errors='replace')
+                if misc & PERF_RECORD_MISC_COMM_EXEC:
+                    self.execs.append((pid, key))
+            elif record_type == PERF_RECORD_FORK:
+                pid, ppid, tid, ptid, fork_time = struct.unpack_from('<iiiiQ', buf, offset + 8)
+                if pid != ppid:
+                    self.parents[pid] = ppid
+                    self.fork_keys[pid] = fork_time if self.timed else seq
+            elif record_type == PERF_RECORD_COMPRESSED or record_type == PERF_RECORD_COMPRESSED2:
+                raise Exception('Compressed perf.data (perf record -z) is not supported, use PYBINUTILS_PERF_READER=perf')
+            offset += size
+            seq += 1
+        raw = np.frombuffer(buf, dtype=np.uint8)
+        sample_offsets = np.array(sample_offsets, dtype=np.int64)
+        # Return the little endian dtype values at offset shift of the samples at offsets
+        def gather(offsets, shift, dtype):
+            width = np.dtype(dtype).itemsize
+            return raw[(offsets + shift)[:, None] + np.arange(width)].view(np.dtype(dtype).newbyteorder('<')).reshape(-1)
+        nr = len(sample_offsets)
+        sample_types = [attr['sample_type'] for attr in attrs]
+        events = np.zeros(nr, dtype=np.int32)
+        if len(attrs) > 1:
+            # With several events, the sample id tells them apart: PERF_SAMPLE_IDENTIFIER comes first,
+            # PERF_SAMPLE_ID is only at a known place when all events sample the same fields
+            if all(sample_type & PERF_SAMPLE_IDENTIFIER for sample_type in sample_types):
+                id_offset = 0
+            elif all(sample_type == sample_types[0] for sample_type in sample_types) and sample_types[0] & PERF_SAMPLE_ID:
+                id_offset = sample_field_offsets(sample_types[0])[PERF_SAMPLE_ID]
+            else:
+                raise Exception('Cannot tell the events of samples apart')
+            sample_ids = gather(sample_offsets, id_offset, np.uint64)
+            id_keys = np.array(sorted(ids), dtype=np.uint64)
+            id_attrs = np.array([ids[key] for key in sorted(ids)], dtype=np.int32)
+            pos = np.minimum(np.searchsorted(id_keys, sample_ids), len(id_keys) - 1)
+            events = np.where(id_keys[pos] == sample_ids, id_attrs[pos], 0).astype(np.int32)
+        self.samples = {
+            'pc': np.zeros(nr, dtype=np.uint64),
+            'period': np.zeros(nr, dtype=np.uint64),
+            'event': events,
+            'pid': np.zeros(nr, dtype=np.int32),
+            'tid': np.zeros(nr, dtype=np.int32),
+            'time': np.zeros(nr, dtype=np.uint64),
+            'seq': np.array(sample_seqs, dtype=np.int64),
+        }
+        for idx, attr in enumerate(attrs):
+            rows = np.flatnonzero(events == idx)
+            if len(rows) == 0:
+                continue
+            offsets = sample_offsets[rows]
+            fields = sample_field_offsets(attr['sample_type'])
+            for name, bit, shift, dtype in (('pc', PERF_SAMPLE_IP, 0, np.uint64), ('pid', PERF_SAMPLE_TID, 0, np.int32),
+                                            ('tid', PERF_SAMPLE_TID, 4, np.int32), ('time', PERF_SAMPLE_TIME, 0, np.uint64),
+                                            ('period', PERF_SAMPLE_PERIOD, 0, np.uint64)):
+                if bit in fields:
+                    self.samples[name][rows] = gather(offsets, fields[bit] + shift, dtype)
+            if PERF_SAMPLE_PERIOD not in fields:
+                self.samples['period'][rows] = attr['period']
+        del raw
+
+    # Event names from HEADER_EVENT_DESC, or perf's generic names for the event type and config
+    def __event_names(self, buf, attrs):
+        names = [generic_event_names.get((attr['type'], attr['config']), f"type{attr['type']}/config{attr['config']:#x}")
+                 for attr in attrs]
+        section = perf_feature_section(buf, HEADER_EVENT_DESC)
+        if section is None:
+            return names
+        offset, size = section
+        nr_events, desc_attr_size = struct.unpack_from('<II', buf, offset)
+        pos = offset + 8
+        for idx in range(nr_events):
+            pos += desc_attr_size
+            nr_ids, name_len = struct.unpack_from('<II', buf, pos)
+            name = buf[pos + 8:pos + 8 + name_len].split(b'\0')[0].decode(errors='replace')
+            pos += 8 + name_len + 8 * nr_ids
+            if idx < len(names) and name:
+                names[idx] = name
+        return names
+
+    # Return (dsos, dso_ids, addrs): the DSO of each sample as an index in dsos ('[unknown]' when no map covers it)
+    # and its address, translated to the virtual address in the DSO's ELF file when that file can be read,
+    # so addresses of PIE and shared libraries do not depend on where they were loaded.
+    # A sample is attributed to the map covering its pc in the address space of its process at the time of
+    # the sample: the maps of the process and, up to the fork, of its parents, where a later map replaces what
+    # it overlaps and exec starts over; then to the kernel maps.
+    def resolve(self):
+        pcs = self.samples['pc']
+        pids = self.samples['pid']
+        keys = self.samples['time'] if self.timed else self.samples['seq']
+        dsos = ['[unknown]']
+        dso_index = {'[unknown]': 0}
+        kernel = address_space()
+        tasks = dict() # pid => [(key, map (start, end, (start, pgoff, dso id)) or None for exec), ...]
+        for pid, start, end, pgoff, name, key in self.mmaps:
+            if name.startswith('[kernel.kallsyms]'):
+                name = '[kernel.kallsyms]'
+            if name not in dso_index:
+                dso_index[name] = len(dsos)
+                dsos.append(name)
+            if pid == -1:
+                kernel.add(start, end, (start, pgoff, dso_index[name]))
+            else:
+                tasks.setdefault(pid, []).append((key, (start, end, (start, pgoff, dso_index[name]))))
+        for pid, key in self.execs:
+            tasks.setdefault(pid, []).append((key, None))
+        pseudo = np.array([dso.startswith('[') for dso in dsos]) # no file behind the map
+        dso_ids = np.zeros(len(pcs), dtype=np.int32)
+        offsets = pcs.copy() # file offset for file backed maps, pc otherwise
+        resolved = np.zeros(len(pcs), dtype=bool)
+        # Attribute rows to the maps of index covering their pcs
+        def attribute(rows, index):
+            found = index.lookup(pcs[rows])
+            rows = rows[found >= 0]
+            found = found[found >= 0]
+            if len(rows) == 0:
+                return
+            labels = np.array(index.labels, dtype=np.uint64).reshape(-1, 3)
+            map_dso_ids = labels[found, 2].astype(np.int32)
+            dso_ids[rows] = map_dso_ids
+            resolved[rows] = True
+            file_backed = ~pseudo[map_dso_ids]
+            rows = rows[file_backed]
+            found = found[file_backed]
+            offsets[rows] = pcs[rows] - labels[found, 0] + labels[found, 1]
+        # Sweep the samples of each process in time order along the changes of its address space
+        order = np.lexsort((keys, pids))
+        for rows in np.split(order, np.flatnonzero(np.diff(pids[order])) + 1):
+            if len(rows) == 0:
+                continue
+            row_keys = keys[rows]
+            space = address_space()
+            done = 0
+            for key, task_map in self.__task_events(tasks, int(pids[rows[0]])):
+                stop = int(np.searchsorted(row_keys, key, side='left'))
+                if stop > done:
+                    attribute(rows[done:stop], space.index())
+                    done = stop
+                if task_map is None:
+                    space = address_space()
+                else:
+                    space.add(*task_map)
+            if done < len(rows):
+                attribute(rows[done:], space.index())
+        attribute(np.flatnonzero(~resolved), kernel.index())
+        addrs = offsets.copy()
+        for dso_id, dso in enumerate(dsos):
+            rows = np.flatnonzero(dso_ids == dso_id)
+            if dso.startswith('[') or len(rows) == 0:
+                continue
+            segments = elf_load_segments(dso)
+            if segments is None:
+                addrs[rows] = pcs[rows]
+                continue
+            for p_offset, p_filesz, p_vaddr in segments:
+                sel = rows[(offsets[rows] >= p_offset) & (offsets[rows] < p_offset + p_filesz)]
+                addrs[sel] = offsets[sel] - np.uint64(p_offset) + np.uint64(p_vaddr)
+        return (dsos, dso_ids, addrs)
+
+    # Return the maps and execs (see resolve) shaping the address space of pid in key order: those of pid and
+    # those of its parents up to the fork of the child they passed their address space to. At the same key
+    # execs come first, then records in file order.
+    def __task_events(self, tasks, pid):
+        chain = [] # (pid, last key), oldest parent last
+        limit = None
+        while pid not in [each for each, _ in chain]:
+            chain.append((pid, limit))
+            if pid not in self.parents:
+                break
+            fork_key = self.fork_keys[pid]
+            limit = fork_key if limit is None else min(limit, fork_key)
+            pid = self.parents[pid]
+        events = []
+        for pid, limit in reversed(chain):
+            events.extend(event for event in tasks.get(pid, []) if limit is None or event[0] <= limit)
+        events.sort(key=lambda event: (event[0], event[1] is not None))
+        return events
+
+# Non-overlapping [start, end) ranges of an address space, a later add() replaces what it overlaps
+class address_space:
+    def __init__(self):
+        self.starts = [] # start of each of ranges
+        self.ranges = [] # (start, end, label), sorted and non-overlapping
+        self.cached_index = None
+
+    def add(self, start, end, label):
+        if end <= start:
+            return
+        # ranges[lo:hi] overlap [start, end)
+        lo = bisect_right(self.starts, start) - 1
+        if lo < 0 or self.ranges[lo][1] <= start:
+            lo += 1
+        hi = bisect_left(self.starts, end)
+        res = [(start, end, label)]
+        if lo < hi:
+            first_start, first_end, first_label = self.ranges[lo]
+            last_start, last_end, last_label = self.ranges[hi - 1]
+            if first_start < start:
+                res.insert(0, (first_start, start, first_label))
+            if last_end > end:
+                res.append((end, last_end, last_label))
+        self.ranges[lo:hi] = res
+        self.starts[lo:hi] = [each[0] for each in res]
+        self.cached_index = None
+
+    def index(self):
+        if self.cached_index is None:
+            self.cached_index = interval_index(self.ranges)
+        return self.cached_index
+
+# Return [(p_offset, p_filesz, p_vaddr), ...] of the PT_LOAD segments of the ELF at path, or None if it cannot be read
+def elf_load_segments(path):
+    try:
+        image = elf_image(path)
+    except Exception:
+        return None
+    try:
+        return [(segment['p_offset'], segment['p_filesz'], segment['p_vaddr'])
+                for segment in image.elf.iter_segments() if segment['p_type'] == 'PT_LOAD']
+    except Exception:
+        return None
+    finally:
+        image.close()
+
+# Return an interval_index of the functions of the ELF at path labeled by name, or None if it cannot be read
+def elf_function_index(path):
+    try:
+        image = elf_image(path)
+    except Exception:
+        return None
+    try:
+        symtab = symbol_table(image)
+        rows = np.flatnonzero((symtab.types == STT_FUNC) & (symtab.sizes != 0)).tolist()
+        return interval_index((int(symtab.values[row]), int(symtab.values[row] + symtab.sizes[row]), symtab.name(row))
+                              for row in rows)
+    except Exception:
+        return None
+    finally:
+        image.close()
+
+# Return {(dso id, addr): (symbol, offset)} for the unique (dso id, addr) pairs of resolve() result
+def symbolize_samples(dsos, dso_ids, addrs):
     res = dict()
+    for dso_id, dso in enumerate(dsos):
+        rows = np.flatnonzero(dso_ids == dso_id)
+        if dso.startswith('[') or len(rows) == 0:
+            continue
+        index = elf_function_index(dso)
+        if index is None:
+            continue
+        uniq = np.unique(addrs[rows])
+        found = index.lookup(uniq)
+        for addr, idx in zip(uniq.tolist(), found.tolist()):
+            if idx >= 0:
+                res[(dso_id, addr)] = (index.labels[idx], addr - int(index.starts[idx]))
+    return res
+
+# Return [(dso id, event, addr, count), ...] summing the periods of the samples of each (dso, event, addr)
+def aggregate_samples(dso_ids, events, addrs, periods):
+    if len(addrs) == 0:
+        return []
+    order = np.lexsort((addrs, events, dso_ids))
+    keys = np.stack([dso_ids[order].astype(np.uint64), events[order].astype(np.uint64), addrs[order]])
+    starts = np.concatenate([[0], np.flatnonzero(np.any(keys[:, 1:] != keys[:, :-1], axis=0)) + 1])
+    counts = np.add.reduceat(periods[order], starts)
+    return list(zip(keys[0, starts].tolist(), keys[1, starts].tolist(), keys[2, starts].tolist(), counts.tolist()))
+
+# extract_perf with perf_data. pcs are addresses in the ELF files of the DSOs (not their runtime addresses),
+# samples outside known functions only count in 'pc'.
+def extract_perf_native(file):
+    data = perf_data(file)
+    dsos, dso_ids, addrs = data.resolve()
+    symbols = symbolize_samples(dsos, dso_ids, addrs)
+    res = {'pc': dict(), 'symbol': dict(), 'symbol_offset': dict(), 'aslr_map': dict()}
+    for (dso_id, pc), target_tuple in symbols.items():
+        res['aslr_map'].setdefault(dsos[dso_id], dict())[pc] = target_tuple
+    for dso_id, event, pc, count in aggregate_samples(dso_ids, data.samples['event'], addrs, data.samples['period']):
+        dso = dsos[dso_id]
+        event = data.events[event]
+        res['pc'].setdefault(dso, dict()).setdefault(event, dict())[pc] = count
+        if (dso_id, pc) not in symbols:
+            continue
+        symbol, offset = symbols[(dso_id, pc)]
+        symbol_counts = res['symbol'].setdefault(dso, dict()).setdefault(event, dict())
+        symbol_counts[symbol] = symbol_counts.get(symbol, 0) + count
+        offset_counts = res['symbol_offset'].setdefault(dso, dict()).setdefault(event, dict()).setdefault(symbol, dict())
+        offset_counts[offset] = offset_counts.get(offset, 0) + count
+    return res
+
+# Pipe buffer size for perf script output
+PERF_PIPE_BUFSIZE = 1 << 20
+# Default number of perf script lines counted before the counts are flushed into the result
+PERF_FLUSH_LINES = 1 << 16
+
+# Yield the lines of perf script output for perf.data file as perf produces them, through a pipe.
+# perf stderr goes to a temporary file (a second pipe could fill up while stdout is read), a perf
+# failure is raised with it once stdout is exhausted.
+def perf_script_lines(file, extra_args=()):
+    cmd = ['perf', 'script', '-i', file, '--no-demangle', '--full-source-path', *extra_args]
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, text=True, bufsize=PERF_PIPE_BUFSIZE)
+        try:
+            yield from proc.stdout
+        finally:
+            proc.stdout.close()
+            returncode = proc.wait()
+        if returncode != 0:
+            stderr.seek(0)
+            message = stderr.read().decode(errors='replace').strip()
+            raise Exception(f"Failed to run {' '.join(cmd)} (exit code {returncode}): {message}")
+
+# Add the counts of pending ({(dso, event, pc hex, symbol_addr): count}) to res, an extract_perf result
+def flush_perf_counts(res, pending):
+    for (dso, event, pc, symbol_addr), freq in pending.items():
+        pc = int(pc, 16)
+        pc_counts = res['pc'].setdefault(dso, dict()).setdefault(event, dict())
+        pc_counts[pc] = pc_counts.get(pc, 0) + freq
+        if symbol_addr == '[unknown]':
+            continue
+        target_tuple = split_target_symbol(symbol_addr)
+        if target_tuple:
+            res['aslr_map'].setdefault(dso, dict())[pc] = target_tuple
+        else:
+            print(f"Warning: Unable to process {symbol_addr}", file=sys.stderr)
+        symbol = symbol_addr
+        offset = 0
+        if '+' in symbol:
+            offset = int(symbol.split('+')[1], 16)
+            symbol = symbol.split('+')[0]
+        symbol_counts = res['symbol'].setdefault(dso, dict()).setdefault(event, dict())
+        symbol_counts[symbol] = symbol_counts.get(symbol, 0) + freq
+        offset_counts = res['symbol_offset'].setdefault(dso, dict()).setdefault(event, dict()).setdefault(symbol, dict())
+        offset_counts[offset] = offset_counts.get(offset, 0) + freq
+
+# Aggregate perf script output lines into an extract_perf result. Lines are counted in a flat dict per
+# distinct sample (dso, event, pc, symbol) which is flushed into the result every flush_lines lines,
+# so memory is bounded by the number of distinct pcs, not by the number of samples.
+def aggregate_perf_script(lines, flush_lines=PERF_FLUSH_LINES):
+    res = {'pc': dict(), 'symbol': dict(), 'symbol_offset': dict(), 'aslr_map': dict()}
+    pending = dict()
+    nr_lines = 0
     for line in lines:
         colon_pos = line.find(":")
         if colon_pos == -1:
             continue
         line_split = line[colon_pos+1:].split()
-        freq = int(line_split[0])
-        event = line_split[1][:-1]
-        pc = int(line_split[2], 16)
-        if aslr_map is not None:
-            symbol_addr = line_split[3]
-            target_tuple = split_target_symbol(symbol_addr)
-            if target_tuple:
-                if file not in aslr_map:
-                    aslr_map[file] = dict()
-                aslr_map[file][pc] = target_tuple
-            else:
-                if symbol_addr != '[unknown]':
-                    print(f"Warning: Unable to process {symbol_addr}", file=sys.stderr)
-        file = line_split[-1].strip()[1:-1]
-        if file not in res:
-            res[file] = dict()
-        if event not in res[file]:
-            res[file][event] = dict()
-        if pc not in res[file][event]:
-            res[file][event][pc] = 0
-        res[file][event][pc] += freq
+        key = (line_split[-1].strip()[1:-1], line_split[1][:-1], line_split[2], line_split[3])
+        pending[key] = pending.get(key, 0) + int(line_split[0])
+        nr_lines += 1
+        if nr_lines >= flush_lines:
+            flush_perf_counts(res, pending)
+            pending = dict()
+            nr_lines = 0
+    flush_perf_counts(res, pending)
+    return res
+
+# perf.data files smaller than this are decoded by a single perf script
+PARALLEL_PERF_MIN_SIZE = 16 << 20
+
+# Return (first, last) sample time in ns from the HEADER_SAMPLE_TIME feature of perf.data,
+# None when it is missing (perf before 4.20, pipe mode or samples without time)
+def perf_time_span(file):
+    with open(file, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        if len(buf) < 104 or buf[:8] != PERF_MAGIC:
+            return None
+        section = perf_feature_section(buf, HEADER_SAMPLE_TIME)
+        if section is None or section[1] < 16:
+            return None
+        first, last = struct.unpack_from('<QQ', buf, section[0])
+    finally:
+        buf.close()
+    if first == 0 or last <= first:
+        return None
+    return (first, last)
+
+# Return perf script --time arguments splitting [first, last] ns into nr disjoint slices.
+# perf includes both ends of a range, so a slice ends 1 ns before the next one starts.
+def perf_time_slices(first, last, nr):
+    bounds = [first + (last + 1 - first) * idx // nr for idx in range(nr + 1)]
+    slices = []
+    for start, end in zip(bounds, bounds[1:]):
+        if end > start:
+            slices.append(f"{start // 10**9}.{start % 10**9:09d},{(end - 1) // 10**9}.{(end - 1) % 10**9:09d}")
+    return slices
+
+# Aggregate the samples of one --time slice of perf.data
+def perf_script_slice(file, time_range, flush_lines=PERF_FLUSH_LINES):
+    return aggregate_perf_script(perf_script_lines(file, ['--time', time_range]), flush_lines)
+
+# Add the counts and ASLR map of other, an extract_perf result, to res
+def merge_perf_counts(res, other):
+    for name in ('pc', 'symbol'):
+        for dso, events in other[name].items():
+            for event, counts in events.items():
+                dst = res[name].setdefault(dso, dict()).setdefault(event, dict())
+                for key, freq in counts.items():
+                    dst[key] = dst.get(key, 0) + freq
+    for dso, events in other['symbol_offset'].items():
+        for event, symbols in events.items():
+            for symbol, offsets in symbols.items():
+                dst = res['symbol_offset'].setdefault(dso, dict()).setdefault(event, dict()).setdefault(symbol, dict())
+                for offset, freq in offsets.items():
+                    dst[offset] = dst.get(offset, 0) + freq
+    for dso, dso_map in other['aslr_map'].items():
+        res['aslr_map'].setdefault(dso, dict()).update(dso_map)
+    return res
+
+# file: perf.data
+# return: {'pc': {file: {event: {pc: count}}},
+#          'symbol': {file: {event: {symbol: count}}},
+#          'symbol_offset': {file: {event: {symbol: {offset: count}}}},
+#          'aslr_map': {file: {pc: (symbol, offset)}}}
+# all from one pass over the samples. perf script output is streamed and aggregated as it arrives,
+# flush_lines: see aggregate_perf_script
+# Recordings of at least PARALLEL_PERF_MIN_SIZE are split into jobs ($PYBINUTILS_JOBS) time slices
+# decoded by parallel perf script processes, their counts are merged in time order.
+def extract_perf(file, flush_lines=PERF_FLUSH_LINES, jobs=None):
+    if perf_reader() == 'native':
+        return extract_perf_native(file)
+    if jobs is None:
+        jobs = default_jobs()
+    span = None
+    if jobs > 1 and os.path.getsize(file) >= PARALLEL_PERF_MIN_SIZE:
+        span = perf_time_span(file)
+    if span is None:
+        return aggregate_perf_script(perf_script_lines(file), flush_lines)
+    slices = perf_time_slices(span[0], span[1], jobs)
+    res = {'pc': dict(), 'symbol': dict(), 'symbol_offset': dict(), 'aslr_map': dict()}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for part in executor.map(perf_script_slice, [file] * len(slices), slices, [flush_lines] * len(slices)):
+            merge_perf_counts(res, part)
     return res
 
+# file: perf.data
+# return: {file: {event: {pc: count}}}
+def extract_perf_from_file(file, aslr_map=None):
+    res = extract_perf(file)
+    if aslr_map is not None:
+        for dso, dso_map in res['aslr_map'].items():
+            aslr_map.setdefault(dso, dict()).update(dso_map)
+    return res['pc']
+
 # file: perf.data
 # return: {file: {event: {symbol: count}}} (has_symbol_offset = False)
 # return: {file: {event: {symbol: {offset: count}}}} (has_symbol_offset = True)
 def extract_perf_from_file_with_symbol(file, has_symbol_offset=False):
-    result = subprocess.run(["perf", "script", "-i", file, "--no-demangle", "--full-source-path"], capture_output=True, text=True)
-    lines = result.stdout.splitlines()
-    res = dict()
-    for line in lines:
-        colon_pos = line.find(":")
-        if colon_pos == -1:
-            continue
-        line_split = line[colon_pos+1:].split()
-        freq = int(line_split[0])
-        event = line_split[1][:-1]
-        symbol = line_split[3]
-        offset = 0
-        if symbol == '[unknown]':
-            continue
-        if '+' in symbol:
-            offset = int(symbol.split('+')[1], 16)
-            symbol = symbol.split('+')[0]
-        file = line_split[-1].strip()[1:-1]
-        if file not in res:
-            res[file] = dict()
-        if event not in res[file]:
-            res[file][event] = dict()
-        if symbol not in res[file][event]:
-            if has_symbol_offset:
-                res[file][event][symbol] = dict()
-            else:
-                res[file][event][symbol] = 0
-        if has_symbol_offset:
-            if offset not in res[file][event][symbol]:
-                res[file][event][symbol][offset] = 0
-            res[file][event][symbol][offset] += freq
-        else:
-            res[file][event][symbol] += freq
-    return res
+    res = extract_perf(file)
+    return res['symbol_offset'] if has_symbol_offset else res['symbol']
 
 def perf_extract_deaslr_per_file(perf_extract_file, aslr_map_file, textdump):
     # de-aslr perf data
@@ -1,35 +1,107 @@
 #!/usr/bin/env python3
 
-from arch.arch import arch_tools, insn_db_path
-from elftools.elf.elffile import ELFFile
+from arch.arch import arch_tools, insn_db_path, disassembler_backend, decoder_version
+from arch.insn import cf_kind, bits, sign_extend, MASK64
+from arch.aarch64_decoder import aarch64_decoder
+from arch.elf_image import elf_image
 import tempfile
 import os
 import json
 import sys
 
+aarch64_branches = {'cbz', 'cbnz', 'tbz', 'tbnz'}
+aarch64_indirect_jumps = {'br', 'braa', 'brab', 'braaz', 'brabz'}
+aarch64_indirect_calls = {'blr', 'blraa', 'blrab', 'blraaz', 'blrabz'}
+aarch64_returns = {'ret', 'retaa', 'retab'}
+
+# aarch64-class.json ({mnemonic: {"op,mask": [class, ...]}}) compiled to integers.
+# The entries of a mnemonic are bucketed by the bits fixed in all of their masks, so a
+# lookup only tests the few entries sharing those bits, in database order. Results are
+# memoized per (mnemonic, encoding); the memo is cleared once it holds CLASS_MEMO_ENTRIES
+# entries, so that it stays bounded on binaries with many distinct encodings.
+CLASS_MEMO_ENTRIES = 1 << 18
+
+class aarch64_class_db:
+    def __init__(self, db):
+        self.tables = dict() # mnemonic => (common_mask, {op & common_mask: [(op, mask, classes), ...]})
+        for mnemonic, entries in db.items():
+            compiled = []
+            for k, v in entries.items():
+                op, mask = k.split(",")
+                compiled.append((int(op, 16), int(mask, 16), v))
+            common_mask = 0xffffffff
+            for op, mask, classes in compiled:
+                common_mask &= mask
+            buckets = dict()
+            for op, mask, classes in compiled:
+                buckets.setdefault(op & common_mask, []).append((op, mask, classes))
+            self.tables[mnemonic] = (common_mask, buckets)
+        self.memo = dict() # (mnemonic, encoding) => classes or None
+
+    def lookup(self, mnemonic, x):
+        key = (mnemonic, x)
+        if key in self.memo:
+            return self.memo[key]
+        res = None
+        table = self.tables.get(mnemonic)
+        if table is not None:
+            common_mask, buckets = table
+            for op, mask, classes in buckets.get(x & common_mask, []):
+                if x & mask == op:
+                    res = classes
+                    break
+        if len(self.memo) >= CLASS_MEMO_ENTRIES:
+            self.memo.clear()
+        self.memo[key] = res
+        return res
+
+    # Return the classes of rows of an instr_store, reading mnemonic ids and encodings directly
+    def lookup_rows(self, store, rows):
+        mnemonics = store.mnemonics
+        mnemonic_ids = store.mnemonic_ids
+        encodings = store.encodings
+        memo = self.memo
+        res = []
+        for row in rows:
+            key = (mnemonics[mnemonic_ids[row]], encodings[row])
+            classes = memo.get(key, memo)
+            if classes is memo:
+                classes = self.lookup(*key)
+            res.append(classes)
+        return res
+
 class aarch64_tools(arch_tools):
-    def __init__(self, elf_path, ldflags='-no-pie', ld='aarch64-linux-gnu-ld', objdump='aarch64-linux-gnu-objdump', insn_db=insn_db_path()):
+    def __init__(self, elf_path, ldflags='-no-pie', ld='aarch64-linux-gnu-ld', objdump='aarch64-linux-gnu-objdump', insn_db=insn_db_path(), disassembler=None):
         self.elf_path = elf_path
         self.objdump = objdump
+        self.disassembler = disassembler or disassembler_backend()
         self.openfiles = []
         self.tmpfiles = []
-        f = open(self. elf_path, 'rb')
-        self.elf = ELFFile(f)
+        self.cache = None
+        self.symtab = None
+        self.func_index = None
+        self.dwarf_dies = None
+        image = elf_image(self.elf_path)
+        self.elf = image.elf
         if self.elf['e_type'] == 'ET_REL':
             tf = tempfile.NamedTemporaryFile(delete=False)
             self.elf_path = tf.name
             self.tmpfiles.append(tf.name)
             if os.system(f'{ld} -o {tf.name} {elf_path} {ldflags} --warn-unresolved-symbols 2>/dev/null') != 0:
                 raise Exception('Failed to compile ELF file')
-            f.close()
-            f = open(tf.name, 'rb')
-            self.elf = ELFFile(f)
-        self.openfiles.append(f)
+            image.close()
+            image = elf_image(tf.name)
+            self.elf = image.elf
+        self.image = image
+        self.openfiles.append(image)
+        self.insn_db = insn_db
         self.insn_db_aarch64 = None
+        self.insn_class_db = None
         if insn_db:
             try:
                 with open(insn_db / "aarch64-class.json", 'r') as f:
                     self.insn_db_aarch64 = json.load(f)
+                self.insn_class_db = aarch64_class_db(self.insn_db_aarch64)
             except:
                 print("Error: Cannot open aarch64-class.json", file=sys.stderr)
 
@@ -39,34 +111,80 @@ class aarch64_tools(arch_tools):
         for f in self.tmpfiles:
             os.remove(f)
 
-    def read_dwarf(self):
-        return super().read_dwarf()
+    def analysis_params(self):
+        return super().analysis_params() + (str(self.insn_db), self.disassembler)
+
+    def disassembler_version(self):
+        if self.disassembler == 'native':
+            return decoder_version(aarch64_decoder)
+        return super().disassembler_version()
 
-    def read_textdump(self):
-        return super().read_textdump('-M no-aliases')
+    def read_dwarf(self, pcs=None):
+        return super().read_dwarf(pcs)
+
+    def read_textdump(self, jobs=None, symbols=None):
+        return super().read_textdump('-M no-aliases', jobs, symbols)
+
+    # With the native disassembler, decode .text in-process instead of running objdump
+    def iter_textdump(self, objdump_opts='', jobs=None, symbols=None, store=None):
+        if self.disassembler == 'native':
+            return self._iter_native_textdump(aarch64_decoder(), symbols, store)
+        return super().iter_textdump(objdump_opts, jobs, symbols, store)
+
+    def may_change_control_flow(self, mnemonic):
+        mnemonic = mnemonic.split('.')[0]
+        return (mnemonic in ['b', 'bc', 'bl'] or mnemonic in aarch64_branches or mnemonic in aarch64_returns
+                or mnemonic in aarch64_indirect_jumps or mnemonic in aarch64_indirect_calls)
+
+    def decode_control_flow(self, mnemonic, operands):
+        if mnemonic == 'b':
+            return cf_kind.JUMP
+        if mnemonic == 'bl':
+            return cf_kind.CALL
+        mnemonic = mnemonic.split('.')[0]
+        # b.cond, bc.cond, cbz, cbnz, tbz and tbnz
+        if mnemonic in ['b', 'bc'] or mnemonic in aarch64_branches:
+            return cf_kind.BRANCH
+        if mnemonic in aarch64_returns:
+            return cf_kind.RETURN
+        if mnemonic in aarch64_indirect_jumps:
+            return cf_kind.INDIRECT_JUMP
+        if mnemonic in aarch64_indirect_calls:
+            return cf_kind.INDIRECT_CALL
+        return cf_kind.NONE
+
+    def branch_target(self, addr, hex_code, length):
+        x = hex_code
+        if x & 0x7c000000 == 0x14000000:
+            # B, BL: imm26
+            offset = sign_extend(bits(x, 25, 0), 26) << 2
+        elif x & 0xff000000 == 0x54000000 or x & 0x7e000000 == 0x34000000:
+            # B.cond, BC.cond, CBZ, CBNZ: imm19
+            offset = sign_extend(bits(x, 23, 5), 19) << 2
+        elif x & 0x7e000000 == 0x36000000:
+            # TBZ, TBNZ: imm14
+            offset = sign_extend(bits(x, 18, 5), 14) << 2
+        else:
+            return None
+        return (addr + offset) & MASK64
 
     def is_control_flow_instr(self, instr):
-        # instr should be (hex_code, instr, control_flow_dir) from read_textdump
+        # instr should be an insn from read_textdump
         if self.is_control_flow_end(instr):
             return True
-        if instr[2] == 'X' or instr[2] == '-':
+        if instr.control_flow_dir == 'X' or instr.control_flow_dir == '-':
             return True
         return False
 
     def is_control_flow_end(self, instr):
-        instr = instr[1].split("\t")[0].strip()
-        if '.' in instr:
-            instr = instr.split('.')[0]
-        return instr in ['ret', 'retaa', 'retab']
+        return instr.kind == cf_kind.RETURN
 
     def get_insn_class_by_instr(self, instr):
-        instr_str = instr[1].split("\t")[0].strip()
-        x = instr[0]
-        if self.insn_db_aarch64:
-            if instr_str in self.insn_db_aarch64:
-                # TODO: index using k-d tree
-                for k, v in self.insn_db_aarch64[instr_str].items():
-                    op, mask = k.split(",")
-                    if (x & int(mask, 16)) == int(op, 16):
-                        return v
-        return None
+        if self.insn_class_db is None:
+            return None
+        return self.insn_class_db.lookup(instr.mnemonic, instr.hex_code)
+
+    def get_insn_classes(self, store, rows):
+        if self.insn_class_db is None:
+            return [None] * len(rows)
+        return self.insn_class_db.lookup_rows(store, rows)
@@ -0,0 +1,659 @@
+#!/usr/bin/env python3
+
+import struct
+from string import Formatter
+from arch.insn import bits, sign_extend, MASK64
+
+# In-process A64 disassembler producing the same text as `aarch64-linux-gnu-objdump -M no-aliases -d`
+# for the base integer, load/store (including exclusive pairs, LORegion and unprivileged forms), branch,
+# system and scalar floating-point instructions and the common Advanced SIMD ones, single structure
+# loads and stores included. Like riscv64_decoder, instructions are matched against a (match, mask)
+# table bucketed by the major opcode bits and formatted from str.format templates. Encodings
+# outside the table (SVE, most of Advanced SIMD, ...) are printed as `.inst`.
+
+cond_names = ['eq', 'ne', 'cs', 'cc', 'mi', 'pl', 'vs', 'vc', 'hi', 'ls', 'ge', 'lt', 'gt', 'le', 'al', 'nv']
+shift_names = ['lsl', 'lsr', 'asr', 'ror']
+extend_names = ['uxtb', 'uxth', 'uxtw', 'uxtx', 'sxtb', 'sxth', 'sxtw', 'sxtx']
+barrier_names = {1: 'oshld', 2: 'oshst', 3: 'osh', 5: 'nshld', 6: 'nshst', 7: 'nsh', 9: 'ishld',
+                 10: 'ishst', 11: 'ish', 13: 'ld', 14: 'st', 15: 'sy'}
+sysreg_names = {
+    (3, 3, 13, 0, 2): 'tpidr_el0', (3, 3, 13, 0, 3): 'tpidrro_el0', (3, 3, 4, 4, 0): 'fpcr',
+    (3, 3, 4, 4, 1): 'fpsr', (3, 3, 4, 2, 0): 'nzcv', (3, 3, 14, 0, 0): 'cntfrq_el0',
+    (3, 3, 14, 0, 1): 'cntpct_el0', (3, 3, 14, 0, 2): 'cntvct_el0', (3, 0, 0, 0, 0): 'midr_el1',
+    (3, 0, 0, 0, 5): 'mpidr_el1', (3, 3, 0, 0, 1): 'ctr_el0', (3, 3, 0, 0, 7): 'dczid_el0',
+    (3, 3, 9, 13, 0): 'pmccntr_el0',
+}
+prefetch_types = ['pld', 'pli', 'pst']
+arrangements = ['8b', '16b', '4h', '8h', '2s', '4s', None, '2d'] # size << 1 | Q
+fp_arrangements = ['2s', '4s', None, '2d'] # sz << 1 | Q
+
+def gpr(num, x, sp=False):
+    if num == 31:
+        if sp:
+            return 'sp' if x else 'wsp'
+        return 'xzr' if x else 'wzr'
+    return f"{'x' if x else 'w'}{num}"
+
+def decode_bit_masks(n, imms, immr, width):
+    combined = (n << 6) | (~imms & 0x3f)
+    if combined == 0:
+        return None
+    length = combined.bit_length() - 1
+    levels = (1 << length) - 1
+    s = imms & levels
+    r = immr & levels
+    if s == levels:
+        return None
+    esize = 1 << length
+    welem = (1 << (s + 1)) - 1
+    elem = ((welem >> r) | (welem << (esize - r))) & ((1 << esize) - 1)
+    res = 0
+    for i in range(0, width, esize):
+        res |= elem << i
+    return res
+
+def fp_imm8(imm8):
+    value = (16 + (imm8 & 0xf)) / 16 * 2.0 ** (((bits(imm8, 6, 4)) ^ 4) - 3)
+    return -value if imm8 & 0x80 else value
+
+def offset(value):
+    return f', #{value}' if value else ''
+
+def logical_imm(x):
+    value = decode_bit_masks(bits(x, 22, 22), bits(x, 15, 10), bits(x, 21, 16), 64 if x >> 31 else 32)
+    if value is None:
+        raise IndexError('reserved immediate')
+    return f'#{hex(value)}'
+
+def shifted_reg(x, arith=False):
+    shift = bits(x, 23, 22)
+    amount = bits(x, 15, 10)
+    if (arith and shift == 3) or (amount >= 32 and not x >> 31):
+        raise IndexError('reserved shift')
+    reg = gpr(bits(x, 20, 16), x >> 31)
+    if shift == 0 and amount == 0:
+        return reg
+    return f'{reg}, {shift_names[shift]} #{amount}'
+
+def extended_reg(x, flags=False):
+    sf = x >> 31
+    option = bits(x, 15, 13)
+    amount = bits(x, 12, 10)
+    if amount > 4:
+        raise IndexError('reserved shift')
+    reg = gpr(bits(x, 20, 16), sf and option & 3 == 3)
+    if ((bits(x, 4, 0) == 31 and not flags) or bits(x, 9, 5) == 31) and option == (3 if sf else 2):
+        return f'{reg}, lsl #{amount}' if amount else reg
+    return f'{reg}, {extend_names[option]} #{amount}' if amount else f'{reg}, {extend_names[option]}'
+
+def register_offset(x, scale):
+    option = bits(x, 15, 13)
+    if not option & 2:
+        raise IndexError('reserved extend')
+    reg = gpr(bits(x, 20, 16), option & 3 == 3)
+    amount = scale if bits(x, 12, 12) else 0
+    if option == 3:
+        return f'{reg}, lsl #{amount}' if bits(x, 12, 12) else reg
+    return f'{reg}, {extend_names[option]} #{amount}' if bits(x, 12, 12) else f'{reg}, {extend_names[option]}'
+
+def prefetch_op(x):
+    rt = bits(x, 4, 0)
+    if bits(x, 4, 3) < 3 and bits(x, 2, 1) < 3:
+        return f"{prefetch_types[bits(x, 4, 3)]}l{bits(x, 2, 1) + 1}{'strm' if rt & 1 else 'keep'}"
+    return f'#{hex(rt)}'
+
+def sysreg(x):
+    key = (2 + bits(x, 19, 19), bits(x, 18, 16), bits(x, 15, 12), bits(x, 11, 8), bits(x, 7, 5))
+    return sysreg_names.get(key, 's{}_{}_c{}_c{}_{}'.format(*key))
+
+def element(x):
+    imm5 = bits(x, 20, 16)
+    size = (imm5 & -imm5).bit_length() - 1
+    if size < 0 or size > 3:
+        return None
+    return ('bhsd'[size], imm5 >> (size + 1))
+
+def simd_imm_name(x):
+    op = bits(x, 29, 29)
+    cmode = bits(x, 15, 12)
+    if cmode == 0b1111:
+        return 'fmov'
+    if cmode == 0b1110 or cmode & 0b1110 == 0b1100 or not cmode & 1:
+        return 'mvni' if op and cmode != 0b1110 else 'movi'
+    return 'bic' if op else 'orr'
+
+def simd_imm(x):
+    q = bits(x, 30, 30)
+    op = bits(x, 29, 29)
+    cmode = bits(x, 15, 12)
+    imm8 = (bits(x, 18, 16) << 5) | bits(x, 9, 5)
+    vd = bits(x, 4, 0)
+    if cmode == 0b1111:
+        if op and not q:
+            raise IndexError('reserved immediate')
+        arrangement = '2d' if op else ('4s' if q else '2s')
+        return f'v{vd}.{arrangement}, #{fp_imm8(imm8):.18e}'
+    if cmode == 0b1110 and op:
+        value = 0
+        for i in range(8):
+            if imm8 & (1 << i):
+                value |= 0xff << (8 * i)
+        return f'v{vd}.2d, #{hex(value)}' if q else f'd{vd}, #{hex(value)}'
+    if cmode == 0b1110:
+        return f"v{vd}.{'16b' if q else '8b'}, #{hex(imm8)}"
+    if cmode & 0b1110 == 0b1100:
+        return f"v{vd}.{'4s' if q else '2s'}, #{hex(imm8)}, msl #{8 << (cmode & 1)}"
+    if cmode & 0b1000:
+        shift = 8 * bits(cmode, 1, 1)
+        res = f"v{vd}.{'8h' if q else '4h'}, #{hex(imm8)}"
+    else:
+        shift = 8 * bits(cmode, 2, 1)
+        res = f"v{vd}.{'4s' if q else '2s'}, #{hex(imm8)}"
+    return f'{res}, lsl #{shift}' if shift else res
+
+def fp_reg(num, ftype):
+    if ftype == 2:
+        raise IndexError('reserved type')
+    return f"{'sd?h'[ftype]}{num}"
+
+def vector(num, x, no_2d=False):
+    if no_2d and bits(x, 23, 22) == 3:
+        raise IndexError('reserved arrangement')
+    arrangement = arrangements[(bits(x, 23, 22) << 1) | bits(x, 30, 30)]
+    if arrangement is None:
+        raise IndexError('reserved arrangement')
+    return f'v{num}.{arrangement}'
+
+def fp_vector(num, x):
+    arrangement = fp_arrangements[(bits(x, 22, 22) << 1) | bits(x, 30, 30)]
+    if arrangement is None:
+        raise IndexError('reserved arrangement')
+    return f'v{num}.{arrangement}'
+
+# Operand fields, called with (encoding, address, symbolize)
+fields = {
+    'cond': lambda x, a, s: cond_names[bits(x, 3, 0)],
+    'cond12': lambda x, a, s: cond_names[bits(x, 15, 12)],
+    'nzcv': lambda x, a, s: hex(bits(x, 3, 0)),
+    'imm5': lambda x, a, s: hex(bits(x, 20, 16)),
+    'imm12': lambda x, a, s: f'#{hex(bits(x, 21, 10))}' + (', lsl #12' if bits(x, 22, 22) else ''),
+    'imm16': lambda x, a, s: f'#{hex(bits(x, 20, 5))}' + (f', lsl #{16 * bits(x, 22, 21)}' if bits(x, 22, 21) else ''),
+    'imm16_exc': lambda x, a, s: f'#{hex(bits(x, 20, 5))}',
+    'immr': lambda x, a, s: bits(x, 21, 16),
+    'imms': lambda x, a, s: bits(x, 15, 10),
+    'logical_imm': lambda x, a, s: logical_imm(x),
+    'shifted_reg': lambda x, a, s: shifted_reg(x),
+    'shifted_reg_arith': lambda x, a, s: shifted_reg(x, True),
+    'extended_reg': lambda x, a, s: extended_reg(x),
+    'extended_reg_flags': lambda x, a, s: extended_reg(x, True),
+    'bitpos': lambda x, a, s: (bits(x, 31, 31) << 5) | bits(x, 23, 19),
+    'Rt_b5': lambda x, a, s: gpr(bits(x, 4, 0), bits(x, 31, 31)),
+    'barrier': lambda x, a, s: barrier_names.get(bits(x, 11, 8), f'#{hex(bits(x, 11, 8))}'),
+    'hint': lambda x, a, s: hex(bits(x, 11, 5)),
+    'sysreg': lambda x, a, s: sysreg(x),
+    'sys_op1': lambda x, a, s: bits(x, 18, 16),
+    'sys_crn': lambda x, a, s: bits(x, 15, 12),
+    'sys_crm': lambda x, a, s: bits(x, 11, 8),
+    'crm': lambda x, a, s: hex(bits(x, 11, 8)),
+    'sys_op2': lambda x, a, s: bits(x, 7, 5),
+    'prfop': lambda x, a, s: prefetch_op(x),
+    'simm9': lambda x, a, s: sign_extend(bits(x, 20, 12), 9),
+    'simm9_off': lambda x, a, s: offset(sign_extend(bits(x, 20, 12), 9)),
+    'fpimm': lambda x, a, s: f'{fp_imm8(bits(x, 20, 13)):.18e}',
+    'simd_imm_name': lambda x, a, s: simd_imm_name(x),
+    'simd_imm': lambda x, a, s: simd_imm(x),
+    'Vd': lambda x, a, s: vector(bits(x, 4, 0), x),
+    'Vn': lambda x, a, s: vector(bits(x, 9, 5), x),
+    'Vm': lambda x, a, s: vector(bits(x, 20, 16), x),
+    'Vd_bhs': lambda x, a, s: vector(bits(x, 4, 0), x, True),
+    'Vd_fp': lambda x, a, s: fp_vector(bits(x, 4, 0), x),
+    'Vn_fp': lambda x, a, s: fp_vector(bits(x, 9, 5), x),
+    'Vm_fp': lambda x, a, s: fp_vector(bits(x, 20, 16), x),
+    'Vd_8b': lambda x, a, s: f"v{bits(x, 4, 0)}.{'16b' if bits(x, 30, 30) else '8b'}",
+    'Vn_8b': lambda x, a, s: f"v{bits(x, 9, 5)}.{'16b' if bits(x, 30, 30) else '8b'}",
+    'Vm_8b': lambda x, a, s: f"v{bits(x, 20, 16)}.{'16b' if bits(x, 30, 30) else '8b'}",
+    'Vd_dup': lambda x, a, s: f"v{bits(x, 4, 0)}.{dup_arrangement(x)}",
+    'Vd_elem': lambda x, a, s: f'v{bits(x, 4, 0)}.{element(x)[0]}[{element(x)[1]}]',
+    'Vn_elem': lambda x, a, s: f'v{bits(x, 9, 5)}.{element(x)[0]}[{element(x)[1]}]',
+    'Vn_elem2': lambda x, a, s: f"v{bits(x, 9, 5)}.{element(x)[0]}[{bits(x, 14, 11) >> 'bhsd'.index(element(x)[0])}]",
+    'Rn_dup': lambda x, a, s: gpr(bits(x, 9, 5), element(x)[0] == 'd'),
+    'Rd_umov': lambda x, a, s: umov_reg(x),
+    'Rd_smov': lambda x, a, s: smov_reg(x),
+    'target26': lambda x, a, s: s((a + (sign_extend(bits(x, 25, 0), 26) << 2)) & MASK64),
+    'target19': lambda x, a, s: s((a + (sign_extend(bits(x, 23, 5), 19) << 2)) & MASK64),
+    'target14': lambda x, a, s: s((a + (sign_extend(bits(x, 18, 5), 14) << 2)) & MASK64),
+    'adr_target': lambda x, a, s: s((a + sign_extend((bits(x, 23, 5) << 2) | bits(x, 30, 29), 21)) & MASK64),
+    'adrp_target': lambda x, a, s: s(((a & ~0xfff) + (sign_extend((bits(x, 23, 5) << 2) | bits(x, 30, 29), 21) << 12)) & MASK64),
+}
+target_fields = {'target26', 'target19', 'target14', 'adr_target', 'adrp_target'}
+
+def umov_reg(x):
+    if bits(x, 30, 30) != (element(x)[0] == 'd'):
+        raise IndexError('reserved size')
+    return gpr(bits(x, 4, 0), bits(x, 30, 30))
+
+def smov_reg(x):
+    if element(x)[0] == 'd' or (element(x)[0] == 's' and not bits(x, 30, 30)):
+        raise IndexError('reserved size')
+    return gpr(bits(x, 4, 0), bits(x, 30, 30))
+
+def dup_arrangement(x):
+    size = element(x)[0]
+    q = bits(x, 30, 30)
+    arrangement = {'b': ['8b', '16b'], 'h': ['4h', '8h'], 's': ['2s', '4s'], 'd': [None, '2d']}[size][q]
+    if arrangement is None:
+        raise IndexError('reserved arrangement')
+    return arrangement
+
+# General purpose register fields: R* follow sf (bit 31), W*/X* have a fixed size, *sp reads 31 as the stack pointer
+for name, lo in [('d', 0), ('n', 5), ('m', 16), ('a', 10), ('t', 0), ('t2', 10), ('s', 16)]:
+    fields[f'R{name}'] = lambda x, a, s, lo=lo: gpr(bits(x, lo + 4, lo), x >> 31)
+    fields[f'R{name}sp'] = lambda x, a, s, lo=lo: gpr(bits(x, lo + 4, lo), x >> 31, True)
+    fields[f'W{name}'] = lambda x, a, s, lo=lo: gpr(bits(x, lo + 4, lo), False)
+    fields[f'X{name}'] = lambda x, a, s, lo=lo: gpr(bits(x, lo + 4, lo), True)
+    fields[f'W{name}sp'] = lambda x, a, s, lo=lo: gpr(bits(x, lo + 4, lo), False, True)
+    fields[f'X{name}sp'] = lambda x, a, s, lo=lo: gpr(bits(x, lo + 4, lo), True, True)
+    # Floating-point registers of the scalar type in bits 23:22
+    fields[f'F{name}'] = lambda x, a, s, lo=lo: fp_reg(bits(x, lo + 4, lo), bits(x, 23, 22))
+    for prefix in 'bhsdq':
+        fields[f'{prefix.upper()}{name}'] = lambda x, a, s, lo=lo, prefix=prefix: f'{prefix}{bits(x, lo + 4, lo)}'
+
+# (name, match, mask, operand template), name may use fields too
+base_table = [
+    # PC-relative addressing, add/subtract, logical, move wide, bitfield and extract (immediate)
+    ('adr', 0x10000000, 0x9f000000, '{Xd}, {adr_target}'),
+    ('adrp', 0x90000000, 0x9f000000, '{Xd}, {adrp_target}'),
+    ('add', 0x11000000, 0x7f800000, '{Rdsp}, {Rnsp}, {imm12}'),
+    ('adds', 0x31000000, 0x7f800000, '{Rd}, {Rnsp}, {imm12}'),
+    ('sub', 0x51000000, 0x7f800000, '{Rdsp}, {Rnsp}, {imm12}'),
+    ('subs', 0x71000000, 0x7f800000, '{Rd}, {Rnsp}, {imm12}'),
+    ('and', 0x12000000, 0xffc00000, '{Wdsp}, {Wn}, {logical_imm}'),
+    ('orr', 0x32000000, 0xffc00000, '{Wdsp}, {Wn}, {logical_imm}'),
+    ('eor', 0x52000000, 0xffc00000, '{Wdsp}, {Wn}, {logical_imm}'),
+    ('ands', 0x72000000, 0xffc00000, '{Wd}, {Wn}, {logical_imm}'),
+    ('and', 0x92000000, 0xff800000, '{Xdsp}, {Xn}, {logical_imm}'),
+    ('orr', 0xb2000000, 0xff800000, '{Xdsp}, {Xn}, {logical_imm}'),
+    ('eor', 0xd2000000, 0xff800000, '{Xdsp}, {Xn}, {logical_imm}'),
+    ('ands', 0xf2000000, 0xff800000, '{Xd}, {Xn}, {logical_imm}'),
+    ('movn', 0x12800000, 0xffc00000, '{Wd}, {imm16}'),
+    ('movz', 0x52800000, 0xffc00000, '{Wd}, {imm16}'),
+    ('movk', 0x72800000, 0xffc00000, '{Wd}, {imm16}'),
+    ('movn', 0x92800000, 0xff800000, '{Xd}, {imm16}'),
+    ('movz', 0xd2800000, 0xff800000, '{Xd}, {imm16}'),
+    ('movk', 0xf2800000, 0xff800000, '{Xd}, {imm16}'),
+    ('sbfm', 0x13000000, 0xffe08000, '{Wd}, {Wn}, #{immr}, #{imms}'),
+    ('bfm', 0x33000000, 0xffe08000, '{Wd}, {Wn}, #{immr}, #{imms}'),
+    ('ubfm', 0x53000000, 0xffe08000, '{Wd}, {Wn}, #{immr}, #{imms}'),
+    ('sbfm', 0x93400000, 0xffc00000, '{Xd}, {Xn}, #{immr}, #{imms}'),
+    ('bfm', 0xb3400000, 0xffc00000, '{Xd}, {Xn}, #{immr}, #{imms}'),
+    ('ubfm', 0xd3400000, 0xffc00000, '{Xd}, {Xn}, #{immr}, #{imms}'),
+    ('extr', 0x13800000, 0xffe08000, '{Wd}, {Wn}, {Wm}, #{imms}'),
+    ('extr', 0x93c00000, 0xffe00000, '{Xd}, {Xn}, {Xm}, #{imms}'),
+    # Branches, exception generation and system
+    ('b.{cond}', 0x54000000, 0xff000010, '{target19}'),
+    ('bc.{cond}', 0x54000010, 0xff000010, '{target19}'),
+    ('svc', 0xd4000001, 0xffe0001f, '{imm16_exc}'),
+    ('hvc', 0xd4000002, 0xffe0001f, '{imm16_exc}'),
+    ('smc', 0xd4000003, 0xffe0001f, '{imm16_exc}'),
+    ('brk', 0xd4200000, 0xffe0001f, '{imm16_exc}'),
+    ('hlt', 0xd4400000, 0xffe0001f, '{imm16_exc}'),
+    ('hint', 0xd503201f, 0xfffff01f, '#{hint}'),
+    ('clrex', 0xd5033f5f, 0xffffffff, ''),
+    ('clrex', 0xd503305f, 0xfffff0ff, '#{crm}'),
+    ('dsb', 0xd503309f, 0xfffff0ff, '{barrier}'),
+    ('dmb', 0xd50330bf, 0xfffff0ff, '{barrier}'),
+    ('isb', 0xd5033fdf, 0xffffffff, ''),
+    ('isb', 0xd50330df, 0xfffff0ff, '#{crm}'),
+    ('sys', 0xd5080000, 0xfff80000, '#{sys_op1}, C{sys_crn}, C{sys_crm}, #{sys_op2}, {Xt}'),
+    ('msr', 0xd5100000, 0xfff00000, '{sysreg}, {Xt}'),
+    ('mrs', 0xd5300000, 0xfff00000, '{Xt}, {sysreg}'),
+    ('br', 0xd61f0000, 0xfffffc1f, '{Xn}'),
+    ('blr', 0xd63f0000, 0xfffffc1f, '{Xn}'),
+    ('ret', 0xd65f03c0, 0xffffffff, ''),
+    ('ret', 0xd65f0000, 0xfffffc1f, '{Xn}'),
+    ('retaa', 0xd65f0bff, 0xffffffff, ''),
+    ('retab', 0xd65f0fff, 0xffffffff, ''),
+    ('eret', 0xd69f03e0, 0xffffffff, ''),
+    ('braaz', 0xd61f081f, 0xfffffc1f, '{Xn}'),
+    ('brabz', 0xd61f0c1f, 0xfffffc1f, '{Xn}'),
+    ('blraaz', 0xd63f081f, 0xfffffc1f, '{Xn}'),
+    ('blrabz', 0xd63f0c1f, 0xfffffc1f, '{Xn}'),
+    ('braa', 0xd71f0800, 0xfffffc00, '{Xn}, {Xdsp}'),
+    ('brab', 0xd71f0c00, 0xfffffc00, '{Xn}, {Xdsp}'),
+    ('blraa', 0xd73f0800, 0xfffffc00, '{Xn}, {Xdsp}'),
+    ('blrab', 0xd73f0c00, 0xfffffc00, '{Xn}, {Xdsp}'),
+    ('b', 0x14000000, 0xfc000000, '{target26}'),
+    ('bl', 0x94000000, 0xfc000000, '{target26}'),
+    ('cbz', 0x34000000, 0x7f000000, '{Rt}, {target19}'),
+    ('cbnz', 0x35000000, 0x7f000000, '{Rt}, {target19}'),
+    ('tbz', 0x36000000, 0x7f000000, '{Rt_b5}, #{bitpos}, {target14}'),
+    ('tbnz', 0x37000000, 0x7f000000, '{Rt_b5}, #{bitpos}, {target14}'),
+    # Load literal
+    ('ldr', 0x18000000, 0xff000000, '{Wt}, {target19}'),
+    ('ldr', 0x58000000, 0xff000000, '{Xt}, {target19}'),
+    ('ldrsw', 0x98000000, 0xff000000, '{Xt}, {target19}'),
+    ('prfm', 0xd8000000, 0xff000000, '{prfop}, {target19}'),
+    ('ldr', 0x1c000000, 0xff000000, '{St}, {target19}'),
+    ('ldr', 0x5c000000, 0xff000000, '{Dt}, {target19}'),
+    ('ldr', 0x9c000000, 0xff000000, '{Qt}, {target19}'),
+    # Data processing (register)
+    ('and', 0x0a000000, 0x7f200000, '{Rd}, {Rn}, {shifted_reg}'),
+    ('bic', 0x0a200000, 0x7f200000, '{Rd}, {Rn}, {shifted_reg}'),
+    ('orr', 0x2a000000, 0x7f200000, '{Rd}, {Rn}, {shifted_reg}'),
+    ('orn', 0x2a200000, 0x7f200000, '{Rd}, {Rn}, {shifted_reg}'),
+    ('eor', 0x4a000000, 0x7f200000, '{Rd}, {Rn}, {shifted_reg}'),
+    ('eon', 0x4a200000, 0x7f200000, '{Rd}, {Rn}, {shifted_reg}'),
+    ('ands', 0x6a000000, 0x7f200000, '{Rd}, {Rn}, {shifted_reg}'),
+    ('bics', 0x6a200000, 0x7f200000, '{Rd}, {Rn}, {shifted_reg}'),
+    ('add', 0x0b000000, 0x7f200000, '{Rd}, {Rn}, {shifted_reg_arith}'),
+    ('adds', 0x2b000000, 0x7f200000, '{Rd}, {Rn}, {shifted_reg_arith}'),
+    ('sub', 0x4b000000, 0x7f200000, '{Rd}, {Rn}, {shifted_reg_arith}'),
+    ('subs', 0x6b000000, 0x7f200000, '{Rd}, {Rn}, {shifted_reg_arith}'),
+    ('add', 0x0b200000, 0x7fe00000, '{Rdsp}, {Rnsp}, {extended_reg}'),
+    ('adds', 0x2b200000, 0x7fe00000, '{Rd}, {Rnsp}, {extended_reg_flags}'),
+    ('sub', 0x4b200000, 0x7fe00000, '{Rdsp}, {Rnsp}, {extended_reg}'),
+    ('subs', 0x6b200000, 0x7fe00000, '{Rd}, {Rnsp}, {extended_reg_flags}'),
+    ('adc', 0x1a000000, 0x7fe0fc00, '{Rd}, {Rn}, {Rm}'),
+    ('adcs', 0x3a000000, 0x7fe0fc00, '{Rd}, {Rn}, {Rm}'),
+    ('sbc', 0x5a000000, 0x7fe0fc00, '{Rd}, {Rn}, {Rm}'),
+    ('sbcs', 0x7a000000, 0x7fe0fc00, '{Rd}, {Rn}, {Rm}'),
+    ('ccmn', 0x3a400000, 0x7fe00c10, '{Rn}, {Rm}, #{nzcv}, {cond12}'),
+    ('ccmp', 0x7a400000, 0x7fe00c10, '{Rn}, {Rm}, #{nzcv}, {cond12}'),
+    ('ccmn', 0x3a400800, 0x7fe00c10, '{Rn}, #{imm5}, #{nzcv}, {cond12}'),
+    ('ccmp', 0x7a400800, 0x7fe00c10, '{Rn}, #{imm5}, #{nzcv}, {cond12}'),
+    ('csel', 0x1a800000, 0x7fe00c00, '{Rd}, {Rn}, {Rm}, {cond12}'),
+    ('csinc', 0x1a800400, 0x7fe00c00, '{Rd}, {Rn}, {Rm}, {cond12}'),
+    ('csinv', 0x5a800000, 0x7fe00c00, '{Rd}, {Rn}, {Rm}, {cond12}'),
+    ('csneg', 0x5a800400, 0x7fe00c00, '{Rd}, {Rn}, {Rm}, {cond12}'),
+    ('rbit', 0x5ac00000, 0x7ffffc00, '{Rd}, {Rn}'),
+    ('rev16', 0x5ac00400, 0x7ffffc00, '{Rd}, {Rn}'),
+    ('rev', 0x5ac00800, 0xfffffc00, '{Wd}, {Wn}'),
+    ('rev32', 0xdac00800, 0xfffffc00, '{Xd}, {Xn}'),
+    ('rev', 0xdac00c00, 0xfffffc00, '{Xd}, {Xn}'),
+    ('clz', 0x5ac01000, 0x7ffffc00, '{Rd}, {Rn}'),
+    ('cls', 0x5ac01400, 0x7ffffc00, '{Rd}, {Rn}'),
+    ('udiv', 0x1ac00800, 0x7fe0fc00, '{Rd}, {Rn}, {Rm}'),
+    ('sdiv', 0x1ac00c00, 0x7fe0fc00, '{Rd}, {Rn}, {Rm}'),
+    ('lslv', 0x1ac02000, 0x7fe0fc00, '{Rd}, {Rn}, {Rm}'),
+    ('lsrv', 0x1ac02400, 0x7fe0fc00, '{Rd}, {Rn}, {Rm}'),
+    ('asrv', 0x1ac02800, 0x7fe0fc00, '{Rd}, {Rn}, {Rm}'),
+    ('rorv', 0x1ac02c00, 0x7fe0fc00, '{Rd}, {Rn}, {Rm}'),
+    ('crc32b', 0x1ac04000, 0xffe0fc00, '{Wd}, {Wn}, {Wm}'),
+    ('crc32h', 0x1ac04400, 0xffe0fc00, '{Wd}, {Wn}, {Wm}'),
+    ('crc32w', 0x1ac04800, 0xffe0fc00, '{Wd}, {Wn}, {Wm}'),
+    ('crc32x', 0x9ac04c00, 0xffe0fc00, '{Wd}, {Wn}, {Xm}'),
+    ('crc32cb', 0x1ac05000, 0xffe0fc00, '{Wd}, {Wn}, {Wm}'),
+    ('crc32ch', 0x1ac05400, 0xffe0fc00, '{Wd}, {Wn}, {Wm}'),
+    ('crc32cw', 0x1ac05800, 0xffe0fc00, '{Wd}, {Wn}, {Wm}'),
+    ('crc32cx', 0x9ac05c00, 0xffe0fc00, '{Wd}, {Wn}, {Xm}'),
+    ('madd', 0x1b000000, 0x7fe08000, '{Rd}, {Rn}, {Rm}, {Ra}'),
+    ('msub', 0x1b008000, 0x7fe08000, '{Rd}, {Rn}, {Rm}, {Ra}'),
+    ('smaddl', 0x9b200000, 0xffe08000, '{Xd}, {Wn}, {Wm}, {Xa}'),
+    ('smsubl', 0x9b208000, 0xffe08000, '{Xd}, {Wn}, {Wm}, {Xa}'),
+    ('umaddl', 0x9ba00000, 0xffe08000, '{Xd}, {Wn}, {Wm}, {Xa}'),
+    ('umsubl', 0x9ba08000, 0xffe08000, '{Xd}, {Wn}, {Wm}, {Xa}'),
+    ('smulh', 0x9b400000, 0xffe08000, '{Xd}, {Xn}, {Xm}'),
+    ('umulh', 0x9bc00000, 0xffe08000, '{Xd}, {Xn}, {Xm}'),
+    # Scalar floating-point
+    ('fmov', 0x1e204000, 0xff3ffc00, '{Fd}, {Fn}'),
+    ('fabs', 0x1e20c000, 0xff3ffc00, '{Fd}, {Fn}'),
+    ('fneg', 0x1e214000, 0xff3ffc00, '{Fd}, {Fn}'),
+    ('fsqrt', 0x1e21c000, 0xff3ffc00, '{Fd}, {Fn}'),
+    ('fcvt', 0x1e22c000, 0xfffffc00, '{Dd}, {Sn}'),
+    ('fcvt', 0x1e23c000, 0xfffffc00, '{Hd}, {Sn}'),
+    ('fcvt', 0x1e624000, 0xfffffc00, '{Sd}, {Dn}'),
+    ('fcvt', 0x1e63c000, 0xfffffc00, '{Hd}, {Dn}'),
+    ('fcvt', 0x1ee24000, 0xfffffc00, '{Sd}, {Hn}'),
+    ('fcvt', 0x1ee2c000, 0xfffffc00, '{Dd}, {Hn}'),
+    ('frintn', 0x1e244000, 0xff3ffc00, '{Fd}, {Fn}'),
+    ('frintp', 0x1e24c000, 0xff3ffc00, '{Fd}, {Fn}'),
+    ('frintm', 0x1e254000, 0xff3ffc00, '{Fd}, {Fn}'),
+    ('frintz', 0x1e25c000, 0xff3ffc00, '{Fd}, {Fn}'),
+    ('frinta', 0x1e264000, 0xff3ffc00, '{Fd}, {Fn}'),
+    ('frintx', 0x1e274000, 0xff3ffc00, '{Fd}, {Fn}'),
+    ('frinti', 0x1e27c000, 0xff3ffc00, '{Fd}, {Fn}'),
+    ('fmul', 0x1e200800, 0xff20fc00, '{Fd}, {Fn}, {Fm}'),
+    ('fdiv', 0x1e201800, 0xff20fc00, '{Fd}, {Fn}, {Fm}'),
+    ('fadd', 0x1e202800, 0xff20fc00, '{Fd}, {Fn}, {Fm}'),
+    ('fsub', 0x1e203800, 0xff20fc00, '{Fd}, {Fn}, {Fm}'),
+    ('fmax', 0x1e204800, 0xff20fc00, '{Fd}, {Fn}, {Fm}'),
+    ('fmin', 0x1e205800, 0xff20fc00, '{Fd}, {Fn}, {Fm}'),
+    ('fmaxnm', 0x1e206800, 0xff20fc00, '{Fd}, {Fn}, {Fm}'),
+    ('fminnm', 0x1e207800, 0xff20fc00, '{Fd}, {Fn}, {Fm}'),
+    ('fnmul', 0x1e208800, 0xff20fc00, '{Fd}, {Fn}, {Fm}'),
+    ('fmadd', 0x1f000000, 0xff208000, '{Fd}, {Fn}, {Fm}, {Fa}'),
+    ('fmsub', 0x1f008000, 0xff208000, '{Fd}, {Fn}, {Fm}, {Fa}'),
+    ('fnmadd', 0x1f200000, 0xff208000, '{Fd}, {Fn}, {Fm}, {Fa}'),
+    ('fnmsub', 0x1f208000, 0xff208000, '{Fd}, {Fn}, {Fm}, {Fa}'),
+    ('fcmp', 0x1e202000, 0xff20fc1f, '{Fn}, {Fm}'),
+    ('fcmp', 0x1e202008, 0xff20fc1f, '{Fn}, #0.0'),
+    ('fcmpe', 0x1e202010, 0xff20fc1f, '{Fn}, {Fm}'),
+    ('fcmpe', 0x1e202018, 0xff20fc1f, '{Fn}, #0.0'),
+    ('fccmp', 0x1e200400, 0xff200c10, '{Fn}, {Fm}, #{nzcv}, {cond12}'),
+    ('fccmpe', 0x1e200410, 0xff200c10, '{Fn}, {Fm}, #{nzcv}, {cond12}'),
+    ('fcsel', 0x1e200c00, 0xff200c00, '{Fd}, {Fn}, {Fm}, {cond12}'),
+    ('fmov', 0x1e201000, 0xff201fe0, '{Fd}, #{fpimm}'),
+    ('fmov', 0x1e260000, 0xfffffc00, '{Wd}, {Sn}'),
+    ('fmov', 0x1e270000, 0xfffffc00, '{Sd}, {Wn}'),
+    ('fmov', 0x9e660000, 0xfffffc00, '{Xd}, {Dn}'),
+    ('fmov', 0x9e670000, 0xfffffc00, '{Dd}, {Xn}'),
+    ('fmov', 0x9eae0000, 0xfffffc00, '{Xd}, v{n}.d[1]'),
+    ('fmov', 0x9eaf0000, 0xfffffc00, 'v{d}.d[1], {Xn}'),
+    # Advanced SIMD
+    ('{simd_imm_name}', 0x0f000400, 0x9ff80c00, '{simd_imm}'),
+    ('dup', 0x0e000c00, 0xbfe0fc00, '{Vd_dup}, {Rn_dup}'),
+    ('dup', 0x0e000400, 0xbfe0fc00, '{Vd_dup}, {Vn_elem}'),
+    ('ins', 0x4e001c00, 0xffe0fc00, '{Vd_elem}, {Rn_dup}'),
+    ('ins', 0x6e000400, 0xffe08400, '{Vd_elem}, {Vn_elem2}'),
+    ('umov', 0x0e003c00, 0xbfe0fc00, '{Rd_umov}, {Vn_elem}'),
+    ('smov', 0x0e002c00, 0xbfe0fc00, '{Rd_smov}, {Vn_elem}'),
+]
+# Register number fields used by the fmov element forms above
+fields['n'] = lambda x, a, s: bits(x, 9, 5)
+fields['d'] = lambda x, a, s: bits(x, 4, 0)
+
+def load_store_table():
+    table = []
+    # (name, size, V, opc, register prefix, scale)
+    ops = [
+        ('strb', 0, 0, 0, 'W', 0), ('ldrb', 0, 0, 1, 'W', 0), ('ldrsb', 0, 0, 2, 'X', 0), ('ldrsb', 0, 0, 3, 'W', 0),
+        ('strh', 1, 0, 0, 'W', 1), ('ldrh', 1, 0, 1, 'W', 1), ('ldrsh', 1, 0, 2, 'X', 1), ('ldrsh', 1, 0, 3, 'W', 1),
+        ('str', 2, 0, 0, 'W', 2), ('ldr', 2, 0, 1, 'W', 2), ('ldrsw', 2, 0, 2, 'X', 2),
+        ('str', 3, 0, 0, 'X', 3), ('ldr', 3, 0, 1, 'X', 3), ('prfm', 3, 0, 2, None, 3),
+        ('str', 0, 1, 0, 'B', 0), ('ldr', 0, 1, 1, 'B', 0), ('str', 0, 1, 2, 'Q', 4), ('ldr', 0, 1, 3, 'Q', 4),
+        ('str', 1, 1, 0, 'H', 1), ('ldr', 1, 1, 1, 'H', 1), ('str', 2, 1, 0, 'S', 2), ('ldr', 2, 1, 1, 'S', 2),
+        ('str', 3, 1, 0, 'D', 3), ('ldr', 3, 1, 1, 'D', 3),
+    ]
+    for name, size, v, opc, reg, scale in ops:
+        base = (size << 30) | (0b111 << 27) | (v << 26) | (opc << 22)
+        rt = '{prfop}' if reg is None else f'{{{reg}t}}'
+        unscaled = name.replace('prfm', 'prfum').replace('str', 'stur').replace('ldr', 'ldur')
+        table.append((name, base | (1 << 24), 0xffc00000, f'{rt}, [{{Xnsp}}{{uimm12_s{scale}}}]'))
+        table.append((unscaled, base, 0xffe00c00, f'{rt}, [{{Xnsp}}{{simm9_off}}]'))
+        table.append((name, base | (1 << 21) | (0b10 << 10), 0xffe00c00, f'{rt}, [{{Xnsp}}, {{regoff_s{scale}}}]'))
+        if reg is not None:
+            table.append((name, base | (0b01 << 10), 0xffe00c00, f'{rt}, [{{Xnsp}}], #{{simm9}}'))
+            table.append((name, base | (0b11 << 10), 0xffe00c00, f'{rt}, [{{Xnsp}}, #{{simm9}}]!'))
+        if reg is not None and not v:
+            # Unprivileged: ldtr, sttrb, ldtrsw, ...
+            table.append((name[:2] + 't' + name[2:], base | (0b10 << 10), 0xffe00c00, f'{rt}, [{{Xnsp}}{{simm9_off}}]'))
+    # Pairs: (name, opc, V, L, register prefix, scale)
+    pairs = [
+        ('stp', 0, 0, 0, 'W', 2), ('ldp', 0, 0, 1, 'W', 2), ('ldpsw', 1, 0, 1, 'X', 2),
+        ('stp', 2, 0, 0, 'X', 3), ('ldp', 2, 0, 1, 'X', 3), ('stp', 0, 1, 0, 'S', 2), ('ldp', 0, 1, 1, 'S', 2),
+        ('stp', 1, 1, 0, 'D', 3), ('ldp', 1, 1, 1, 'D', 3), ('stp', 2, 1, 0, 'Q', 4), ('ldp', 2, 1, 1, 'Q', 4),
+    ]
+    for name, opc, v, l, reg, scale in pairs:
+        base = (opc << 30) | (0b101 << 27) | (v << 26) | (l << 22)
+        regs = f'{{{reg}t}}, {{{reg}t2}}'
+        table.append((name, base | (0b01 << 23), 0xffc00000, f'{regs}, [{{Xnsp}}], #{{imm7_s{scale}}}'))
+        table.append((name, base | (0b10 << 23), 0xffc00000, f'{regs}, [{{Xnsp}}{{imm7_off_s{scale}}}]'))
+        table.append((name, base | (0b11 << 23), 0xffc00000, f'{regs}, [{{Xnsp}}, #{{imm7_s{scale}}}]!'))
+        if name != 'ldpsw':
+            table.append((name.replace('p', 'np'), base, 0xffc00000, f'{regs}, [{{Xnsp}}{{imm7_off_s{scale}}}]'))
+    # Exclusive and ordered, compare and swap, atomic memory operations
+    for size, suffix in [(0, 'b'), (1, 'h'), (2, ''), (3, '')]:
+        reg = 'X' if size == 3 else 'W'
+        base = size << 30
+        table += [
+            (f'stxr{suffix}', base | 0x08000000, 0xffe08000, f'{{Ws}}, {{{reg}t}}, [{{Xnsp}}]'),
+            (f'stlxr{suffix}', base | 0x08008000, 0xffe08000, f'{{Ws}}, {{{reg}t}}, [{{Xnsp}}]'),
+            # Rs and Rt2 should be all ones, decoded regardless like objdump does
+            (f'ldxr{suffix}', base | 0x08400000, 0xffe08000, f'{{{reg}t}}, [{{Xnsp}}]'),
+            (f'ldaxr{suffix}', base | 0x08408000, 0xffe08000, f'{{{reg}t}}, [{{Xnsp}}]'),
+            (f'stlr{suffix}', base | 0x08808000, 0xffe08000, f'{{{reg}t}}, [{{Xnsp}}]'),
+            (f'ldar{suffix}', base | 0x08c08000, 0xffe08000, f'{{{reg}t}}, [{{Xnsp}}]'),
+            # LORegion
+            (f'stllr{suffix}', base | 0x08800000, 0xffe08000, f'{{{reg}t}}, [{{Xnsp}}]'),
+            (f'ldlar{suffix}', base | 0x08c00000, 0xffe08000, f'{{{reg}t}}, [{{Xnsp}}]'),
+        ]
+        if size >= 2:
+            # Exclusive pairs, the same encodings with a byte or halfword size are casp
+            table += [
+                ('stxp', base | 0x08200000, 0xffe08000, f'{{Ws}}, {{{reg}t}}, {{{reg}t2}}, [{{Xnsp}}]'),
+                ('stlxp', base | 0x08208000, 0xffe08000, f'{{Ws}}, {{{reg}t}}, {{{reg}t2}}, [{{Xnsp}}]'),
+                ('ldxp', base | 0x08600000, 0xffe08000, f'{{{reg}t}}, {{{reg}t2}}, [{{Xnsp}}]'),
+                ('ldaxp', base | 0x08608000, 0xffe08000, f'{{{reg}t}}, {{{reg}t2}}, [{{Xnsp}}]'),
+            ]
+        for ordering, bits_al in [('', 0), ('a', 2), ('l', 1), ('al', 3)]:
+            acquire, release = bits_al >> 1, bits_al & 1
+            table.append((f'cas{ordering}{suffix}', base | 0x08a07c00 | (acquire << 22) | (release << 15), 0xffe0fc00,
+                          f'{{{reg}s}}, {{{reg}t}}, [{{Xnsp}}]'))
+            for op_name, o3, opc in [('ldadd', 0, 0), ('ldclr', 0, 1), ('ldeor', 0, 2), ('ldset', 0, 3), ('ldsmax', 0, 4),
+                                     ('ldsmin', 0, 5), ('ldumax', 0, 6), ('ldumin', 0, 7), ('swp', 1, 0)]:
+                match = base | 0x38200000 | (acquire << 23) | (release << 22) | (o3 << 15) | (opc << 12)
+                table.append((f'{op_name}{ordering}{suffix}', match, 0xffe0fc00, f'{{{reg}s}}, {{{reg}t}}, [{{Xnsp}}]'))
+    return table
+
+def simd_table():
+    table = []
+    # Three registers of the same type: (name, U, opcode, size restriction)
+    for name, u, opcode in [('add', 0, 0b10000), ('sub', 1, 0b10000), ('cmeq', 1, 0b10001), ('cmtst', 0, 0b10001),
+                            ('cmgt', 0, 0b00110), ('cmhi', 1, 0b00110), ('cmge', 0, 0b00111), ('cmhs', 1, 0b00111),
+                            ('addp', 0, 0b10111), ('sshl', 0, 0b01000), ('ushl', 1, 0b01000), ('mul', 0, 0b10011),
+                            ('smax', 0, 0b01100), ('smin', 0, 0b01101), ('umax', 1, 0b01100), ('umin', 1, 0b01101),
+                            ('mla', 0, 0b10010), ('mls', 1, 0b10010)]:
+        # No 2d arrangement for multiplies and min/max
+        vd = 'Vd' if opcode in [0b10000, 0b10001, 0b00110, 0b00111, 0b10111, 0b01000] else 'Vd_bhs'
+        table.append((name, 0x0e200400 | (u << 29) | (opcode << 11), 0xbf20fc00, f'{{{vd}}}, {{Vn}}, {{Vm}}'))
+    for name, u, size in [('and', 0, 0), ('bic', 0, 1), ('orr', 0, 2), ('orn', 0, 3), ('eor', 1, 0), ('bsl', 1, 1),
+                          ('bit', 1, 2), ('bif', 1, 3)]:
+        table.append((name, 0x0e201c00 | (u << 29) | (size << 22), 0xbfe0fc00, '{Vd_8b}, {Vn_8b}, {Vm_8b}'))
+    for name, u, sz_hi, opcode in [('fadd', 0, 0, 0b11010), ('fsub', 0, 1, 0b11010), ('fmul', 1, 0, 0b11011),
+                                   ('fdiv', 1, 0, 0b11111), ('fmla', 0, 0, 0b11001), ('fmls', 0, 1, 0b11001),
+                                   ('fmax', 0, 0, 0b11110), ('fmin', 0, 1, 0b11110), ('fcmeq', 0, 0, 0b11100),
+                                   ('fcmge', 1, 0, 0b11100), ('fcmgt', 1, 1, 0b11100), ('faddp', 1, 0, 0b11010)]:
+        table.append((name, 0x0e200400 | (u << 29) | (sz_hi << 23) | (opcode << 11), 0xbfa0fc00, '{Vd_fp}, {Vn_fp}, {Vm_fp}'))
+    # Load/store single structure: one lane (opcode<2:1> = 0-2) or, for loads, all lanes (ld1r-ld4r),
+    # without offset or post-indexed by the structure size (Rm = 31) or a register
+    for load in [0, 1]:
+        for nr in range(1, 5):
+            for scale in range(4 if load else 3):
+                name = f"{'ld' if load else 'st'}{nr}{'r' if scale == 3 else ''}"
+                match = 0x0d000000 | (load << 22) | (((nr - 1) & 1) << 21) | (scale << 14) | (((nr - 1) >> 1) << 13)
+                table.append((name, match, 0xbfffe000, '{simd_single_list}, [{Xnsp}]'))
+                table.append((name, match | 0x00800000, 0xbfe0e000, '{simd_single_list}, [{Xnsp}], {simd_single_post}'))
+    return table
+
+replicate_arrangements = ['8b', '16b', '4h', '8h', '2s', '4s', '1d', '2d'] # size << 1 | Q
+
+# Return (number of registers, element or arrangement, lane index or None for all lanes, bytes accessed)
+# of an Advanced SIMD load/store single structure
+def single_structure(x):
+    nr = ((bits(x, 13, 13) << 1) | bits(x, 21, 21)) + 1
+    scale = bits(x, 15, 14)
+    q, s, size = bits(x, 30, 30), bits(x, 12, 12), bits(x, 11, 10)
+    if scale == 3:
+        if s:
+            raise IndexError('reserved replicate')
+        return (nr, replicate_arrangements[(size << 1) | q], None, nr << size)
+    if (scale == 1 and size & 1) or (scale == 2 and (size & 2 or (size & 1 and s))):
+        raise IndexError('reserved size')
+    if scale == 2 and size & 1:
+        scale = 3
+    return (nr, 'bhsd'[scale], ((q << 3) | (s << 2) | size) >> scale, nr << scale)
+
+# Return the register list {vN.T, ...}, like objdump with a range for more than two ascending registers
+def vector_list(first, nr, suffix):
+    regs = [(first + i) % 32 for i in range(nr)]
+    if nr > 2 and regs[-1] > regs[0]:
+        return f'{{v{regs[0]}.{suffix}-v{regs[-1]}.{suffix}}}'
+    return '{' + ', '.join(f'v{reg}.{suffix}' for reg in regs) + '}'
+
+def simd_single_list(x):
+    nr, suffix, index, _ = single_structure(x)
+    res = vector_list(bits(x, 4, 0), nr, suffix)
+    return res if index is None else f'{res}[{index}]'
+
+def simd_single_post(x):
+    rm = bits(x, 20, 16)
+    return f'#{single_structure(x)[3]}' if rm == 31 else gpr(rm, True)
+
+fields['simd_single_list'] = lambda x, a, s: simd_single_list(x)
+fields['simd_single_post'] = lambda x, a, s: simd_single_post(x)
+
+for scale in range(5):
+    fields[f'uimm12_s{scale}'] = lambda x, a, s, scale=scale: offset(bits(x, 21, 10) << scale)
+    fields[f'regoff_s{scale}'] = lambda x, a, s, scale=scale: register_offset(x, scale)
+    fields[f'imm7_s{scale}'] = lambda x, a, s, scale=scale: sign_extend(bits(x, 21, 15), 7) << scale
+    fields[f'imm7_off_s{scale}'] = lambda x, a, s, scale=scale: offset(sign_extend(bits(x, 21, 15), 7) << scale)
+
+# Bits of an encoding that pick the bucket of candidate entries: op0 (28:25), plus bits 31:29 and 24:21
+BUCKET_MASK = 0xffe00000
+
+class aarch64_decoder:
+    def __init__(self):
+        self.buckets = dict() # key => [entry, ...]
+        for name, match, mask, template in base_table + load_store_table() + simd_table():
+            names = [field for _, field, _, _ in Formatter().parse(name + template) if field]
+            compiled = (name, match, mask, template, names, any(field in target_fields for field in names))
+            free = BUCKET_MASK & ~mask
+            sub = free
+            while True:
+                self.buckets.setdefault((match & BUCKET_MASK) | sub, []).append(compiled)
+                if sub == 0:
+                    break
+                sub = (sub - 1) & free
+        for bucket in self.buckets.values():
+            # Most specific first
+            bucket.sort(key=lambda entry: -bin(entry[2]).count('1'))
+        self.memo = dict() # encoding => (mnemonic, operands), or (name, template, field names) for PC-relative ones
+
+    def lookup(self, x):
+        for entry in self.buckets.get(x & BUCKET_MASK, []):
+            if x & entry[2] == entry[1]:
+                return entry
+        return None
+
+    def __format(self, x, addr, symbolize, name, template, names):
+        values = {field: fields[field](x, addr, symbolize) for field in names}
+        return (name.format(**values), template.format(**values))
+
+    # Return (mnemonic, operands) of the instruction x at addr, symbolize(target) formats branch targets
+    def disassemble(self, x, addr, symbolize):
+        res = self.memo.get(x)
+        if res is None:
+            entry = self.lookup(x)
+            if entry is None:
+                res = ('.inst', f'{x:#010x} ; undefined')
+            else:
+                name, match, mask, template, names, has_target = entry
+                if has_target:
+                    res = (name, template, names)
+                else:
+                    try:
+                        res = self.__format(x, addr, symbolize, name, template, names)
+                    except (TypeError, IndexError):
+                        # Reserved field values
+                        res = ('.inst', f'{x:#010x} ; undefined')
+            self.memo[x] = res
+        if len(res) == 3:
+            return self.__format(x, addr, symbolize, *res)
+        return res
+
+    # Yield (addr, hex_digits, instr) for the code in data (a memoryview) loaded at addr, like objdump prints them
+    def iter_instrs(self, data, addr, symbolize):
+        for (x,) in struct.iter_unpack('<I', data[:len(data) & ~3]):
+            mnemonic, operands = self.disassemble(x, addr, symbolize)
+            yield (addr, f'{x:08x}', f'{mnemonic}\t{operands}' if operands else mnemonic)
+            addr += 4
@@ -1,16 +1,24 @@
 #!/usr/bin/env python3
 
-import posixpath
+import functools
+import hashlib
+import numpy as np
 import subprocess
 import os
 import re
 from bisect import bisect_left, bisect_right
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import sys
-from elftools.elf.elffile import ELFFile
-from elftools.elf.sections import SymbolTableSection
-from elftools.dwarf.descriptions import describe_form_class
+from elftools.elf.constants import SH_FLAGS
 import pathlib
+from arch.cache import analysis_cache
+from arch.elf_image import elf_image
+from arch.interval import interval_index
+from arch.line_table import line_table
+from arch.dwarf import find_debug_file, cu_comp_dir, die_ranges, walk_cu_dies, line_rows, dwarf_cu_chunk, cu_chunks
+from arch.symtab import symbol_table, STT_FUNC, STT_SECTION, STT_FILE, STB_GLOBAL, STB_WEAK
+from arch.insn import instr_store, instr_view, cf_kind
 
 def insn_db_path():
     cur_dir = pathlib.Path(os.path.realpath(__file__))
@@ -22,23 +30,95 @@ def insn_db_path():
     else:
         return None
 
-def lpe_filename(line_program, file_index, comp_dir):
-    lp_header = line_program.header
-    file_entries = lp_header["file_entry"]
-    if lp_header.version < 5:
-        file_index -= 1
-    if file_index == -1:
+# Disassembler used by read_textdump: 'objdump' or 'native' (in-process decoder, where the arch has one)
+def disassembler_backend():
+    return os.environ.get('PYBINUTILS_DISASSEMBLER', 'objdump')
+
+# Return the first line of `objdump --version` (e.g. "GNU objdump (GNU Binutils) 2.42"), '' if it cannot run
+@functools.lru_cache(maxsize=None)
+def objdump_version(objdump):
+    proc = subprocess.run(f'{objdump} --version', shell=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    return proc.stdout.split('\n', 1)[0]
+
+# Return the SHA-1 of the source file of native decoder class decoder, its opcode tables are part of its code
+@functools.lru_cache(maxsize=None)
+def decoder_version(decoder):
+    with open(sys.modules[decoder.__module__].__file__, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+# Number of worker processes for parallel disassembly and DWARF decoding
+def default_jobs():
+    return int(os.environ.get('PYBINUTILS_JOBS', os.cpu_count() or 1))
+
+branch_target_re = re.compile(r'(?:^|[\s,])(?:0x)?([0-9a-fA-F]+)(?:\s+<[^>]*>)?$')
+
+# Return the absolute target address objdump prints for a direct branch, e.g. "ra,10450 <foo+0x10>"
+def parse_branch_target(operands):
+    m = branch_target_re.search(operands)
+    if m is None:
         return None
-    file_entry = file_entries[file_index]
-    dir_index = file_entry["dir_index"]
-    if dir_index == 0 and lp_header.version < 5:
-        return file_entry.name.decode()
-    if lp_header.version < 5:
-        dir_index -= 1
-    directory = lp_header["include_directory"][dir_index]
-    if directory[0] != b'/' or directory[0] == b'.':
-        directory = posixpath.join(comp_dir, directory)
-    return posixpath.join(directory, file_entry.name).decode()
+    return int(m.group(1), 16)
+
+objdump_section_re = re.compile(r'^Disassembly of section ([^:]+):$')
+objdump_symbol_re = re.compile(r'^([0-9a-fA-F]+)\s+<([^>]+)>:$')
+
+# Parse `objdump --visualize-jumps -d` output lines incrementally into store.
+# Yield (symbol_name, address, instr_view) for every symbol, only instructions in .text are kept.
+def parse_objdump(lines, store):
+    current_symbol = None
+    current_section = None
+    for line in lines:
+        line = line.strip()
+        if line == "" or line == "...":
+            continue
+        s = objdump_section_re.match(line)
+        if s:
+            current_section = s.group(1)
+            continue
+        m = objdump_symbol_re.match(line)
+        if m and m.group(2).startswith("."):
+            continue
+        if m:
+            if current_symbol:
+                yield (current_symbol[0], current_symbol[1], instr_view(store, current_symbol[2], len(store)))
+            current_symbol = (m.group(2), int(m.group(1), 16), len(store))
+        else:
+            if current_symbol and current_section == '.text':
+                # decode address
+                instr_tuple = line.split("\t")
+                addr = int(instr_tuple[0].strip()[:-1], 16)
+                hex_digits = "".join(filter(lambda x: x in '0123456789abcdef', instr_tuple[1]))
+                control_flow_dir = "".join(filter(lambda x: x in '-|+>X,\'', instr_tuple[1]))
+                rest = "\t".join(instr_tuple[2:])
+                store.append(addr, hex_digits, rest, control_flow_dir[-1] if len(control_flow_dir) > 0 else None)
+    if current_symbol:
+        yield (current_symbol[0], current_symbol[1], instr_view(store, current_symbol[2], len(store)))
+
+# Run objdump command `cmd` and stream its parsed records into store
+def objdump_records(cmd, store):
+    proc = subprocess.Popen(
+        cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1 << 20
+    )
+    try:
+        yield from parse_objdump(proc.stdout, store)
+    finally:
+        proc.stdout.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise Exception('Failed to objdump ELF file')
+
+# Process pool worker for parallel disassembly, return (store, [(symbol_name, address, instr_view), ...])
+def objdump_chunk(cmd):
+    store = instr_store()
+    return (store, list(objdump_records(cmd, store)))
+
+# Do not split .text into chunks smaller than this
+PARALLEL_CHUNK_MIN_SIZE = 256 * 1024
+# Decode DWARF CU by CU in a process pool when .debug_info is at least this large
+PARALLEL_DWARF_MIN_SIZE = 4 * 1024 * 1024
+
+# Number of symbol subsets of read_textdump(symbols=...) kept in the on-disk cache of an ELF
+TEXTDUMP_SUBSET_ENTRIES = 16
 
 skip_target = set()
 
@@ -47,142 +127,206 @@ class arch_tools:
         from arch.aarch64 import aarch64_tools
         from arch.riscv64 import riscv64_tools
         from arch.x86_64 import x86_64_tools
-        f = open(elf_path, 'rb')
-        elf = ELFFile(f)
-        if elf['e_machine'] == 'EM_AARCH64':
+        image = elf_image(elf_path)
+        machine = image.elf['e_machine']
+        image.close()
+        if machine == 'EM_AARCH64':
             return aarch64_tools(elf_path)
-        elif elf['e_machine'] == 'EM_X86_64':
+        elif machine == 'EM_X86_64':
             return x86_64_tools(elf_path)
-        elif elf['e_machine'] == 'EM_RISCV':
+        elif machine == 'EM_RISCV':
             return riscv64_tools(elf_path)
         else:
             raise Exception('Unsupported ELF file')
 
-    # Return {symbol_name: [{'addr': address, 'size': size, 'type': type, 'bind': bind, 'section': section_name}, ...]}
-    def read_symbol_table(self):
-        symbols = dict()
-        for section in self.elf.iter_sections():
-            if not isinstance(section, SymbolTableSection):
-                continue
-            for sym in section.iter_symbols():
-                name = sym.name
-                if not name:
-                    continue
-                value = sym.entry['st_value']
-                if value == 0:
-                    continue
-                if name not in symbols:
-                    symbols[name] = []
-                section_name = None
-                shndx = sym.entry['st_shndx']
-                if isinstance(shndx, int) and shndx < self.elf.num_sections():
-                    section_name = self.elf.get_section(shndx).name
-                symbols[name].append({
-                    'addr': value,
-                    'size': sym.entry['st_size'],
-                    'type': sym.entry['st_info']['type'],
-                    'bind': sym.entry['st_info']['bind'],
-                    'section': section_name
-                })
-        return symbols
-
-    def _decode_name(self, value):
-        if value is None:
-            return None
-        if isinstance(value, bytes):
-            return value.decode(errors='replace')
-        return str(value)
-
-    def _get_die_name(self, die):
-        if die is None:
-            return None
-        attrs = die.attributes
-        for key in ('DW_AT_linkage_name', 'DW_AT_MIPS_linkage_name', 'DW_AT_name'):
-            if key in attrs:
-                name = self._decode_name(attrs[key].value)
-                if name:
-                    return name
-        return None
+    # Parameters other than the ELF itself that analysis results depend on
+    def analysis_params(self):
+        return (type(self).__name__, self.objdump)
 
-    def _die_ranges(self, dwarfinfo, cu, die):
-        attrs = die.attributes
-        ranges = []
+    def _analysis_cache(self):
+        if self.cache is None:
+            self.cache = analysis_cache(self.elf_path, self.elf)
+        return self.cache
 
-        if 'DW_AT_ranges' in attrs:
-            range_lists = dwarfinfo.range_lists()
-            offset = attrs['DW_AT_ranges'].value
-            try:
-                raw_ranges = range_lists.get_range_list_at_offset(offset, cu=cu)
-            except TypeError:
-                raw_ranges = range_lists.get_range_list_at_offset(offset)
+    # Version of the disassembler of read_textdump, part of the cache key of its results
+    def disassembler_version(self):
+        return objdump_version(self.objdump)
 
-            base_addr = 0
-            if 'DW_AT_low_pc' in attrs:
-                base_addr = attrs['DW_AT_low_pc'].value
-            else:
-                top_attrs = cu.get_top_DIE().attributes
-                if 'DW_AT_low_pc' in top_attrs:
-                    base_addr = top_attrs['DW_AT_low_pc'].value
+    # Load result `name` from the on-disk analysis cache, or build and store it, see analysis_cache.get
+    def _cached(self, name, builder, params=(), max_entries=None):
+        return self._analysis_cache().get(name, builder, (self.analysis_params(), params), max_entries)
 
-            for entry in raw_ranges:
-                if hasattr(entry, 'base_address'):
-                    base_addr = entry.base_address
+    # Return the symbol_table of the ELF, a Mapping {symbol_name: [{'addr': address, 'size': size, 'type': type,
+    # 'bind': bind, 'section': section_name}, ...]} over NumPy arrays of all symbols.
+    # It is decoded from the mapped .symtab/.dynsym once per ELF, which is faster than loading a cached copy.
+    def read_symbol_table(self):
+        if self.symtab is None:
+            self.symtab = symbol_table(self.image)
+        return self.symtab
+
+    # Return an interval_index of the STT_FUNC symbols with a size, labeled by symbol name,
+    # to map addresses (e.g. sample PCs) to functions in bulk with lookup_labels(addrs)
+    def function_index(self):
+        if self.func_index is None:
+            symtab = self.read_symbol_table()
+            rows = np.flatnonzero((symtab.types == STT_FUNC) & (symtab.sizes != 0)).tolist()
+            self.func_index = interval_index(
+                (int(symtab.values[row]), int(symtab.values[row] + symtab.sizes[row]), symtab.name(row)) for row in rows)
+        return self.func_index
+
+    # Return an interval_index of the basic blocks of read_basic_blocks() result bb, labeled by (symbol, bb_addr)
+    def basic_block_index(self, bb):
+        intervals = []
+        for symbol in bb:
+            for bb_addr, instrs in bb[symbol]['bb'].items():
+                store = instrs.store
+                last = instrs.hi - 1
+                intervals.append((bb_addr, store.addrs[last] + store.encoding_lens[last], (symbol, bb_addr)))
+        return interval_index(intervals)
+
+    # Return the addresses of all instructions of read_textdump() result textdump as a NumPy array.
+    # A symbol name can cover several functions (e.g. local .isra/.constprop copies) in different CUs,
+    # pass these rather than the symbol addresses to read_dwarf(pcs) to get the lines of all of them.
+    @staticmethod
+    def textdump_addrs(textdump):
+        return np.concatenate([np.frombuffer(textdump[symbol]['instr'].keys(), dtype=np.uint64) for symbol in textdump]
+                              or [np.zeros(0, dtype=np.uint64)])
+
+    # Return the dict kept on the tools object for the decoded DWARF, {'dwarfinfo': dwarfinfo, 'path': path, ...}.
+    # DWARF is read from the ELF itself when it has .debug_info, otherwise from its separate debug file
+    # (see find_debug_file), which is memory mapped and only has its debug sections parsed.
+    def _dwarf_state(self):
+        if self.dwarf_dies is None:
+            elf = self.elf
+            path = self.elf_path
+            if not (elf.has_section('.debug_info') or elf.has_section('.zdebug_info')):
+                debug_path = find_debug_file(self.elf_path, elf)
+                if debug_path is not None:
+                    image = elf_image(debug_path)
+                    self.openfiles.append(image)
+                    elf = image.elf
+                    path = debug_path
+            self.dwarf_dies = {'dwarfinfo': elf.get_dwarf_info(), 'path': path, 'elf': elf}
+        return self.dwarf_dies
+
+    # Return {'dwarfinfo': dwarfinfo, 'cus': [(CU, comp_dir), ...]}
+    def read_dwarf_cus(self):
+        dwarf_dies = self._dwarf_state()
+        if 'cus' not in dwarf_dies:
+            dwarf_dies['cus'] = [(CU, cu_comp_dir(CU)) for CU in dwarf_dies['dwarfinfo'].iter_CUs()]
+        return dwarf_dies
+
+    # Return an interval_index of the address ranges of CUs labeled by CU offset, from .debug_aranges,
+    # and from the ranges of the CU DIEs for the CUs .debug_aranges does not cover (it is often partial,
+    # e.g. for clang or assembler CUs, or missing)
+    def dwarf_cu_index(self):
+        dwarf_dies = self._dwarf_state()
+        if 'cu_index' not in dwarf_dies:
+            dwarfinfo = dwarf_dies['dwarfinfo']
+            aranges = dwarfinfo.get_aranges()
+            intervals = []
+            covered = set()
+            if aranges is not None:
+                for entry in aranges.entries:
+                    covered.add(entry.info_offset)
+                    if entry.length != 0:
+                        intervals.append((entry.begin_addr, entry.begin_addr + entry.length, entry.info_offset))
+            for CU, comp_dir in self.read_dwarf_cus()['cus']:
+                if CU.cu_offset in covered:
                     continue
-                begin = entry.begin_offset
-                end = entry.end_offset
-                if getattr(entry, 'is_absolute', False):
-                    ranges.append((begin, end))
-                else:
-                    ranges.append((base_addr + begin, base_addr + end))
-            return ranges
-
-        if 'DW_AT_low_pc' in attrs and 'DW_AT_high_pc' in attrs:
-            low_pc = attrs['DW_AT_low_pc'].value
-            high_pc_attr = attrs['DW_AT_high_pc']
-            high_pc_class = describe_form_class(high_pc_attr.form)
-            if high_pc_class == 'address':
-                high_pc = high_pc_attr.value
-            else:
-                high_pc = low_pc + high_pc_attr.value
-            return [(low_pc, high_pc)]
-
-        return ranges
+                try:
+                    ranges = die_ranges(dwarfinfo, CU, CU.get_top_DIE())
+                except Exception:
+                    ranges = []
+                intervals.extend((start, end, CU.cu_offset) for start, end in ranges if start < end)
+            dwarf_dies['cu_index'] = interval_index(intervals)
+        return dwarf_dies['cu_index']
+
+    # Return the offsets of the CUs containing any of pcs, in .debug_info order
+    def dwarf_cus_at(self, pcs):
+        index = self.dwarf_cu_index()
+        rows = index.lookup(pcs)
+        return sorted(set(index.labels[row] for row in np.unique(rows[rows >= 0]).tolist()))
+
+    # Return the lists of CU offsets to decode in parallel, or None to decode in-process.
+    # Large .debug_info sections are split across jobs workers (default: $PYBINUTILS_JOBS or the number of CPUs),
+    # each reopens the ELF and decodes its CUs independently.
+    def _dwarf_chunks(self, jobs=None):
+        if jobs is None:
+            jobs = default_jobs()
+        debug_info = self._dwarf_state()['elf'].get_section_by_name('.debug_info')
+        if jobs <= 1 or debug_info is None or debug_info['sh_size'] < PARALLEL_DWARF_MIN_SIZE:
+            return None
+        chunks = cu_chunks([CU for CU, comp_dir in self.read_dwarf_cus()['cus']], jobs)
+        if len(chunks) <= 1:
+            return None
+        return chunks
+
+    # Run dwarf_cu_chunk over chunks in a process pool, return the results in CU order
+    def _map_dwarf_chunks(self, chunks, kind, jobs=None):
+        if jobs is None:
+            jobs = default_jobs()
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(dwarf_cu_chunk, [self._dwarf_state()['path']] * len(chunks), chunks, [kind] * len(chunks)))
+
+    # Walk the DIEs of all CUs once and add to read_dwarf_cus() result
+    # 'subprograms': [(symbol, [(start_pc, end_pc), ...]), ...] and
+    # 'inlined': [(inlined_symbol, [(start_pc, end_pc), ...], call_file, call_line), ...] in DIE order,
+    # only entries with a name and ranges are kept.
+    # read_functions_ranges and read_inline_info share the result.
+    # With pcs, only the CUs containing them are walked (see dwarf_cu_index), each CU once per tools object,
+    # and {'subprograms': [...], 'inlined': [...]} of those CUs is returned.
+    def read_dwarf_dies(self, jobs=None, pcs=None):
+        if pcs is not None and 'subprograms' not in self._dwarf_state():
+            return self.__read_dwarf_dies_lazy(pcs)
+        dwarf_dies = self.read_dwarf_cus()
+        if 'subprograms' in dwarf_dies:
+            return dwarf_dies
+        subprograms = []
+        inlined = []
+        chunks = self._dwarf_chunks(jobs)
+        if chunks is None:
+            origin_names = dict()
+            for CU, comp_dir in dwarf_dies['cus']:
+                walk_cu_dies(dwarf_dies['dwarfinfo'], CU, subprograms, inlined, origin_names)
+        else:
+            for chunk_subprograms, chunk_inlined in self._map_dwarf_chunks(chunks, 'dies', jobs):
+                subprograms.extend(chunk_subprograms)
+                inlined.extend(chunk_inlined)
+        dwarf_dies['subprograms'] = subprograms
+        dwarf_dies['inlined'] = inlined
+        return dwarf_dies
+
+    def __read_dwarf_dies_lazy(self, pcs):
+        dwarf_dies = self._dwarf_state()
+        dwarfinfo = dwarf_dies['dwarfinfo']
+        cu_dies = dwarf_dies.setdefault('cu_dies', dict()) # CU offset => (subprograms, inlined)
+        origin_names = dwarf_dies.setdefault('origin_names', dict())
+        res = {'subprograms': [], 'inlined': []}
+        for offset in self.dwarf_cus_at(pcs):
+            if offset not in cu_dies:
+                cu_dies[offset] = ([], [])
+                walk_cu_dies(dwarfinfo, dwarfinfo.get_CU_at(offset), cu_dies[offset][0], cu_dies[offset][1], origin_names)
+            res['subprograms'].extend(cu_dies[offset][0])
+            res['inlined'].extend(cu_dies[offset][1])
+        return res
 
     # Return {symbol: [(start_pc, end_pc), ...]}
     # Keep original symbol name as-is (including '.' if present).
     def read_functions_ranges(self):
         res = dict()
-        dwarfinfo = self.elf.get_dwarf_info()
-
-        for CU in dwarfinfo.iter_CUs():
-            for DIE in CU.iter_DIEs():
-                if DIE.tag != 'DW_TAG_subprogram':
-                    continue
-                symbol_name = self._get_die_name(DIE)
-                if symbol_name is None:
-                    continue
-                try:
-                    ranges = self._die_ranges(dwarfinfo, CU, DIE)
-                except Exception:
-                    ranges = []
-                if len(ranges) == 0:
-                    continue
-                if symbol_name not in res:
-                    res[symbol_name] = []
-                res[symbol_name].extend(ranges)
-
-        symbol_table = self.read_symbol_table()
-        for symbol_name, entries in symbol_table.items():
-            for entry in entries:
-                if entry.get('type') != 'STT_FUNC':
-                    continue
-                start = entry.get('addr', 0)
-                size = entry.get('size', 0)
-                if start == 0 or size == 0:
-                    continue
-                if symbol_name not in res:
-                    res[symbol_name] = []
-                res[symbol_name].append((start, start + size))
+        for symbol_name, ranges in self.read_dwarf_dies()['subprograms']:
+            if symbol_name not in res:
+                res[symbol_name] = []
+            res[symbol_name].extend(ranges)
+
+        symtab = self.read_symbol_table()
+        for row in np.flatnonzero((symtab.types == STT_FUNC) & (symtab.sizes != 0)).tolist():
+            symbol_name = symtab.name(row)
+            start = int(symtab.values[row])
+            if symbol_name not in res:
+                res[symbol_name] = []
+            res[symbol_name].append((start, start + int(symtab.sizes[row])))
 
         return res
 
@@ -190,24 +334,6 @@ class arch_tools:
     # Return {symbol: {inlined_symbol: [(offset_from_symbol_start, offset_from_symbol_end), ...], ...}, ...}
     # If symbol is specified, only matching symbols are returned.
     def read_inline_info(self):
-        def add_inline_from_die(res, dwarfinfo, cu, die):
-            if die.tag != 'DW_TAG_inlined_subroutine':
-                return
-            if 'DW_AT_abstract_origin' not in die.attributes:
-                return
-            try:
-                origin_DIE = die.get_DIE_from_attribute('DW_AT_abstract_origin')
-            except Exception:
-                return
-            origin_name = self._get_die_name(origin_DIE)
-            if origin_name is None:
-                return
-            try:
-                ranges = self._die_ranges(dwarfinfo, cu, die)
-            except Exception:
-                ranges = []
-            res.append((origin_name, ranges))
-
         def normalize_ranges(ranges):
             uniq = sorted(set(ranges), key=lambda x: (x[0], x[1]))
             return uniq
@@ -221,7 +347,6 @@ class arch_tools:
                 return (ov_start - base_addr, ov_end - base_addr)
             return None
 
-        dwarfinfo = self.elf.get_dwarf_info()
         all_functions_ranges = self.read_functions_ranges()
         symbol_table = self.read_symbol_table()
 
@@ -255,51 +380,24 @@ class arch_tools:
             function_base = min(map(lambda x: x[0], normalized))
             function_meta.append((func_name, normalized, function_base))
 
-        function_range_meta = []
-        for func_name, func_ranges, function_base in function_meta:
-            for func_range in func_ranges:
-                function_range_meta.append((func_range[0], func_range[1], func_name, function_base))
-        function_range_meta.sort(key=lambda x: x[0])
-        range_starts = [item[0] for item in function_range_meta]
-        prefix_max_ends = []
-        max_end_so_far = 0
-        for _, end, _, _ in function_range_meta:
-            max_end_so_far = max(max_end_so_far, end)
-            prefix_max_ends.append(max_end_so_far)
-
-        for CU in dwarfinfo.iter_CUs():
-            for DIE in CU.iter_DIEs():
-                if DIE.tag != 'DW_TAG_inlined_subroutine':
-                    continue
-                if 'DW_AT_abstract_origin' not in DIE.attributes:
-                    continue
-                try:
-                    origin_DIE = DIE.get_DIE_from_attribute('DW_AT_abstract_origin')
-                except Exception:
-                    continue
-                origin_name = self._get_die_name(origin_DIE)
-                if origin_name is None:
-                    continue
-                try:
-                    inline_ranges = self._die_ranges(dwarfinfo, CU, DIE)
-                except Exception:
-                    inline_ranges = []
-                if len(inline_ranges) == 0:
-                    continue
-
-                for inline_range in inline_ranges:
-                    i_start, i_end = inline_range
-                    left_idx = bisect_right(prefix_max_ends, i_start)
-                    right_idx = bisect_left(range_starts, i_end)
-
-                    for idx in range(left_idx, right_idx):
-                        f_start, f_end, func_name, function_base = function_range_meta[idx]
-                        offset = overlap_offset(inline_range, (f_start, f_end), function_base)
-                        if offset is None:
-                            continue
-                        if origin_name not in result[func_name]:
-                            result[func_name][origin_name] = []
-                        result[func_name][origin_name].append(offset)
+        function_range_index = interval_index(
+            (f_start, f_end, (func_name, function_base))
+            for func_name, func_ranges, function_base in function_meta
+            for f_start, f_end in func_ranges)
+
+        for origin_name, inline_ranges, call_file, call_line in self.read_dwarf_dies()['inlined']:
+            for inline_range in inline_ranges:
+                i_start, i_end = inline_range
+                for idx in function_range_index.overlapping(i_start, i_end):
+                    f_start = int(function_range_index.starts[idx])
+                    f_end = int(function_range_index.ends[idx])
+                    func_name, function_base = function_range_index.labels[idx]
+                    offset = overlap_offset(inline_range, (f_start, f_end), function_base)
+                    if offset is None:
+                        continue
+                    if origin_name not in result[func_name]:
+                        result[func_name][origin_name] = []
+                    result[func_name][origin_name].append(offset)
 
         cleaned_result = dict()
         for func_name in result:
@@ -311,86 +409,332 @@ class arch_tools:
 
         return cleaned_result
 
-    # Return ({filename: {line: line_num, col: col_num, pc: pc, is_stmt: is_stmt, basic_block: basic_block, end_sequence: end_sequence, prologue_end: prologue_end}})
-    def read_dwarf(self):
-        res = {}
-        dwarfinfo = self.elf.get_dwarf_info()
-        for CU in dwarfinfo.iter_CUs():
-            top_DIE = CU.get_top_DIE()
-            comp_dir = None
-            if 'DW_AT_comp_dir' in top_DIE.attributes:
-                comp_dir = top_DIE.attributes['DW_AT_comp_dir'].value
-            line_program = dwarfinfo.line_program_for_CU(CU)
-            if line_program is None:
-                continue
-            lp_entries = line_program.get_entries()
-            for lpe in lp_entries:
-                if not lpe.state:
-                    continue
-                filename = lpe_filename(line_program, lpe.state.file, comp_dir)
-                if filename is None:
-                    continue
-                line_num = lpe.state.line
-                col_num = lpe.state.column
-                pc = lpe.state.address
-                is_stmt = True if lpe.state.is_stmt else False
-                basic_block = True if lpe.state.basic_block else False
-                end_sequence = True if lpe.state.end_sequence else False
-                prologue_end = True if lpe.state.prologue_end else False
-                if filename not in res:
-                    res[filename] = []
-                res[filename].append({
-                    'line': line_num,
-                    'col': col_num,
-                    'pc': pc,
-                    'is_stmt': is_stmt,
-                    'basic_block': basic_block,
-                    'end_sequence': end_sequence,
-                    'prologue_end': prologue_end
-                })
+    # Return for each of pcs the inlined subroutines containing it, outermost first:
+    # [[{'name': inlined_symbol, 'call_file': call_file, 'call_line': call_line}, ...], ...]
+    # Only the CUs containing pcs are walked, unless read_dwarf_dies already walked all of them; the index
+    # of their inlined subroutines is kept per set of CUs, query all pcs of interest at once.
+    def inline_stack(self, pcs):
+        dwarf_dies = self._dwarf_state()
+        if 'subprograms' in dwarf_dies:
+            inlined = dwarf_dies['inlined']
+            if 'inline_index' not in dwarf_dies:
+                dwarf_dies['inline_index'] = self.__inline_index(inlined)
+            index = dwarf_dies['inline_index']
+        else:
+            offsets = tuple(self.dwarf_cus_at(pcs))
+            indexes = dwarf_dies.setdefault('inline_indexes', dict()) # CU offsets => (inlined, interval_index)
+            if offsets not in indexes:
+                inlined = self.read_dwarf_dies(pcs=pcs)['inlined']
+                indexes[offsets] = (inlined, self.__inline_index(inlined))
+            inlined, index = indexes[offsets]
+        res = []
+        for idxs in index.stabbing(pcs):
+            # Nested inlined subroutines follow the ones containing them in DIE order
+            rows = sorted(index.labels[idx] for idx in idxs)
+            res.append([{'name': inlined[row][0], 'call_file': inlined[row][2], 'call_line': inlined[row][3]} for row in rows])
         return res
 
-    # Return {symbol_name: {'addr': address, 'instr': {addr: (hex_code, instr)}}}
-    def read_textdump(self, objdump_opts=''):
-        result = subprocess.run(
-            f'{self.objdump} {objdump_opts} --visualize-jumps -d {self.elf_path}',
-            shell=True, capture_output=True, text=True
-        )
-        if result.returncode != 0:
-            raise Exception('Failed to objdump ELF file')
-        section_re = re.compile(r'^Disassembly of section ([^:]+):$')
-        symbol_re = re.compile(r'^([0-9a-fA-F]+)\s+<([^>]+)>:$')
-        symbols = OrderedDict()
-        current_symbol = None
-        current_section = None
-        lines = result.stdout.splitlines()
-        for line in lines:
-            line = line.strip()
-            if line == "" or line == "...":
-                continue
-            s = section_re.match(line)
-            if s:
-                current_section = s.group(1)
+    # Return an interval_index of the ranges of inlined, labeled by row in inlined
+    def __inline_index(self, inlined):
+        return interval_index((start, end, row) for row, (name, ranges, call_file, call_line) in enumerate(inlined)
+                              for start, end in ranges if start < end)
+
+    # Return the line_table of all CUs, rows (pc, filename, line, col, flags) as NumPy arrays sorted by pc.
+    # It is also a Mapping {filename: [{line: line_num, col: col_num, pc: pc, is_stmt: is_stmt, basic_block: basic_block,
+    # end_sequence: end_sequence, prologue_end: prologue_end, filename: filename}, ...]}
+    # With pcs, only the line programs of the CUs containing them are decoded (see dwarf_cu_index), each CU
+    # once per tools object, and the line_table of those CUs is returned; a full table already cached is
+    # returned as is. Use it when only the lines of a few addresses (e.g. hot functions) are needed.
+    def read_dwarf(self, pcs=None):
+        if pcs is None:
+            return self._cached('dwarf', self.__read_dwarf)
+        full = self._analysis_cache().peek('dwarf', (self.analysis_params(), ()))
+        if full is not None:
+            return full
+        dwarf_dies = self._dwarf_state()
+        dwarfinfo = dwarf_dies['dwarfinfo']
+        cu_lines = dwarf_dies.setdefault('cu_lines', dict()) # CU offset => line_table
+        offsets = self.dwarf_cus_at(pcs)
+        for offset in offsets:
+            if offset not in cu_lines:
+                CU = dwarfinfo.get_CU_at(offset)
+                rows = line_rows()
+                rows.add_cu(dwarfinfo, CU, cu_comp_dir(CU))
+                cu_lines[offset] = rows.table()
+        return line_table.merge([cu_lines[offset] for offset in offsets])
+
+    def __read_dwarf(self):
+        chunks = self._dwarf_chunks()
+        if chunks is not None:
+            return line_table.merge(self._map_dwarf_chunks(chunks, 'lines'))
+        rows = line_rows()
+        dwarf_cus = self.read_dwarf_cus()
+        for CU, comp_dir in dwarf_cus['cus']:
+            rows.add_cu(dwarf_cus['dwarfinfo'], CU, comp_dir)
+        return rows.table()
+
+    # Return {symbol_name: {'addr': address, 'instr': {addr: insn}}}
+    # 'instr' is an instr_view backed by one instr_store shared by all symbols
+    # jobs: number of objdump processes to run in parallel, see iter_textdump
+    # symbols: only disassemble these functions (and any symbol objdump prints inside their ranges)
+    # A subset is served from the full textdump when it is cached, otherwise it is cached on its own among the
+    # TEXTDUMP_SUBSET_ENTRIES most recently used subsets
+    def read_textdump(self, objdump_opts='', jobs=None, symbols=None):
+        params = (objdump_opts, self.disassembler_version())
+        if symbols is None:
+            return self._cached('textdump', lambda: self.__read_textdump(objdump_opts, jobs), params)
+        symbols = tuple(sorted(set(symbols)))
+        full_textdump = self._analysis_cache().peek('textdump', (self.analysis_params(), params))
+        if full_textdump is not None:
+            return OrderedDict((sym, full_textdump[sym]) for sym in full_textdump if sym in symbols)
+        return self._cached('textdump_subset', lambda: self.__read_textdump(objdump_opts, jobs, symbols), params + (symbols,),
+                            TEXTDUMP_SUBSET_ENTRIES)
+
+    def __read_textdump(self, objdump_opts, jobs, symbols=None):
+        store = instr_store()
+        symbols_res = OrderedDict()
+        for symbol_name, address, instrs in self.iter_textdump(objdump_opts, jobs, symbols, store):
+            if symbol_name not in symbols_res:
+                symbols_res[symbol_name] = {'addr': address, 'instr': instrs}
+            elif len(instrs) > 0:
+                symbols_res[symbol_name]['instr'] = store.merge(symbols_res[symbol_name]['instr'], instrs)
+        return symbols_res
+
+    def _objdump_cmd(self, objdump_opts, extra_opts=''):
+        return f'{self.objdump} {objdump_opts} --visualize-jumps -d {extra_opts} {self.elf_path}'
+
+    # Return [(start, stop), ...] covering the functions named in symbols, sorted by address.
+    # A function extends to the next function start like in a full objdump run, so trailing padding is kept.
+    # Symbols without a size or of another type in executable sections (e.g. assembly labels) extend to
+    # the next symbol objdump prints, or to the end of their section.
+    def _symbol_ranges(self, symbols):
+        symbol_table = self.read_symbol_table()
+        funcs = symbol_table.types == STT_FUNC
+        labels = (symbol_table.types != STT_SECTION) & (symbol_table.types != STT_FILE)
+        section_starts = dict() # (section, functions only) => [addr, ...]
+        def next_start(section, start, functions_only):
+            key = (section, functions_only)
+            if key not in section_starts:
+                rows = (funcs if functions_only else labels) & symbol_table.in_section(section)
+                section_starts[key] = np.unique(symbol_table.values[rows]).tolist()
+            starts = section_starts[key]
+            next_idx = bisect_right(starts, start)
+            return starts[next_idx] if next_idx < len(starts) else None
+        ranges = set()
+        for symbol in symbols:
+            for entry in symbol_table.get(symbol, []):
+                section = self.elf.get_section_by_name(entry['section']) if entry['section'] else None
+                if section is None or not section['sh_flags'] & SH_FLAGS.SHF_EXECINSTR:
+                    continue
+                if entry['type'] in ('STT_SECTION', 'STT_FILE'):
+                    continue
+                start = entry['addr']
+                stop = start + entry['size']
+                sized_function = entry['type'] == 'STT_FUNC' and entry['size'] != 0
+                next_addr = next_start(entry['section'], start, sized_function)
+                if next_addr is None:
+                    next_addr = section['sh_addr'] + section['sh_size']
+                stop = max(stop, next_addr)
+                if stop > start:
+                    ranges.add((start, stop))
+        return sorted(ranges)
+
+    # Split the disassembly into objdump invocations that can run independently, in output order.
+    # .text is cut at function starts into chunks of roughly equal size, the other executable
+    # sections (.init, .plt, ...) are disassembled by one invocation before and one after .text.
+    # Return [extra_opts, ...]
+    def _disassembly_jobs(self, jobs, symbols=None):
+        if symbols is not None:
+            return [f'--start-address={hex(start)} --stop-address={hex(stop)}' for start, stop in self._symbol_ranges(symbols)]
+        text = self.elf.get_section_by_name('.text')
+        if jobs <= 1 or text is None or text['sh_size'] < PARALLEL_CHUNK_MIN_SIZE * 2:
+            return ['']
+        text_start = text['sh_addr']
+        text_end = text_start + text['sh_size']
+        symtab = self.read_symbol_table()
+        values = symtab.values
+        func_starts = np.unique(values[(symtab.types == STT_FUNC) & symtab.in_section('.text')
+                                       & (values > text_start) & (values < text_end)]).tolist()
+        # A few chunks per worker so that one huge function does not serialize the whole run
+        chunk_size = max(PARALLEL_CHUNK_MIN_SIZE, text['sh_size'] // (jobs * 4))
+        bounds = [text_start]
+        for addr in func_starts:
+            if addr - bounds[-1] >= chunk_size:
+                bounds.append(addr)
+        bounds.append(text_end)
+        text_jobs = [f'--start-address={hex(start)} --stop-address={hex(stop)}' for start, stop in zip(bounds, bounds[1:])]
+        before, after = [], []
+        for section in self.elf.iter_sections():
+            if section.name == '.text' or not (section['sh_flags'] & SH_FLAGS.SHF_EXECINSTR):
                 continue
-            m = symbol_re.match(line)
-            if m and m.group(2).startswith("."):
+            (before if section['sh_addr'] < text_start else after).append(f'-j {section.name}')
+        if before:
+            text_jobs.insert(0, ' '.join(before))
+        if after:
+            text_jobs.append(' '.join(after))
+        return text_jobs
+
+    # Stream objdump output through a pipe and yield (symbol_name, address, instr_view) as soon as each
+    # symbol is complete, so the full disassembly text is never held in memory. Instructions are stored
+    # in store (a new instr_store if None), the view maps {addr: insn} with the control flow kind and
+    # direct branch target already decoded.
+    # A symbol name may be yielded more than once, read_textdump merges them into the first one.
+    # With jobs > 1, large ELFs are disassembled in function-aligned address ranges by a process pool
+    # (default: $PYBINUTILS_JOBS or the number of CPUs); --visualize-jumps only draws jumps within a
+    # function, so the result is identical to a single objdump run.
+    # With symbols, only the address ranges of those functions are disassembled.
+    def iter_textdump(self, objdump_opts='', jobs=None, symbols=None, store=None):
+        if store is None:
+            store = instr_store()
+        if jobs is None:
+            jobs = default_jobs()
+        disassembly_jobs = self._disassembly_jobs(jobs, symbols)
+        candidates = [] # mnemonic id of store => may_change_control_flow
+        if len(disassembly_jobs) == 1 or jobs <= 1:
+            for extra_opts in disassembly_jobs:
+                for symbol_name, address, instrs in objdump_records(self._objdump_cmd(objdump_opts, extra_opts), store):
+                    self._decode_control_flow(instrs, candidates)
+                    yield (symbol_name, address, instrs)
+            return
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            cmds = [self._objdump_cmd(objdump_opts, extra_opts) for extra_opts in disassembly_jobs]
+            for chunk_store, records in executor.map(objdump_chunk, cmds):
+                base = store.extend(chunk_store)
+                for symbol_name, address, instrs in records:
+                    instrs = instr_view(store, instrs.lo + base, instrs.hi + base)
+                    self._decode_control_flow(instrs, candidates)
+                    yield (symbol_name, address, instrs)
+
+    # Decode the control flow kind and direct target of every instruction in instrs once, so that
+    # the per-instruction queries below never split instruction text
+    def _decode_control_flow(self, instrs, candidates):
+        store = instrs.store
+        for mnemonic in store.mnemonics[len(candidates):]:
+            candidates.append(self.may_change_control_flow(mnemonic))
+        for row in instrs.rows():
+            if not candidates[store.mnemonic_ids[row]]:
                 continue
-            if m:
-                address = m.group(1)
-                symbol_name = m.group(2)
-                current_symbol = symbol_name
-                if symbol_name not in symbols:
-                    symbols[symbol_name] = {'addr': int(address, 16), 'instr': OrderedDict()}
-            else:
-                if current_symbol and current_section == '.text':
-                    # decode address
-                    instr_tuple = line.split("\t")
-                    addr = int(instr_tuple[0].strip()[:-1], 16)
-                    hex_code = int("".join(filter(lambda x: x in '0123456789abcdef', instr_tuple[1])), 16)
-                    control_flow_dir = "".join(filter(lambda x: x in '-|+>X,\'', instr_tuple[1]))
-                    rest = "\t".join(instr_tuple[2:])
-                    symbols[current_symbol]['instr'][addr] = (hex_code, rest, control_flow_dir[-1] if len(control_flow_dir) > 0 else None)
-        return symbols
+            operands = store.operand_text(row).strip()
+            kind = self.decode_control_flow(store.mnemonic(row), operands)
+            target = None
+            if kind in [cf_kind.BRANCH, cf_kind.JUMP, cf_kind.CALL]:
+                target = self.branch_target(store.addrs[row], store.hex_code(row), store.encoding_lens[row])
+                if target is None:
+                    target = parse_branch_target(operands)
+            store.set_control_flow(row, kind, target)
+
+    # Return [(address, name), ...] of the symbols objdump starts a block at in .text, sorted by address.
+    # Of several symbols at one address, a global function is preferred.
+    def _text_symbols(self):
+        symtab = self.read_symbol_table()
+        rows = (symtab.in_section('.text') & (symtab.types != STT_SECTION) & (symtab.types != STT_FILE)
+                & ~symtab.name_startswith(b'.') & ~symtab.name_startswith(b'$'))
+        best = dict() # address => (rank, row)
+        for row in np.flatnonzero(rows).tolist():
+            addr = int(symtab.values[row])
+            bind = symtab.binds[row]
+            rank = (symtab.types[row] == STT_FUNC, bind == STB_GLOBAL, bind == STB_WEAK)
+            if addr not in best or rank > best[addr][0]:
+                best[addr] = (rank, row)
+        return sorted((addr, symtab.name(row)) for addr, (rank, row) in best.items())
+
+    # Return sorted [(start, stop), ...] of data in .text marked by $d mapping symbols
+    def _text_data_ranges(self):
+        symtab = self.read_symbol_table()
+        in_text = symtab.in_section('.text')
+        data_marks = symtab.values[in_text & symtab.name_startswith(b'$d')].tolist()
+        code_marks = symtab.values[in_text & symtab.name_startswith(b'$x')].tolist()
+        marks = sorted([(addr, 'd') for addr in data_marks] + [(addr, 'x') for addr in code_marks])
+        ranges = []
+        for idx, (addr, kind) in enumerate(marks):
+            if kind == 'd':
+                ranges.append((addr, marks[idx + 1][0] if idx + 1 < len(marks) else None))
+        return ranges
+
+    # Disassemble .text with an in-process decoder instead of objdump and yield what iter_textdump yields.
+    # decoder.iter_instrs(data, addr, symbolize) yields (addr, hex_digits, instr) for the code in data.
+    # Like --visualize-jumps, control_flow_dir only marks direct jumps within a symbol, as '-' at the
+    # source and '>' at the target; the vertical lines objdump draws in between are not reproduced.
+    # Data marked by mapping symbols is skipped instead of being printed as .word.
+    def _iter_native_textdump(self, decoder, symbols=None, store=None):
+        if store is None:
+            store = instr_store()
+        text = self.elf.get_section_by_name('.text')
+        if text is None:
+            return
+        # Decoders walk the mapped bytes in place
+        data = self.image.section_view(text)
+        text_start = text['sh_addr']
+        text_end = text_start + text['sh_size']
+        layout = [(addr, name) for addr, name in self._text_symbols() if text_start <= addr < text_end]
+        starts = [addr for addr, name in layout]
+        def symbolize(target):
+            idx = bisect_right(starts, target) - 1
+            if idx < 0:
+                return f'{target:x}'
+            addr, name = layout[idx]
+            return f'{target:x} <{name}>' if addr == target else f'{target:x} <{name}+{hex(target - addr)}>'
+        ranges = None if symbols is None else self._symbol_ranges(symbols)
+        data_ranges = self._text_data_ranges()
+        candidates = []
+        for idx, (start, name) in enumerate(layout):
+            stop = starts[idx + 1] if idx + 1 < len(layout) else text_end
+            if ranges is not None:
+                range_idx = bisect_right(ranges, (start, float('inf'))) - 1
+                if range_idx < 0 or start >= ranges[range_idx][1]:
+                    continue
+                stop = min(stop, ranges[range_idx][1])
+            code_ranges = []
+            pos = start
+            for data_start, data_stop in data_ranges:
+                data_stop = stop if data_stop is None else min(data_stop, stop)
+                if data_stop <= pos or data_start >= stop:
+                    continue
+                if data_start > pos:
+                    code_ranges.append((pos, data_start))
+                pos = data_stop
+            if pos < stop:
+                code_ranges.append((pos, stop))
+            lo = len(store)
+            for code_start, code_stop in code_ranges:
+                code = data[code_start - text_start:code_stop - text_start]
+                for addr, hex_digits, instr in decoder.iter_instrs(code, code_start, symbolize):
+                    store.append(addr, hex_digits, instr, None)
+            instrs = instr_view(store, lo, len(store))
+            self._decode_control_flow(instrs, candidates)
+            self.__draw_jumps(instrs, start, stop)
+            yield (name, start, instrs)
+
+    # Set control_flow_dir of direct jumps with a target in [start, stop) and of their targets
+    def __draw_jumps(self, instrs, start, stop):
+        store = instrs.store
+        sources = []
+        targets = set()
+        for row in instrs.rows():
+            if store.kind(row) in [cf_kind.BRANCH, cf_kind.JUMP, cf_kind.CALL]:
+                target = store.target(row)
+                if target is not None and start <= target < stop:
+                    sources.append(row)
+                    targets.add(target)
+        for row in instrs.rows():
+            if store.addrs[row] in targets:
+                store.set_control_flow_dir(row, '>')
+        for row in sources:
+            store.set_control_flow_dir(row, '-')
+
+    # Return False if an instruction with this mnemonic can never change control flow
+    def may_change_control_flow(self, mnemonic):
+        assert False, "Not implemented"
+
+    # Return the cf_kind of an instruction
+    def decode_control_flow(self, mnemonic, operands):
+        assert False, "Not implemented"
+
+    # Return the target of the direct branch at addr computed from its encoding (hex_code as stored in
+    # instr_store, length in bytes), or None if the encoding is not understood
+    def branch_target(self, addr, hex_code, length):
+        # Optional feature, the target printed by objdump is used if not implemented
+        return None
 
     def is_control_flow_instr(self, instr):
         assert False, "Not implemented"
@@ -398,51 +742,123 @@ class arch_tools:
     def is_control_flow_end(self, instr):
         assert False, "Not implemented"
 
-    # Return ({  symbol_name: { addr: address, bb: {bbstart: {addr: (hex_code, instr)}, ... }, ... }  }, {trans_dst: [trans_src]})
-    def read_basic_blocks(self, textdump):
+    # Resolve a branch target annotation from objdump ("sym", "sym+0xoff", "sym-0xoff" or a plain address).
+    # Symbols missing from textdump (e.g. when it was read for a few symbols only) fall back to the symbol table.
+    def __resolve_target(self, target, textdump):
+        def symbol_addr(symbol):
+            if symbol in textdump:
+                return textdump[symbol]['addr']
+            entries = self.read_symbol_table().get(symbol)
+            if entries:
+                return entries[0]['addr']
+            return None
+        if '+' in target:
+            target_tuple = target.split('+')
+            base = symbol_addr(target_tuple[0])
+            if base is not None:
+                return base + int(target_tuple[1], 16)
+        elif '-' in target:
+            target_tuple = target.split('-')
+            base = symbol_addr(target_tuple[0])
+            if base is not None:
+                return base - int(target_tuple[1], 16)
+        else:
+            base = symbol_addr(target)
+            if base is not None:
+                return base
+            try:
+                return int(target, 16)
+            except:
+                pass
+        if target not in skip_target:
+            print(f"Warning: Unable to decode target address {target}", file=sys.stderr)
+            skip_target.add(target)
+        return None
+
+    # Return ({  symbol_name: { addr: address, bb: {bbstart: {addr: insn}, ... }, ... }  }, {trans_dst: [trans_src]})
+    # Each basic block is an instr_view sharing the store of textdump.
+    # textdump must come from read_textdump of the same ELF, the cached result is keyed by a digest of its
+    # symbols and instructions, so textdumps decoded with other objdump options or disassemblers do not share it.
+    # If textdump is None, it is read with read_textdump(symbols=symbols).
+    # symbols: only split these symbols into basic blocks
+    def read_basic_blocks(self, textdump=None, symbols=None):
+        if textdump is None:
+            textdump = self.read_textdump(symbols=symbols)
+        if symbols is not None:
+            symbols = set(symbols)
+            textdump = OrderedDict((sym, textdump[sym]) for sym in textdump if sym in symbols)
+        bb_ranges, trans_edge = self._cached('basic_blocks', lambda: self.__basic_block_ranges(textdump),
+                                             self.__textdump_digest(textdump))
+        return (self.__bind_basic_blocks(bb_ranges, textdump), trans_edge)
+
+    # Return the SHA-1 of the symbol names, addresses, encodings, text and control flow of the instructions of textdump
+    @staticmethod
+    def __textdump_digest(textdump):
+        digest = hashlib.sha1()
+        stores = []
+        for sym in textdump:
+            instrs = textdump[sym]['instr']
+            store = instrs.store
+            if not any(store is each for each in stores):
+                stores.append(store)
+            lo, hi = instrs.lo, instrs.hi
+            digest.update(sym.encode(errors='surrogateescape') + b'\0')
+            for column in (store.addrs, store.encodings, store.encoding_lens, store.mnemonic_ids, store.flags, store.targets):
+                digest.update(column[lo:hi])
+            digest.update(store.operands[store.operand_offsets[lo]:store.operand_offsets[hi]])
+        # Mnemonic ids are indexes in the mnemonics of their store
+        for store in stores:
+            digest.update('\0'.join(store.mnemonics).encode(errors='surrogateescape') + b'\0')
+        return digest.hexdigest()
+
+    # Return the cacheable form of __read_basic_blocks: each symbol's 'bb' is replaced by 'bb_ranges', NumPy
+    # arrays of the basic block addresses and of their (offset, length) in rows of the symbol's instructions,
+    # so that the cached result does not carry (and pickle) the instr_store of textdump
+    def __basic_block_ranges(self, textdump):
+        bb, trans_edge = self.__read_basic_blocks(textdump)
+        res = dict()
+        for sym, entry in bb.items():
+            base = textdump[sym]['instr'].lo
+            views = list(entry['bb'].values())
+            bb_ranges = {'addrs': np.array(list(entry['bb']), dtype=np.uint64),
+                         'offsets': np.array([view.lo - base for view in views], dtype=np.int64),
+                         'lengths': np.array([len(view) for view in views], dtype=np.int64)}
+            res[sym] = {'addr': entry['addr'], 'bb_ranges': bb_ranges, 'insn_class': entry['insn_class']}
+        return (res, trans_edge)
+
+    # Return the basic blocks of __basic_block_ranges result bb_ranges as instr_views on the store of textdump
+    def __bind_basic_blocks(self, bb_ranges, textdump):
+        res = dict()
+        for sym, entry in bb_ranges.items():
+            instrs = textdump[sym]['instr']
+            ranges = entry['bb_ranges']
+            blocks = OrderedDict()
+            for bb_addr, offset, length in zip(ranges['addrs'].tolist(), ranges['offsets'].tolist(), ranges['lengths'].tolist()):
+                blocks[bb_addr] = instrs.slice(offset, offset + length)
+            res[sym] = {'addr': entry['addr'], 'bb': blocks, 'insn_class': entry['insn_class']}
+        return res
+
+    def __read_basic_blocks(self, textdump):
         # Split basic blocks based on textdump
         trans_in = set()
         trans_out = set()
         trans_edge = dict()
         for sym in textdump:
             instrs = textdump[sym]['instr']
+            store = instrs.store
             addr_list = list(instrs.keys())
-            for idx in range(len(addr_list)):
+            for idx, row in enumerate(instrs.rows()):
                 addr = addr_list[idx]
-                instr = instrs[addr]
+                instr = store.record(row)
                 if self.is_control_flow_instr(instr):
                     trans_out.add(addr)
-                    pos_l = instr[1].rfind('<')
-                    pos_r = instr[1].rfind('>')
-                    target_addr = None
-                    if pos_l != -1 and pos_r != -1:
-                        target = instr[1][pos_l+1:pos_r]
-                        if '+' in target:
-                            target_tuple = target.split('+')
-                            if target_tuple[0] in textdump:
-                                target_addr = textdump[target_tuple[0]]['addr'] + int(target_tuple[1], 16)
-                            else:
-                                if target not in skip_target:
-                                    print(f"Warning: Unable to decode target address {target}", file=sys.stderr)
-                                    skip_target.add(target)
-                        elif '-' in target:
-                            target_tuple = target.split('-')
-                            if target_tuple[0] in textdump:
-                                target_addr = textdump[target_tuple[0]]['addr'] - int(target_tuple[1], 16)
-                            else:
-                                if target not in skip_target:
-                                    print(f"Warning: Unable to decode target address {target}", file=sys.stderr)
-                                    skip_target.add(target)
-                        else:
-                            if target in textdump:
-                                target_addr = textdump[target]['addr']
-                            else:
-                                try:
-                                    target_addr = int(target, 16)
-                                except:
-                                    if target not in skip_target:
-                                        print(f"Warning: Unable to decode target address {target}", file=sys.stderr)
-                                        skip_target.add(target)
+                    target_addr = instr.target
+                    if target_addr is None and instr.kind == cf_kind.NONE:
+                        # Jumps drawn by objdump that were not decoded, use the target annotation
+                        pos_l = instr.instr.rfind('<')
+                        pos_r = instr.instr.rfind('>')
+                        if pos_l != -1 and pos_r != -1:
+                            target_addr = self.__resolve_target(instr.instr[pos_l+1:pos_r], textdump)
                     if target_addr:
                         trans_in.add(target_addr)
                         if addr not in trans_edge:
@@ -455,18 +871,22 @@ class arch_tools:
                             trans_edge[addr] = set()
                         trans_edge[addr].add(next_addr)
         # Split basic blocks
+        self.prepare_insn_class(textdump)
         res = dict()
         for sym in textdump:
             instrs = textdump[sym]['instr']
-            bb = OrderedDict()
+            store = instrs.store
+            bb = OrderedDict() # {bb_addr: instr_view}
             insn_class = dict() # {bb_addr: {insn_class: count, ... }, ...}
             cur_bb = None
-            cur_instr = OrderedDict()
-            addr_list = list(sorted(instrs.keys()))
-            for idx in range(len(addr_list)):
+            cur_lo = 0 # index of the first instruction of cur_bb
+            addr_list = list(instrs.keys())
+            instr_classes = self.get_insn_classes(store, instrs.rows())
+            for idx, row in enumerate(instrs.rows()):
                 addr = addr_list[idx]
                 if cur_bb is None:
                     cur_bb = addr
+                    cur_lo = idx
                 if addr in trans_in:
                     # Check last edge exist in basic block
                     if idx > 0:
@@ -476,12 +896,11 @@ class arch_tools:
                                 trans_edge[last_addr] = set()
                             trans_edge[last_addr].add(addr)
                     # Add current basic block
-                    if len(cur_instr) > 0:
-                        bb[cur_bb] = cur_instr
-                    cur_instr = OrderedDict()
+                    if idx > cur_lo:
+                        bb[cur_bb] = instrs.slice(cur_lo, idx)
+                    cur_lo = idx
                     cur_bb = addr
-                cur_instr[addr] = instrs[addr]
-                instr_class = self.get_insn_class_by_instr(cur_instr[addr])
+                instr_class = instr_classes[idx]
                 if instr_class:
                     if cur_bb not in insn_class:
                         insn_class[cur_bb] = dict()
@@ -490,19 +909,28 @@ class arch_tools:
                             insn_class[cur_bb][each_class] = 0
                         insn_class[cur_bb][each_class] += 1
                 if addr in trans_out:
-                    if len(cur_instr) > 0:
-                        bb[cur_bb] = cur_instr
-                    cur_instr = OrderedDict()
+                    bb[cur_bb] = instrs.slice(cur_lo, idx + 1)
+                    cur_lo = idx + 1
                     cur_bb = None
-            if len(cur_instr) > 0:
-                bb[cur_bb] = cur_instr
+            if len(addr_list) > cur_lo:
+                bb[cur_bb] = instrs.slice(cur_lo, len(addr_list))
             res[sym] = {'addr': textdump[sym]['addr'], 'bb': bb, 'insn_class': insn_class}
         return (res, trans_edge)
 
+    # Called with the whole textdump before its instructions are classified, lets
+    # architectures whose classifier is an external tool run it once over everything
+    def prepare_insn_class(self, textdump):
+        pass
+
     def get_insn_class_by_instr(self, instr):
         # Optional feature, return None if not implemented
         return None
 
+    # Return get_insn_class_by_instr of each row of an instr_store, architectures
+    # with a compiled instruction class database override this to skip building records
+    def get_insn_classes(self, store, rows):
+        return [self.get_insn_class_by_instr(store.record(row)) for row in rows]
+
     def get_insn_class_level_dict(self):
         # Optional feature, return None if not implemented
         return None
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import hashlib
+import os
+import pathlib
+import pickle
+import tempfile
+from elftools.elf.sections import NoteSection
+
+# Bump when the layout of any cached result changes
+CACHE_VERSION = 7
+
+def cache_dir_path():
+    if os.environ.get('PYBINUTILS_NO_CACHE'):
+        return None
+    if 'PYBINUTILS_CACHE_DIR' in os.environ:
+        return pathlib.Path(os.environ['PYBINUTILS_CACHE_DIR'])
+    xdg_cache = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    return pathlib.Path(xdg_cache) / 'pybinutils'
+
+def elf_build_id(elf):
+    for section in elf.iter_sections():
+        if not isinstance(section, NoteSection):
+            continue
+        for note in section.iter_notes():
+            if note['n_type'] == 'NT_GNU_BUILD_ID':
+                return note['n_desc']
+    return None
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(1 << 20)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+# On-disk store for parsed analysis results of one ELF file.
+# Entries live in {cache_dir}/{build-id or sha256}/{name}-{params hash}.pickle and
+# carry the ELF size, so a binary rewritten under the same build-id (e.g. stripped)
+# is detected and re-analyzed. Results are also kept in memory for repeated queries.
+class analysis_cache:
+    def __init__(self, elf_path, elf, cache_dir=None):
+        if cache_dir is None:
+            cache_dir = cache_dir_path()
+        self.memory = dict()
+        self.dir = None
+        if cache_dir is None:
+            return
+        self.elf_size = os.path.getsize(elf_path)
+        build_id = elf_build_id(elf)
+        key = f'build-id-{build_id}' if build_id else f'sha256-{file_digest(elf_path)}'
+        self.dir = pathlib.Path(cache_dir) / key
+
+    def __entry_path(self, name, params):
+        digest = hashlib.sha1(repr((CACHE_VERSION, params)).encode()).hexdigest()[:16]
+        return self.dir / f'{name}-{digest}.pickle'
+
+    def load(self, name, params=()):
+        if self.dir is None:
+            return None
+        path = self.__entry_path(name, params)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if entry.get('version') != CACHE_VERSION or entry.get('elf_size') != self.elf_size:
+            return None
+        try:
+            # The modification time orders entries by last use for __evict
+            os.utime(path)
+        except OSError:
+            pass
+        return entry['data']
+
+    # max_entries: keep at most this many entries of name, the least recently used ones are removed
+    def store(self, name, data, params=(), max_entries=None):
+        if self.dir is None:
+            return
+        entry = {'version': CACHE_VERSION, 'elf_size': self.elf_size, 'data': data}
+        path = self.__entry_path(name, params)
+        try:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first so concurrent readers never see a partial entry
+            with tempfile.NamedTemporaryFile(dir=self.dir, delete=False) as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f.name, path)
+        except OSError:
+            pass
+        if max_entries is not None:
+            self.__evict(name, max_entries, path)
+
+    # Remove the least recently used entries of name but the max_entries most recent ones, of which the
+    # entry just stored at path (file times can be too coarse to tell it apart)
+    def __evict(self, name, max_entries, path):
+        entries = []
+        for entry_path in self.dir.glob(f'{name}-*.pickle'):
+            if entry_path == path:
+                continue
+            try:
+                entries.append((entry_path.stat().st_mtime_ns, entry_path))
+            except OSError:
+                pass
+        entries.sort(reverse=True)
+        for _, entry_path in entries[max(max_entries - 1, 0):]:
+            try:
+                entry_path.unlink()
+            except OSError:
+                pass
+
+    # Return the result if it is already cached in memory or on disk, otherwise None
+    def peek(self, name, params=()):
+        key = (name, repr(params))
+        if key not in self.memory:
+            data = self.load(name, params)
+            if data is None:
+                return None
+            self.memory[key] = data
+        return self.memory[key]
+
+    def get(self, name, builder, params=(), max_entries=None):
+        data = self.peek(name, params)
+        if data is None:
+            data = builder()
+            self.store(name, data, params, max_entries)
+            self.memory[(name, repr(params))] = data
+        return data
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+
+import os
+import posixpath
+import struct
+import zlib
+from elftools.dwarf.descriptions import describe_form_class
+from arch.cache import elf_build_id
+from arch.elf_image import elf_image
+from arch.line_table import line_table, IS_STMT, BASIC_BLOCK, END_SEQUENCE, PROLOGUE_END
+
+def lpe_filename(line_program, file_index, comp_dir):
+    lp_header = line_program.header
+    file_entries = lp_header["file_entry"]
+    if lp_header.version < 5:
+        file_index -= 1
+    if file_index == -1:
+        return None
+    file_entry = file_entries[file_index]
+    dir_index = file_entry["dir_index"]
+    if dir_index == 0 and lp_header.version < 5:
+        return file_entry.name.decode()
+    if lp_header.version < 5:
+        dir_index -= 1
+    directory = lp_header["include_directory"][dir_index]
+    if directory[0] != b'/' or directory[0] == b'.':
+        directory = posixpath.join(comp_dir, directory)
+    return posixpath.join(directory, file_entry.name).decode()
+
+def decode_name(value):
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        return value.decode(errors='replace')
+    return str(value)
+
+def die_name(die):
+    if die is None:
+        return None
+    attrs = die.attributes
+    for key in ('DW_AT_linkage_name', 'DW_AT_MIPS_linkage_name', 'DW_AT_name'):
+        if key in attrs:
+            name = decode_name(attrs[key].value)
+            if name:
+                return name
+    return None
+
+def die_ranges(dwarfinfo, cu, die):
+    attrs = die.attributes
+    ranges = []
+
+    if 'DW_AT_ranges' in attrs:
+        range_lists = dwarfinfo.range_lists()
+        offset = attrs['DW_AT_ranges'].value
+        try:
+            raw_ranges = range_lists.get_range_list_at_offset(offset, cu=cu)
+        except TypeError:
+            raw_ranges = range_lists.get_range_list_at_offset(offset)
+
+        base_addr = 0
+        if 'DW_AT_low_pc' in attrs:
+            base_addr = attrs['DW_AT_low_pc'].value
+        else:
+            top_attrs = cu.get_top_DIE().attributes
+            if 'DW_AT_low_pc' in top_attrs:
+                base_addr = top_attrs['DW_AT_low_pc'].value
+
+        for entry in raw_ranges:
+            if hasattr(entry, 'base_address'):
+                base_addr = entry.base_address
+                continue
+            begin = entry.begin_offset
+            end = entry.end_offset
+            if getattr(entry, 'is_absolute', False):
+                ranges.append((begin, end))
+            else:
+                ranges.append((base_addr + begin, base_addr + end))
+        return ranges
+
+    if 'DW_AT_low_pc' in attrs and 'DW_AT_high_pc' in attrs:
+        low_pc = attrs['DW_AT_low_pc'].value
+        high_pc_attr = attrs['DW_AT_high_pc']
+        high_pc_class = describe_form_class(high_pc_attr.form)
+        if high_pc_class == 'address':
+            high_pc = high_pc_attr.value
+        else:
+            high_pc = low_pc + high_pc_attr.value
+        return [(low_pc, high_pc)]
+
+    return ranges
+
+def cu_comp_dir(CU):
+    top_DIE = CU.get_top_DIE()
+    if 'DW_AT_comp_dir' in top_DIE.attributes:
+        return top_DIE.attributes['DW_AT_comp_dir'].value
+    return None
+
+# Append the (symbol, [(start_pc, end_pc), ...]) of the subprogram DIEs of CU to subprograms and the
+# (symbol, [(start_pc, end_pc), ...], call_file, call_line) of its inlined subroutine DIEs to inlined,
+# skipping DIEs without a name or ranges. An inlined subroutine comes after the ones it is nested in.
+# origin_names ({(form, abstract origin offset): name}) memoizes the names of abstract origins.
+def walk_cu_dies(dwarfinfo, CU, subprograms, inlined, origin_names):
+    call_files = dict() # DW_AT_call_file => filename
+    line_program = None
+    for DIE in CU.iter_DIEs():
+        if DIE.tag == 'DW_TAG_subprogram':
+            symbol_name = die_name(DIE)
+            if symbol_name is None:
+                continue
+        elif DIE.tag == 'DW_TAG_inlined_subroutine':
+            attr = DIE.attributes.get('DW_AT_abstract_origin')
+            if attr is None:
+                continue
+            origin = (attr.form, attr.value if attr.form == 'DW_FORM_ref_addr' else attr.value + CU.cu_offset)
+            if origin not in origin_names:
+                try:
+                    origin_names[origin] = die_name(DIE.get_DIE_from_attribute('DW_AT_abstract_origin'))
+                except Exception:
+                    origin_names[origin] = None
+            symbol_name = origin_names[origin]
+            if symbol_name is None:
+                continue
+        else:
+            continue
+        try:
+            ranges = die_ranges(dwarfinfo, CU, DIE)
+        except Exception:
+            ranges = []
+        if len(ranges) == 0:
+            continue
+        if DIE.tag == 'DW_TAG_subprogram':
+            subprograms.append((symbol_name, ranges))
+            continue
+        attrs = DIE.attributes
+        call_file = attrs['DW_AT_call_file'].value if 'DW_AT_call_file' in attrs else None
+        if call_file is not None and call_file not in call_files:
+            if line_program is None:
+                line_program = dwarfinfo.line_program_for_CU(CU)
+            try:
+                call_files[call_file] = lpe_filename(line_program, call_file, cu_comp_dir(CU)) if line_program else None
+            except Exception:
+                call_files[call_file] = None
+        call_line = attrs['DW_AT_call_line'].value if 'DW_AT_call_line' in attrs else None
+        inlined.append((symbol_name, ranges, call_files.get(call_file), call_line))
+
+# Line program rows of CUs collected in lists, table() turns them into a line_table
+class line_rows:
+    def __init__(self):
+        self.filenames = []
+        self.file_ids = dict() # filename => index in filenames
+        self.pcs = []
+        self.row_file_ids = []
+        self.lines = []
+        self.cols = []
+        self.flags = []
+
+    def add_cu(self, dwarfinfo, CU, comp_dir):
+        line_program = dwarfinfo.line_program_for_CU(CU)
+        if line_program is None:
+            return
+        lp_file_ids = dict() # file index in the line program => index in filenames, None if it has no name
+        for lpe in line_program.get_entries():
+            state = lpe.state
+            if not state:
+                continue
+            if state.file not in lp_file_ids:
+                filename = lpe_filename(line_program, state.file, comp_dir)
+                if filename is not None and filename not in self.file_ids:
+                    self.file_ids[filename] = len(self.filenames)
+                    self.filenames.append(filename)
+                lp_file_ids[state.file] = self.file_ids.get(filename)
+            file_id = lp_file_ids[state.file]
+            if file_id is None:
+                continue
+            self.pcs.append(state.address)
+            self.row_file_ids.append(file_id)
+            self.lines.append(state.line)
+            self.cols.append(state.column)
+            self.flags.append((IS_STMT if state.is_stmt else 0) | (BASIC_BLOCK if state.basic_block else 0)
+                              | (END_SEQUENCE if state.end_sequence else 0) | (PROLOGUE_END if state.prologue_end else 0))
+
+    def table(self):
+        return line_table(self.filenames, self.pcs, self.row_file_ids, self.lines, self.cols, self.flags)
+
+# Directories holding separate debug files: $PYBINUTILS_DEBUG_DIRS (separated by ':') or /usr/lib/debug
+def debug_dirs():
+    return [d for d in os.environ.get('PYBINUTILS_DEBUG_DIRS', '/usr/lib/debug').split(':') if d]
+
+# Return the CRC32 .gnu_debuglink uses of the file at path
+def file_crc32(path):
+    crc = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(1 << 20)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+# Return (filename, crc) of the .gnu_debuglink section of elf, or None
+def gnu_debuglink(elf):
+    section = elf.get_section_by_name('.gnu_debuglink')
+    if section is None:
+        return None
+    data = section.data()
+    end = data.find(b'\0')
+    if end <= 0:
+        return None
+    crc_offset = (end + 4) & ~3
+    if crc_offset + 4 > len(data):
+        return None
+    crc, = struct.unpack_from('<I' if elf.little_endian else '>I', data, crc_offset)
+    return (data[:end].decode(errors='replace'), crc)
+
+# Return the path of the separate debug file of the ELF at elf_path, or None. Like gdb, look for
+# {debug dir}/.build-id/xx/yyyy.debug by build-id first, then for the .gnu_debuglink file next to
+# the ELF, in its .debug subdirectory and under each debug dir, checking its CRC.
+def find_debug_file(elf_path, elf):
+    elf_path = os.path.realpath(elf_path)
+    build_id = elf_build_id(elf)
+    if build_id and len(build_id) > 2:
+        for debug_dir in debug_dirs():
+            path = os.path.join(debug_dir, '.build-id', build_id[:2], build_id[2:] + '.debug')
+            if os.path.isfile(path) and os.path.realpath(path) != elf_path:
+                return path
+    debuglink = gnu_debuglink(elf)
+    if debuglink is None:
+        return None
+    name, crc = debuglink
+    elf_dir = os.path.dirname(elf_path)
+    candidates = [os.path.join(elf_dir, name), os.path.join(elf_dir, '.debug', name)]
+    candidates += [os.path.join(debug_dir, elf_dir.lstrip('/'), name) for debug_dir in debug_dirs()]
+    for path in candidates:
+        if os.path.isfile(path) and os.path.realpath(path) != elf_path and file_crc32(path) == crc:
+            return path
+    return None
+
+# Process pool worker for parallel DWARF decoding. Reopen elf_path and decode the CUs at cu_offsets,
+# return their line_table for kind 'lines' or (subprograms, inlined) as walk_cu_dies collects them for 'dies'
+def dwarf_cu_chunk(elf_path, cu_offsets, kind):
+    image = elf_image(elf_path)
+    dwarfinfo = image.elf.get_dwarf_info()
+    rows = line_rows()
+    subprograms = []
+    inlined = []
+    origin_names = dict()
+    for offset in cu_offsets:
+        CU = dwarfinfo.get_CU_at(offset)
+        if kind == 'lines':
+            rows.add_cu(dwarfinfo, CU, cu_comp_dir(CU))
+        else:
+            walk_cu_dies(dwarfinfo, CU, subprograms, inlined, origin_names)
+    res = rows.table() if kind == 'lines' else (subprograms, inlined)
+    del dwarfinfo
+    image.close()
+    return res
+
+# Split CUs into lists of CU offsets of roughly equal .debug_info size, in CU order,
+# a few per worker so that one huge CU does not serialize the whole run
+def cu_chunks(CUs, jobs):
+    total = sum(CU.size for CU in CUs)
+    chunk_size = max(1, total // (jobs * 4))
+    chunks = [[]]
+    size = 0
+    for CU in CUs:
+        if size >= chunk_size:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(CU.cu_offset)
+        size += CU.size
+    return chunks
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import io
+import mmap
+from elftools.elf.elffile import ELFFile
+from elftools.elf.constants import SH_FLAGS
+from elftools.dwarf.dwarfinfo import DebugSectionDescriptor
+
+# Read-only seekable stream over a memoryview, reads copy only the bytes they return
+class memoryview_stream(io.RawIOBase):
+    def __init__(self, view):
+        self.view = view
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self.pos
+        elif whence == io.SEEK_END:
+            pos += len(self.view)
+        self.pos = pos
+        return pos
+
+    def read(self, size=-1):
+        pos = self.pos
+        data = self.view[pos:] if size is None or size < 0 else self.view[pos:pos + size]
+        self.pos = pos + len(data)
+        return bytes(data)
+
+# ELFFile reading from a memory map of the file instead of a buffered file object
+class mmap_elffile(ELFFile):
+    def __init__(self, image):
+        self.image = image
+        super().__init__(image.map)
+
+    # pyelftools copies each DWARF section into a BytesIO, hand it a stream over the map instead when
+    # the section needs no decompression or relocation. _read_dwarf_section is the hook get_dwarf_info
+    # uses to load sections, it is not public API: requirements.txt pins the pyelftools versions it was
+    # checked against and any other case goes through the stock implementation.
+    def _read_dwarf_section(self, section, relocate_dwarf_sections):
+        if (section['sh_flags'] & SH_FLAGS.SHF_COMPRESSED or self.has_phantom_bytes()
+                or (relocate_dwarf_sections and self['e_type'] == 'ET_REL')):
+            return super()._read_dwarf_section(section, relocate_dwarf_sections)
+        return DebugSectionDescriptor(
+            stream=memoryview_stream(self.image.section_view(section)[:section.data_size]),
+            name=section.name,
+            global_offset=section['sh_offset'],
+            size=section.data_size,
+            address=section['sh_addr'])
+
+# Memory mapped ELF file, section contents are exposed as zero-copy memoryviews of the map
+class elf_image:
+    def __init__(self, elf_path):
+        self.elf_path = elf_path
+        with open(elf_path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        self.elf = mmap_elffile(self)
+
+    def close(self):
+        self.elf = None
+        try:
+            self.view.release()
+            self.map.close()
+        except BufferError:
+            # Section views are still referenced, the map is released with them
+            pass
+
+    # Return the contents of section `name` as a memoryview, or None if there is no such section
+    def section_data(self, name):
+        section = self.elf.get_section_by_name(name)
+        if section is None:
+            return None
+        return self.section_view(section)
+
+    def section_view(self, section):
+        if section['sh_type'] == 'SHT_NOBITS':
+            return memoryview(b'')
+        if section['sh_flags'] & SH_FLAGS.SHF_COMPRESSED:
+            return memoryview(section.data())
+        return self.view[section['sh_offset']:section['sh_offset'] + section['sh_size']]
+
+    # Return size bytes at virtual address addr as a memoryview, or None if they are not in one section
+    def read(self, addr, size):
+        for section in self.elf.iter_sections():
+            start = section['sh_addr']
+            if section['sh_flags'] & SH_FLAGS.SHF_ALLOC and start <= addr and addr + size <= start + section['sh_size']:
+                return self.section_view(section)[addr - start:addr - start + size]
+        return None
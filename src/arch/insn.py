@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from collections.abc import Mapping
+from enum import IntEnum
+import re
+
+# control_flow_dir characters drawn by objdump --visualize-jumps, stored as their index
+cf_dir_chars = (None, '-', '|', '+', '>', 'X', ',', '\'')
+cf_dir_index = {c: i for i, c in enumerate(cf_dir_chars)}
+CF_DIR_BITS = 3
+
+class cf_kind(IntEnum):
+    NONE = 0
+    BRANCH = 1 # conditional direct branch
+    JUMP = 2 # unconditional direct jump
+    CALL = 3 # direct call
+    INDIRECT_JUMP = 4
+    INDIRECT_CALL = 5
+    RETURN = 6
+
+# Decoded instruction, the first three fields are the (hex_code, instr, control_flow_dir) tuple
+# read_textdump used to return. target is the direct branch target address or None, length the
+# encoding size in bytes.
+insn = namedtuple('insn', ['hex_code', 'instr', 'control_flow_dir', 'mnemonic', 'operands', 'kind', 'target', 'length'])
+
+NO_TARGET = (1 << 64) - 1
+MASK64 = (1 << 64) - 1
+
+# Return bits hi..lo (inclusive) of x
+def bits(x, hi, lo):
+    return (x >> lo) & ((1 << (hi - lo + 1)) - 1)
+
+def sign_extend(x, width):
+    if x & (1 << (width - 1)):
+        return x - (1 << width)
+    return x
+
+mnemonic_re = re.compile(r'\S*')
+
+# Columnar storage for all instructions of a textdump.
+# Row i holds one instruction: address, encoding (as printed by objdump, little-endian word for
+# RISC-V/AArch64 and byte string for x86), interned mnemonic id, the rest of the instruction text
+# in a shared byte buffer, a flags byte (control_flow_dir and cf_kind) and the direct branch
+# target. This takes ~60 bytes per instruction instead of the
+# several hundred used by an OrderedDict of (hex_code, instr, control_flow_dir) tuples.
+# Symbols and basic blocks are instr_view ranges of rows.
+class instr_store:
+    def __init__(self):
+        self.addrs = array('Q')
+        self.encodings = array('Q')
+        self.encoding_lens = array('B')
+        self.long_encodings = dict() # row => encoding, for encodings wider than 64 bits
+        self.mnemonic_ids = array('I')
+        self.mnemonics = []
+        self.mnemonic_index = dict()
+        self.operands = bytearray()
+        self.operand_offsets = array('Q', [0])
+        self.flags = array('B')
+        self.targets = array('Q')
+
+    def __len__(self):
+        return len(self.addrs)
+
+    def intern_mnemonic(self, mnemonic):
+        mnemonic_id = self.mnemonic_index.get(mnemonic)
+        if mnemonic_id is None:
+            mnemonic_id = len(self.mnemonics)
+            self.mnemonic_index[mnemonic] = mnemonic_id
+            self.mnemonics.append(mnemonic)
+        return mnemonic_id
+
+    # hex_digits: encoding as printed by objdump, instr: instruction text
+    def append(self, addr, hex_digits, instr, control_flow_dir):
+        row = len(self.addrs)
+        hex_code = int(hex_digits, 16)
+        self.addrs.append(addr)
+        self.encoding_lens.append((len(hex_digits) + 1) // 2)
+        if hex_code >> 64:
+            self.long_encodings[row] = hex_code
+            self.encodings.append(0)
+        else:
+            self.encodings.append(hex_code)
+        mnemonic_len = mnemonic_re.match(instr).end()
+        self.mnemonic_ids.append(self.intern_mnemonic(instr[:mnemonic_len]))
+        self.operands += instr[mnemonic_len:].encode(errors='surrogateescape')
+        self.operand_offsets.append(len(self.operands))
+        self.flags.append(cf_dir_index[control_flow_dir])
+        self.targets.append(NO_TARGET)
+
+    def set_control_flow(self, row, kind, target):
+        self.flags[row] = (self.flags[row] & ((1 << CF_DIR_BITS) - 1)) | (kind << CF_DIR_BITS)
+        self.targets[row] = NO_TARGET if target is None else target
+
+    def set_control_flow_dir(self, row, control_flow_dir):
+        self.flags[row] = (self.flags[row] & ~((1 << CF_DIR_BITS) - 1)) | cf_dir_index[control_flow_dir]
+
+    def hex_code(self, row):
+        if row in self.long_encodings:
+            return self.long_encodings[row]
+        return self.encodings[row]
+
+    # Return the encoding bytes in the order objdump prints them, leading zero bytes included
+    def encoding(self, row):
+        return self.hex_code(row).to_bytes(self.encoding_lens[row], 'big')
+
+    def mnemonic(self, row):
+        return self.mnemonics[self.mnemonic_ids[row]]
+
+    # Instruction text after the mnemonic, including the separating whitespace
+    def operand_text(self, row):
+        return self.operands[self.operand_offsets[row]:self.operand_offsets[row + 1]].decode(errors='surrogateescape')
+
+    def instr_text(self, row):
+        return self.mnemonic(row) + self.operand_text(row)
+
+    def control_flow_dir(self, row):
+        return cf_dir_chars[self.flags[row] & ((1 << CF_DIR_BITS) - 1)]
+
+    def kind(self, row):
+        return cf_kind(self.flags[row] >> CF_DIR_BITS)
+
+    def target(self, row):
+        target = self.targets[row]
+        return None if target == NO_TARGET else target
+
+    # Return the insn record of a row
+    def record(self, row):
+        mnemonic = self.mnemonic(row)
+        operand_text = self.operand_text(row)
+        return insn(self.hex_code(row), mnemonic + operand_text, self.control_flow_dir(row),
+                    mnemonic, operand_text.strip(), self.kind(row), self.target(row), self.encoding_lens[row])
+
+    # Append all rows of another store, return the row offset they were placed at
+    def extend(self, other):
+        base = len(self.addrs)
+        self.addrs.extend(other.addrs)
+        self.encodings.extend(other.encodings)
+        self.encoding_lens.extend(other.encoding_lens)
+        for row, hex_code in other.long_encodings.items():
+            self.long_encodings[base + row] = hex_code
+        id_map = [self.intern_mnemonic(mnemonic) for mnemonic in other.mnemonics]
+        self.mnemonic_ids.extend(id_map[mnemonic_id] for mnemonic_id in other.mnemonic_ids)
+        operand_base = len(self.operands)
+        self.operands += other.operands
+        self.operand_offsets.extend(operand_base + offset for offset in other.operand_offsets[1:])
+        self.flags.extend(other.flags)
+        self.targets.extend(other.targets)
+        return base
+
+    # Copy the given rows to the end of the store, return the (lo, hi) range of the copies
+    def copy_rows(self, rows):
+        lo = len(self.addrs)
+        for row in rows:
+            new_row = len(self.addrs)
+            self.addrs.append(self.addrs[row])
+            self.encodings.append(self.encodings[row])
+            self.encoding_lens.append(self.encoding_lens[row])
+            if row in self.long_encodings:
+                self.long_encodings[new_row] = self.long_encodings[row]
+            self.mnemonic_ids.append(self.mnemonic_ids[row])
+            self.operands += self.operands[self.operand_offsets[row]:self.operand_offsets[row + 1]]
+            self.operand_offsets.append(len(self.operands))
+            self.flags.append(self.flags[row])
+            self.targets.append(self.targets[row])
+        return (lo, len(self.addrs))
+
+    # Merge two views of the same symbol like OrderedDict.update, the result is sorted by address
+    def merge(self, view, other):
+        rows = dict()
+        for row in view.rows():
+            rows[self.addrs[row]] = row
+        for row in other.rows():
+            rows[self.addrs[row]] = row
+        lo, hi = self.copy_rows(rows[addr] for addr in sorted(rows))
+        return instr_view(self, lo, hi)
+
+# Read-only {addr: insn} mapping over rows [lo, hi) of an
+# instr_store, sorted by address
+class instr_view(Mapping):
+    __slots__ = ('store', 'lo', 'hi')
+
+    def __init__(self, store, lo, hi):
+        self.store = store
+        self.lo = lo
+        self.hi = hi
+
+    def __find(self, addr):
+        row = bisect_left(self.store.addrs, addr, self.lo, self.hi)
+        if row < self.hi and self.store.addrs[row] == addr:
+            return row
+        return None
+
+    def __getitem__(self, addr):
+        row = self.__find(addr)
+        if row is None:
+            raise KeyError(addr)
+        return self.store.record(row)
+
+    def __contains__(self, addr):
+        return self.__find(addr) is not None
+
+    def __len__(self):
+        return self.hi - self.lo
+
+    def __iter__(self):
+        return iter(self.store.addrs[self.lo:self.hi])
+
+    def __reversed__(self):
+        return reversed(self.store.addrs[self.lo:self.hi])
+
+    def rows(self):
+        return range(self.lo, self.hi)
+
+    def keys(self):
+        return self.store.addrs[self.lo:self.hi]
+
+    def values(self):
+        return (self.store.record(row) for row in self.rows())
+
+    def items(self):
+        return ((self.store.addrs[row], self.store.record(row)) for row in self.rows())
+
+    # Return the view of rows [lo, hi) of this view
+    def slice(self, lo, hi):
+        return instr_view(self.store, self.lo + lo, self.lo + hi)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+# Index of address intervals [start, end) with a label each, kept as sorted NumPy arrays.
+# lookup() maps many addresses at once with one searchsorted, intervals are expected not
+# to overlap for it (with nesting the one starting last before an address is tried).
+# overlapping() also handles overlapping (e.g. nested) intervals through the running maximum of ends,
+# stabbing() through the elementary segments between consecutive interval bounds.
+class interval_index:
+    def __init__(self, intervals):
+        intervals = sorted(intervals, key=lambda x: x[0])
+        self.starts = np.array([start for start, end, label in intervals], dtype=np.uint64)
+        self.ends = np.array([end for start, end, label in intervals], dtype=np.uint64)
+        self.labels = [label for start, end, label in intervals]
+        self.max_ends = np.maximum.accumulate(self.ends) if len(self.ends) else self.ends
+        self.segment_bounds = None
+        self.segment_members = None
+
+    def __len__(self):
+        return len(self.labels)
+
+    # Return an int64 array with the index of the interval containing each address, -1 for none
+    def lookup(self, addrs):
+        addrs = np.asarray(addrs, dtype=np.uint64)
+        idx = np.searchsorted(self.starts, addrs, side='right').astype(np.int64) - 1
+        found = idx >= 0
+        found[found] = addrs[found] < self.ends[idx[found]]
+        idx[~found] = -1
+        return idx
+
+    # Return the label of the interval containing each address, or None
+    def lookup_labels(self, addrs):
+        return [self.labels[idx] if idx >= 0 else None for idx in self.lookup(addrs).tolist()]
+
+    # Return the indexes of the intervals overlapping [start, end)
+    def overlapping(self, start, end):
+        lo = int(np.searchsorted(self.max_ends, start, side='right'))
+        hi = int(np.searchsorted(self.starts, end, side='left'))
+        return [idx for idx in range(lo, hi) if self.ends[idx] > start]
+
+    # Return for each address the list of indexes of all intervals containing it, in index order.
+    # The addresses are located in the elementary segments with one searchsorted, whatever the nesting.
+    def stabbing(self, addrs):
+        if self.segment_bounds is None:
+            self.__build_segments()
+        addrs = np.asarray(addrs, dtype=np.uint64)
+        segments = np.searchsorted(self.segment_bounds, addrs, side='right') - 1
+        members = self.segment_members
+        return [list(members[segment]) if segment >= 0 else [] for segment in segments.tolist()]
+
+    # Cut the address space at all interval bounds, segment i is [segment_bounds[i], segment_bounds[i + 1])
+    # and segment_members[i] the indexes of the intervals covering it
+    def __build_segments(self):
+        bounds = np.unique(np.concatenate([self.starts, self.ends]))
+        opening = [[] for _ in range(len(bounds))]
+        closing = [[] for _ in range(len(bounds))]
+        starts_at = np.searchsorted(bounds, self.starts).tolist()
+        ends_at = np.searchsorted(bounds, self.ends).tolist()
+        for idx, (start_at, end_at) in enumerate(zip(starts_at, ends_at)):
+            if end_at > start_at:
+                opening[start_at].append(idx)
+                closing[end_at].append(idx)
+        active = set()
+        members = []
+        for segment in range(len(bounds)):
+            active.difference_update(closing[segment])
+            active.update(opening[segment])
+            members.append(tuple(sorted(active)))
+        self.segment_bounds = bounds
+        self.segment_members = members
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+from collections.abc import Mapping
+import numpy as np
+
+IS_STMT = 1
+BASIC_BLOCK = 2
+END_SEQUENCE = 4
+PROLOGUE_END = 8
+flag_names = (('is_stmt', IS_STMT), ('basic_block', BASIC_BLOCK), ('end_sequence', END_SEQUENCE), ('prologue_end', PROLOGUE_END))
+
+# DWARF line table rows of all CUs as NumPy arrays sorted by pc: pcs, file_ids (into filenames),
+# lines, cols and flags (IS_STMT | BASIC_BLOCK | END_SEQUENCE | PROLOGUE_END bits).
+# Rows at the same pc keep line program order, except that end_sequence rows come first so the
+# last row at a pc always starts code there.
+# As a Mapping it is {filename: [{'line', 'col', 'pc', 'is_stmt', 'basic_block', 'end_sequence',
+# 'prologue_end', 'filename'}, ...]} like read_dwarf used to return, the rows of a file in pc order.
+class line_table(Mapping):
+    def __init__(self, filenames, pcs, file_ids, lines, cols, flags):
+        pcs = np.asarray(pcs, dtype=np.uint64)
+        flags = np.asarray(flags, dtype=np.uint8)
+        order = np.lexsort(((flags & END_SEQUENCE) == 0, pcs))
+        self.filenames = filenames
+        self.pcs = pcs[order]
+        self.file_ids = np.asarray(file_ids, dtype=np.uint32)[order]
+        self.lines = np.asarray(lines, dtype=np.uint32)[order]
+        self.cols = np.asarray(cols, dtype=np.uint32)[order]
+        self.flags = flags[order]
+        self.index = None
+
+    # Return one line_table with the rows of tables, rows at the same pc keep the order of tables
+    @staticmethod
+    def merge(tables):
+        filenames = []
+        file_ids = dict()
+        parts = []
+        for table in tables:
+            remap = np.zeros(len(table.filenames), dtype=np.uint32)
+            for idx, filename in enumerate(table.filenames):
+                if filename not in file_ids:
+                    file_ids[filename] = len(filenames)
+                    filenames.append(filename)
+                remap[idx] = file_ids[filename]
+            parts.append((table, remap[table.file_ids] if len(remap) else table.file_ids))
+        return line_table(filenames,
+                          np.concatenate([table.pcs for table, _ in parts] or [np.zeros(0, dtype=np.uint64)]),
+                          np.concatenate([ids for _, ids in parts] or [np.zeros(0, dtype=np.uint32)]),
+                          np.concatenate([table.lines for table, _ in parts] or [np.zeros(0, dtype=np.uint32)]),
+                          np.concatenate([table.cols for table, _ in parts] or [np.zeros(0, dtype=np.uint32)]),
+                          np.concatenate([table.flags for table, _ in parts] or [np.zeros(0, dtype=np.uint8)]))
+
+    # The file index is rebuilt on demand, keep it out of the analysis cache
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['index'] = None
+        return state
+
+    def __len__(self):
+        return len(self.__file_index())
+
+    def __iter__(self):
+        return iter(self.__file_index())
+
+    def __getitem__(self, filename):
+        return [self.entry(row) for row in self.__file_index()[filename]]
+
+    # Return an int64 array with the row covering each pc (the last row at or before it within
+    # its sequence), -1 for pcs before any row or in the gap after an end_sequence row
+    def lookup(self, pcs):
+        pcs = np.asarray(pcs, dtype=np.uint64)
+        rows = np.searchsorted(self.pcs, pcs, side='right').astype(np.int64) - 1
+        found = rows >= 0
+        found[found] = (self.flags[rows[found]] & END_SEQUENCE) == 0
+        rows[~found] = -1
+        return rows
+
+    # Return the rows whose pc is exactly pc
+    def rows_at(self, pc):
+        lo = int(np.searchsorted(self.pcs, pc, side='left'))
+        hi = int(np.searchsorted(self.pcs, pc, side='right'))
+        return range(lo, hi)
+
+    def entry(self, row):
+        flags = int(self.flags[row])
+        res = {'line': int(self.lines[row]), 'col': int(self.cols[row]), 'pc': int(self.pcs[row])}
+        for name, bit in flag_names:
+            res[name] = bool(flags & bit)
+        res['filename'] = self.filenames[self.file_ids[row]]
+        return res
+
+    # Return the entries whose pc is exactly pc
+    def entries_at(self, pc):
+        return [self.entry(row) for row in self.rows_at(pc)]
+
+    # {filename: [row, ...]}
+    def __file_index(self):
+        if self.index is None:
+            self.index = dict()
+            order = np.argsort(self.file_ids, kind='stable')
+            bounds = np.flatnonzero(np.diff(self.file_ids[order])) + 1
+            for rows in np.split(order, bounds):
+                if len(rows):
+                    self.index[self.filenames[self.file_ids[rows[0]]]] = rows.tolist()
+        return self.index
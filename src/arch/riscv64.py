@@ -1,30 +1,42 @@
 #!/usr/bin/env python3
 
-from arch.arch import arch_tools, insn_db_path
-from elftools.elf.elffile import ELFFile
+from arch.arch import arch_tools, insn_db_path, disassembler_backend, decoder_version
+from arch.insn import cf_kind, MASK64
+from arch.riscv64_decoder import riscv64_decoder, b_imm, j_imm, cb_imm, cj_imm
+from arch.elf_image import elf_image
 import tempfile
 import os
 import json
 import sys
 
+riscv64_branches = {'beq', 'bne', 'blt', 'bge', 'bltu', 'bgeu', 'c.beqz', 'c.bnez'}
+riscv64_jumps = {'jal', 'jalr', 'c.j', 'c.jal', 'c.jr', 'c.jalr'}
+
 class riscv64_tools(arch_tools):
-    def __init__(self, elf_path, ldflags='-no-pie', ld='riscv64-linux-gnu-ld', objdump='riscv64-linux-gnu-objdump', insn_db=insn_db_path()):
+    def __init__(self, elf_path, ldflags='-no-pie', ld='riscv64-linux-gnu-ld', objdump='riscv64-linux-gnu-objdump', insn_db=insn_db_path(), disassembler=None):
         self.elf_path = elf_path
         self.objdump = objdump
+        self.disassembler = disassembler or disassembler_backend()
         self.openfiles = []
         self.tmpfiles = []
-        f = open(self. elf_path, 'rb')
-        self.elf = ELFFile(f)
+        self.cache = None
+        self.symtab = None
+        self.func_index = None
+        self.dwarf_dies = None
+        image = elf_image(self.elf_path)
+        self.elf = image.elf
         if self.elf['e_type'] == 'ET_REL':
             tf = tempfile.NamedTemporaryFile(delete=False)
             self.elf_path = tf.name
             self.tmpfiles.append(tf.name)
             if os.system(f'{ld} -o {tf.name} {elf_path} {ldflags} --warn-unresolved-symbols 2>/dev/null') != 0:
                 raise Exception('Failed to compile ELF file')
-            f.close()
-            f = open(tf.name, 'rb')
-            self.elf = ELFFile(f)
-        self.openfiles.append(f)
+            image.close()
+            image = elf_image(tf.name)
+            self.elf = image.elf
+        self.image = image
+        self.openfiles.append(image)
+        self.insn_db = insn_db
         self.insn_db_riscv64 = None
         if insn_db:
             try:
@@ -39,39 +51,84 @@ class riscv64_tools(arch_tools):
         for f in self.tmpfiles:
             os.remove(f)
 
-    def read_dwarf(self):
-        return super().read_dwarf()
+    def analysis_params(self):
+        return super().analysis_params() + (str(self.insn_db), self.disassembler)
+
+    def disassembler_version(self):
+        if self.disassembler == 'native':
+            return decoder_version(riscv64_decoder)
+        return super().disassembler_version()
+
+    def read_dwarf(self, pcs=None):
+        return super().read_dwarf(pcs)
     
-    def read_textdump(self):
-        return super().read_textdump('-M no-aliases -M,max')
+    def read_textdump(self, jobs=None, symbols=None):
+        return super().read_textdump('-M no-aliases -M,max', jobs, symbols)
+
+    # With the native disassembler, decode .text in-process instead of running objdump
+    def iter_textdump(self, objdump_opts='', jobs=None, symbols=None, store=None):
+        if self.disassembler == 'native':
+            return self._iter_native_textdump(riscv64_decoder(), symbols, store)
+        return super().iter_textdump(objdump_opts, jobs, symbols, store)
+
+    def may_change_control_flow(self, mnemonic):
+        return mnemonic in riscv64_branches or mnemonic in riscv64_jumps
+
+    def decode_control_flow(self, mnemonic, operands):
+        if mnemonic in riscv64_branches:
+            return cf_kind.BRANCH
+        # For jal and jalr, the destination register ra (the return address register) makes them calls,
+        # any other destination is a jump that never returns
+        if mnemonic == 'jal':
+            return cf_kind.CALL if operands.startswith('ra') else cf_kind.JUMP
+        if mnemonic == 'jalr':
+            if operands.startswith('ra'):
+                return cf_kind.INDIRECT_CALL
+            if operands in ['zero,0(ra)', 'zero,ra,0']:
+                return cf_kind.RETURN
+            return cf_kind.INDIRECT_JUMP
+        if mnemonic == 'c.j':
+            return cf_kind.JUMP
+        if mnemonic == 'c.jal':
+            return cf_kind.CALL
+        if mnemonic == 'c.jr':
+            return cf_kind.RETURN if operands == 'ra' else cf_kind.INDIRECT_JUMP
+        if mnemonic == 'c.jalr':
+            return cf_kind.INDIRECT_CALL
+        return cf_kind.NONE
+
+    def branch_target(self, addr, hex_code, length):
+        x = hex_code
+        if length == 2 and x & 0x3 == 0x1 and (x >> 13) in [1, 5]:
+            # CJ format: c.j, c.jal
+            return (addr + cj_imm(x)) & MASK64
+        if length == 2 and x & 0x3 == 0x1 and (x >> 13) in [6, 7]:
+            # CB format: c.beqz, c.bnez
+            return (addr + cb_imm(x)) & MASK64
+        if length == 4 and x & 0x7f == 0x63:
+            # B format
+            return (addr + b_imm(x)) & MASK64
+        if length == 4 and x & 0x7f == 0x6f:
+            # J format
+            return (addr + j_imm(x)) & MASK64
+        return None
 
     def is_control_flow_instr(self, instr):
-        # instr should be (hex_code, instr, control_flow_dir) from read_textdump
+        # instr should be an insn from read_textdump
         if self.is_control_flow_end(instr):
             return True
-        if instr[2] == 'X' or instr[2] == '-':
+        if instr.control_flow_dir == 'X' or instr.control_flow_dir == '-':
             return True
         return False
 
     def is_control_flow_end(self, instr):
-        instr_split_t = instr[1].split("\t")
-        instr0 = instr_split_t[0].strip()
         # For those jump that never return, we consider them as control flow end
-        if instr[0] in ['c.j', 'c.jal', 'c.jr', 'c.jalr']:
-            return True
-        # For jal and jalr, we consider them as control flow end if the target is not ra
-        # (ra is the return address register, which is used for function calls)
-        if instr0 in ['jal', 'jalr']:
-            instr1 = instr_split_t[1].strip() if len(instr_split_t) > 1 else ""
-            if not instr1.startswith('ra'):
-                return True
-        return False
+        return instr.kind in [cf_kind.JUMP, cf_kind.INDIRECT_JUMP, cf_kind.RETURN]
 
     def get_insn_class_by_instr(self, instr):
-        instr = instr[1].split("\t")[0].strip()
         if self.insn_db_riscv64:
-            if instr in self.insn_db_riscv64:
-                return self.insn_db_riscv64[instr]
+            if instr.mnemonic in self.insn_db_riscv64:
+                return self.insn_db_riscv64[instr.mnemonic]
         return None
 
     def get_insn_class_level_dict(self):
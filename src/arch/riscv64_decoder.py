@@ -0,0 +1,616 @@
+#!/usr/bin/env python3
+
+from string import Formatter
+from arch.insn import bits, sign_extend, MASK64
+
+# In-process RV64GC + V disassembler producing the same text as
+# `riscv64-linux-gnu-objdump -M no-aliases -d`. Instructions are matched against a
+# (match, mask) table bucketed by opcode and the fixed function bits, the operands are
+# formatted from str.format templates whose fields are extracted from the encoding.
+
+x_regs = ['zero', 'ra', 'sp', 'gp', 'tp', 't0', 't1', 't2', 's0', 's1', 'a0', 'a1', 'a2', 'a3', 'a4', 'a5',
+          'a6', 'a7', 's2', 's3', 's4', 's5', 's6', 's7', 's8', 's9', 's10', 's11', 't3', 't4', 't5', 't6']
+f_regs = ['ft0', 'ft1', 'ft2', 'ft3', 'ft4', 'ft5', 'ft6', 'ft7', 'fs0', 'fs1', 'fa0', 'fa1', 'fa2', 'fa3', 'fa4', 'fa5',
+          'fa6', 'fa7', 'fs2', 'fs3', 'fs4', 'fs5', 'fs6', 'fs7', 'fs8', 'fs9', 'fs10', 'fs11', 'ft8', 'ft9', 'ft10', 'ft11']
+v_regs = [f'v{i}' for i in range(32)]
+rounding_modes = ['rne', 'rtz', 'rdn', 'rup', 'rmm', None, None, 'dyn']
+csr_names = {
+    0x001: 'fflags', 0x002: 'frm', 0x003: 'fcsr', 0x008: 'vstart', 0x009: 'vxsat', 0x00a: 'vxrm', 0x00f: 'vcsr',
+    0x100: 'sstatus', 0x104: 'sie', 0x105: 'stvec', 0x140: 'sscratch', 0x141: 'sepc', 0x142: 'scause',
+    0x143: 'stval', 0x144: 'sip', 0x180: 'satp', 0x300: 'mstatus', 0x301: 'misa', 0x304: 'mie', 0x305: 'mtvec',
+    0x340: 'mscratch', 0x341: 'mepc', 0x342: 'mcause', 0x343: 'mtval', 0x344: 'mip', 0xc00: 'cycle',
+    0xc01: 'time', 0xc02: 'instret', 0xc20: 'vl', 0xc21: 'vtype', 0xc22: 'vlenb', 0xf14: 'mhartid'
+}
+vlmul_names = ['m1', 'm2', 'm4', 'm8', None, 'mf8', 'mf4', 'mf2']
+
+# Branch offsets of the B, J, CB and CJ formats
+def b_imm(x):
+    return sign_extend((bits(x, 31, 31) << 12) | (bits(x, 7, 7) << 11) | (bits(x, 30, 25) << 5) | (bits(x, 11, 8) << 1), 13)
+
+def j_imm(x):
+    return sign_extend((bits(x, 31, 31) << 20) | (bits(x, 19, 12) << 12) | (bits(x, 20, 20) << 11) | (bits(x, 30, 21) << 1), 21)
+
+def cb_imm(x):
+    return sign_extend((bits(x, 12, 12) << 8) | (bits(x, 11, 10) << 3) | (bits(x, 6, 5) << 6) |
+                       (bits(x, 4, 3) << 1) | (bits(x, 2, 2) << 5), 9)
+
+def cj_imm(x):
+    return sign_extend((bits(x, 12, 12) << 11) | (bits(x, 11, 11) << 4) | (bits(x, 10, 9) << 8) | (bits(x, 8, 8) << 10) |
+                       (bits(x, 7, 7) << 6) | (bits(x, 6, 6) << 7) | (bits(x, 5, 3) << 1) | (bits(x, 2, 2) << 5), 12)
+
+def fence_set(value):
+    res = ''.join(c for c, bit in zip('iorw', [8, 4, 2, 1]) if value & bit)
+    return res if res else '0'
+
+def vtype_name(vtype):
+    vsew = bits(vtype, 5, 3)
+    vlmul = vlmul_names[bits(vtype, 2, 0)]
+    if vtype >> 8 or vsew > 3 or vlmul is None:
+        return hex(vtype)
+    return f"e{8 << vsew},{vlmul},{'ta' if vtype & 0x40 else 'tu'},{'ma' if vtype & 0x80 else 'mu'}"
+
+# Operand fields, called with (encoding, address, symbolize)
+fields = {
+    'rd': lambda x, a, s: x_regs[bits(x, 11, 7)],
+    'rs1': lambda x, a, s: x_regs[bits(x, 19, 15)],
+    'rs2': lambda x, a, s: x_regs[bits(x, 24, 20)],
+    'fd': lambda x, a, s: f_regs[bits(x, 11, 7)],
+    'fs1': lambda x, a, s: f_regs[bits(x, 19, 15)],
+    'fs2': lambda x, a, s: f_regs[bits(x, 24, 20)],
+    'fs3': lambda x, a, s: f_regs[bits(x, 31, 27)],
+    'vd': lambda x, a, s: v_regs[bits(x, 11, 7)],
+    'vs1': lambda x, a, s: v_regs[bits(x, 19, 15)],
+    'vs2': lambda x, a, s: v_regs[bits(x, 24, 20)],
+    'vm': lambda x, a, s: '' if x & (1 << 25) else ',v0.t',
+    'imm_i': lambda x, a, s: sign_extend(bits(x, 31, 20), 12),
+    'imm_s': lambda x, a, s: sign_extend((bits(x, 31, 25) << 5) | bits(x, 11, 7), 12),
+    'imm_u': lambda x, a, s: hex(bits(x, 31, 12)),
+    'shamt': lambda x, a, s: hex(bits(x, 25, 20)),
+    'shamt5': lambda x, a, s: hex(bits(x, 24, 20)),
+    'simm5': lambda x, a, s: sign_extend(bits(x, 19, 15), 5),
+    'uimm5': lambda x, a, s: bits(x, 19, 15),
+    'csr': lambda x, a, s: csr_names.get(bits(x, 31, 20), hex(bits(x, 31, 20))),
+    'rm': lambda x, a, s: '' if bits(x, 14, 12) == 7 else ',' + rounding_modes[bits(x, 14, 12)],
+    # Conversions that are always exact, gas encodes them with rne
+    'rm_exact': lambda x, a, s: '' if bits(x, 14, 12) in [0, 7] else ',' + rounding_modes[bits(x, 14, 12)],
+    'pred': lambda x, a, s: fence_set(bits(x, 27, 24)),
+    'succ': lambda x, a, s: fence_set(bits(x, 23, 20)),
+    'vtypei': lambda x, a, s: vtype_name(bits(x, 30, 20)),
+    'vtypei10': lambda x, a, s: vtype_name(bits(x, 29, 20)),
+    'target_b': lambda x, a, s: s((a + b_imm(x)) & MASK64),
+    'target_j': lambda x, a, s: s((a + j_imm(x)) & MASK64),
+    # Compressed
+    'crd': lambda x, a, s: x_regs[bits(x, 11, 7)],
+    'crd_nz': lambda x, a, s: x_regs[bits(x, 11, 7)],
+    'crs2': lambda x, a, s: x_regs[bits(x, 6, 2)],
+    'crs2_nz': lambda x, a, s: x_regs[bits(x, 6, 2)],
+    'cfrd': lambda x, a, s: f_regs[bits(x, 11, 7)],
+    'cfrs2': lambda x, a, s: f_regs[bits(x, 6, 2)],
+    'crs1p': lambda x, a, s: x_regs[8 + bits(x, 9, 7)],
+    'crs2p': lambda x, a, s: x_regs[8 + bits(x, 4, 2)],
+    'cfrs2p': lambda x, a, s: f_regs[8 + bits(x, 4, 2)],
+    'cimm': lambda x, a, s: sign_extend((bits(x, 12, 12) << 5) | bits(x, 6, 2), 6),
+    'cshamt': lambda x, a, s: hex((bits(x, 12, 12) << 5) | bits(x, 6, 2)),
+    'clui_imm': lambda x, a, s: hex(sign_extend((bits(x, 12, 12) << 5) | bits(x, 6, 2), 6) & 0xfffff),
+    'caddi4spn_nzimm': lambda x, a, s: (bits(x, 12, 11) << 4) | (bits(x, 10, 7) << 6) | (bits(x, 6, 6) << 2) | (bits(x, 5, 5) << 3),
+    'caddi16sp_imm': lambda x, a, s: sign_extend((bits(x, 12, 12) << 9) | (bits(x, 6, 6) << 4) | (bits(x, 5, 5) << 6) |
+                                                 (bits(x, 4, 3) << 7) | (bits(x, 2, 2) << 5), 10),
+    'clw_imm': lambda x, a, s: (bits(x, 12, 10) << 3) | (bits(x, 6, 6) << 2) | (bits(x, 5, 5) << 6),
+    'cld_imm': lambda x, a, s: (bits(x, 12, 10) << 3) | (bits(x, 6, 5) << 6),
+    'clwsp_imm': lambda x, a, s: (bits(x, 12, 12) << 5) | (bits(x, 6, 4) << 2) | (bits(x, 3, 2) << 6),
+    'cldsp_imm': lambda x, a, s: (bits(x, 12, 12) << 5) | (bits(x, 6, 5) << 3) | (bits(x, 4, 2) << 6),
+    'cswsp_imm': lambda x, a, s: (bits(x, 12, 9) << 2) | (bits(x, 8, 7) << 6),
+    'csdsp_imm': lambda x, a, s: (bits(x, 12, 10) << 3) | (bits(x, 9, 7) << 6),
+    'target_cb': lambda x, a, s: s((a + cb_imm(x)) & MASK64),
+    'target_cj': lambda x, a, s: s((a + cj_imm(x)) & MASK64),
+}
+target_fields = {'target_b', 'target_j', 'target_cb', 'target_cj'}
+# Field => predicate on the encoding, true when the field holds a reserved value: such encodings are
+# not instructions and print as .insn like GNU objdump does
+reserved_fields = {
+    'rm': lambda x: bits(x, 14, 12) in [5, 6],
+    'rm_exact': lambda x: bits(x, 14, 12) in [5, 6],
+    'crd_nz': lambda x: bits(x, 11, 7) == 0,
+    'crs2_nz': lambda x: bits(x, 6, 2) == 0,
+    'caddi4spn_nzimm': lambda x: bits(x, 12, 5) == 0,
+}
+
+R = '{rd},{rs1},{rs2}'
+I = '{rd},{rs1},{imm_i}'
+UNARY = '{rd},{rs1}'
+LOAD = '{rd},{imm_i}({rs1})'
+STORE = '{rs2},{imm_s}({rs1})'
+
+# (name, match, mask, operand template)
+base_table = [
+    ('lui', 0x37, 0x7f, '{rd},{imm_u}'),
+    ('auipc', 0x17, 0x7f, '{rd},{imm_u}'),
+    ('jal', 0x6f, 0x7f, '{rd},{target_j}'),
+    ('jalr', 0x67, 0x707f, LOAD),
+    ('beq', 0x63, 0x707f, '{rs1},{rs2},{target_b}'),
+    ('bne', 0x1063, 0x707f, '{rs1},{rs2},{target_b}'),
+    ('blt', 0x4063, 0x707f, '{rs1},{rs2},{target_b}'),
+    ('bge', 0x5063, 0x707f, '{rs1},{rs2},{target_b}'),
+    ('bltu', 0x6063, 0x707f, '{rs1},{rs2},{target_b}'),
+    ('bgeu', 0x7063, 0x707f, '{rs1},{rs2},{target_b}'),
+    ('lb', 0x3, 0x707f, LOAD),
+    ('lh', 0x1003, 0x707f, LOAD),
+    ('lw', 0x2003, 0x707f, LOAD),
+    ('ld', 0x3003, 0x707f, LOAD),
+    ('lbu', 0x4003, 0x707f, LOAD),
+    ('lhu', 0x5003, 0x707f, LOAD),
+    ('lwu', 0x6003, 0x707f, LOAD),
+    ('sb', 0x23, 0x707f, STORE),
+    ('sh', 0x1023, 0x707f, STORE),
+    ('sw', 0x2023, 0x707f, STORE),
+    ('sd', 0x3023, 0x707f, STORE),
+    ('addi', 0x13, 0x707f, I),
+    ('slti', 0x2013, 0x707f, I),
+    ('sltiu', 0x3013, 0x707f, I),
+    ('xori', 0x4013, 0x707f, I),
+    ('ori', 0x6013, 0x707f, I),
+    ('andi', 0x7013, 0x707f, I),
+    ('slli', 0x1013, 0xfc00707f, '{rd},{rs1},{shamt}'),
+    ('srli', 0x5013, 0xfc00707f, '{rd},{rs1},{shamt}'),
+    ('srai', 0x40005013, 0xfc00707f, '{rd},{rs1},{shamt}'),
+    ('addiw', 0x1b, 0x707f, I),
+    ('slliw', 0x101b, 0xfe00707f, '{rd},{rs1},{shamt5}'),
+    ('srliw', 0x501b, 0xfe00707f, '{rd},{rs1},{shamt5}'),
+    ('sraiw', 0x4000501b, 0xfe00707f, '{rd},{rs1},{shamt5}'),
+    ('add', 0x33, 0xfe00707f, R),
+    ('sub', 0x40000033, 0xfe00707f, R),
+    ('sll', 0x1033, 0xfe00707f, R),
+    ('slt', 0x2033, 0xfe00707f, R),
+    ('sltu', 0x3033, 0xfe00707f, R),
+    ('xor', 0x4033, 0xfe00707f, R),
+    ('srl', 0x5033, 0xfe00707f, R),
+    ('sra', 0x40005033, 0xfe00707f, R),
+    ('or', 0x6033, 0xfe00707f, R),
+    ('and', 0x7033, 0xfe00707f, R),
+    ('addw', 0x3b, 0xfe00707f, R),
+    ('subw', 0x4000003b, 0xfe00707f, R),
+    ('sllw', 0x103b, 0xfe00707f, R),
+    ('srlw', 0x503b, 0xfe00707f, R),
+    ('sraw', 0x4000503b, 0xfe00707f, R),
+    ('pause', 0x0100000f, 0xffffffff, ''),
+    ('fence.tso', 0x8330000f, 0xffffffff, ''),
+    ('fence', 0xf, 0xf00fffff, '{pred},{succ}'),
+    ('fence.i', 0x100f, 0xffffffff, ''),
+    ('ecall', 0x73, 0xffffffff, ''),
+    ('ebreak', 0x100073, 0xffffffff, ''),
+    ('sret', 0x10200073, 0xffffffff, ''),
+    ('mret', 0x30200073, 0xffffffff, ''),
+    ('wfi', 0x10500073, 0xffffffff, ''),
+    ('csrrw', 0x1073, 0x707f, '{rd},{csr},{rs1}'),
+    ('csrrs', 0x2073, 0x707f, '{rd},{csr},{rs1}'),
+    ('csrrc', 0x3073, 0x707f, '{rd},{csr},{rs1}'),
+    ('csrrwi', 0x5073, 0x707f, '{rd},{csr},{uimm5}'),
+    ('csrrsi', 0x6073, 0x707f, '{rd},{csr},{uimm5}'),
+    ('csrrci', 0x7073, 0x707f, '{rd},{csr},{uimm5}'),
+    # M
+    ('mul', 0x2000033, 0xfe00707f, R),
+    ('mulh', 0x2001033, 0xfe00707f, R),
+    ('mulhsu', 0x2002033, 0xfe00707f, R),
+    ('mulhu', 0x2003033, 0xfe00707f, R),
+    ('div', 0x2004033, 0xfe00707f, R),
+    ('divu', 0x2005033, 0xfe00707f, R),
+    ('rem', 0x2006033, 0xfe00707f, R),
+    ('remu', 0x2007033, 0xfe00707f, R),
+    ('mulw', 0x200003b, 0xfe00707f, R),
+    ('divw', 0x200403b, 0xfe00707f, R),
+    ('divuw', 0x200503b, 0xfe00707f, R),
+    ('remw', 0x200603b, 0xfe00707f, R),
+    ('remuw', 0x200703b, 0xfe00707f, R),
+    # F and D
+    ('flw', 0x2007, 0x707f, '{fd},{imm_i}({rs1})'),
+    ('fld', 0x3007, 0x707f, '{fd},{imm_i}({rs1})'),
+    ('fsw', 0x2027, 0x707f, '{fs2},{imm_s}({rs1})'),
+    ('fsd', 0x3027, 0x707f, '{fs2},{imm_s}({rs1})'),
+    ('fcvt.s.d', 0x40100053, 0xfff0007f, '{fd},{fs1}{rm}'),
+    ('fcvt.d.s', 0x42000053, 0xfff0007f, '{fd},{fs1}{rm_exact}'),
+    # Zba, Zbb, Zbc, Zbs and Zicond
+    ('sh1add', 0x20002033, 0xfe00707f, R),
+    ('sh2add', 0x20004033, 0xfe00707f, R),
+    ('sh3add', 0x20006033, 0xfe00707f, R),
+    ('add.uw', 0x0800003b, 0xfe00707f, R),
+    ('sh1add.uw', 0x2000203b, 0xfe00707f, R),
+    ('sh2add.uw', 0x2000403b, 0xfe00707f, R),
+    ('sh3add.uw', 0x2000603b, 0xfe00707f, R),
+    ('slli.uw', 0x0800101b, 0xfc00707f, '{rd},{rs1},{shamt}'),
+    ('andn', 0x40007033, 0xfe00707f, R),
+    ('orn', 0x40006033, 0xfe00707f, R),
+    ('xnor', 0x40004033, 0xfe00707f, R),
+    ('max', 0x0a006033, 0xfe00707f, R),
+    ('maxu', 0x0a007033, 0xfe00707f, R),
+    ('min', 0x0a004033, 0xfe00707f, R),
+    ('minu', 0x0a005033, 0xfe00707f, R),
+    ('rol', 0x60001033, 0xfe00707f, R),
+    ('ror', 0x60005033, 0xfe00707f, R),
+    ('rolw', 0x6000103b, 0xfe00707f, R),
+    ('rorw', 0x6000503b, 0xfe00707f, R),
+    ('rori', 0x60005013, 0xfc00707f, '{rd},{rs1},{shamt}'),
+    ('roriw', 0x6000501b, 0xfe00707f, '{rd},{rs1},{shamt5}'),
+    ('clz', 0x60001013, 0xfff0707f, UNARY),
+    ('ctz', 0x60101013, 0xfff0707f, UNARY),
+    ('cpop', 0x60201013, 0xfff0707f, UNARY),
+    ('sext.b', 0x60401013, 0xfff0707f, UNARY),
+    ('sext.h', 0x60501013, 0xfff0707f, UNARY),
+    ('clzw', 0x6000101b, 0xfff0707f, UNARY),
+    ('ctzw', 0x6010101b, 0xfff0707f, UNARY),
+    ('cpopw', 0x6020101b, 0xfff0707f, UNARY),
+    ('zext.h', 0x0800403b, 0xfff0707f, UNARY),
+    ('orc.b', 0x28705013, 0xfff0707f, UNARY),
+    ('rev8', 0x6b805013, 0xfff0707f, UNARY),
+    ('clmul', 0x0a001033, 0xfe00707f, R),
+    ('clmulr', 0x0a002033, 0xfe00707f, R),
+    ('clmulh', 0x0a003033, 0xfe00707f, R),
+    ('bclr', 0x48001033, 0xfe00707f, R),
+    ('bset', 0x28001033, 0xfe00707f, R),
+    ('binv', 0x68001033, 0xfe00707f, R),
+    ('bext', 0x48005033, 0xfe00707f, R),
+    ('bclri', 0x48001013, 0xfc00707f, '{rd},{rs1},{shamt}'),
+    ('bseti', 0x28001013, 0xfc00707f, '{rd},{rs1},{shamt}'),
+    ('binvi', 0x68001013, 0xfc00707f, '{rd},{rs1},{shamt}'),
+    ('bexti', 0x48005013, 0xfc00707f, '{rd},{rs1},{shamt}'),
+    ('czero.eqz', 0x0e005033, 0xfe00707f, R),
+    ('czero.nez', 0x0e007033, 0xfe00707f, R),
+    # V configuration
+    ('vsetvli', 0x7057, 0x8000707f, '{rd},{rs1},{vtypei}'),
+    ('vsetivli', 0xc0007057, 0xc000707f, '{rd},{uimm5},{vtypei10}'),
+    ('vsetvl', 0x80007057, 0xfe00707f, R),
+]
+
+compressed_table = [
+    ('c.unimp', 0x0000, 0xffff, ''),
+    ('c.addi4spn', 0x0000, 0xe003, '{crs2p},sp,{caddi4spn_nzimm}'),
+    ('c.fld', 0x2000, 0xe003, '{cfrs2p},{cld_imm}({crs1p})'),
+    ('c.lw', 0x4000, 0xe003, '{crs2p},{clw_imm}({crs1p})'),
+    ('c.ld', 0x6000, 0xe003, '{crs2p},{cld_imm}({crs1p})'),
+    ('c.fsd', 0xa000, 0xe003, '{cfrs2p},{cld_imm}({crs1p})'),
+    ('c.sw', 0xc000, 0xe003, '{crs2p},{clw_imm}({crs1p})'),
+    ('c.sd', 0xe000, 0xe003, '{crs2p},{cld_imm}({crs1p})'),
+    ('c.nop', 0x0001, 0xffff, ''),
+    ('c.addi', 0x0001, 0xe003, '{crd},{cimm}'),
+    ('c.addiw', 0x2001, 0xe003, '{crd_nz},{cimm}'),
+    ('c.li', 0x4001, 0xe003, '{crd},{cimm}'),
+    ('c.addi16sp', 0x6101, 0xef83, 'sp,{caddi16sp_imm}'),
+    ('c.lui', 0x6001, 0xe003, '{crd},{clui_imm}'),
+    ('c.srli', 0x8001, 0xec03, '{crs1p},{cshamt}'),
+    ('c.srai', 0x8401, 0xec03, '{crs1p},{cshamt}'),
+    ('c.andi', 0x8801, 0xec03, '{crs1p},{cimm}'),
+    ('c.sub', 0x8c01, 0xfc63, '{crs1p},{crs2p}'),
+    ('c.xor', 0x8c21, 0xfc63, '{crs1p},{crs2p}'),
+    ('c.or', 0x8c41, 0xfc63, '{crs1p},{crs2p}'),
+    ('c.and', 0x8c61, 0xfc63, '{crs1p},{crs2p}'),
+    ('c.subw', 0x9c01, 0xfc63, '{crs1p},{crs2p}'),
+    ('c.addw', 0x9c21, 0xfc63, '{crs1p},{crs2p}'),
+    ('c.j', 0xa001, 0xe003, '{target_cj}'),
+    ('c.beqz', 0xc001, 0xe003, '{crs1p},{target_cb}'),
+    ('c.bnez', 0xe001, 0xe003, '{crs1p},{target_cb}'),
+    ('c.slli', 0x0002, 0xe003, '{crd},{cshamt}'),
+    ('c.fldsp', 0x2002, 0xe003, '{cfrd},{cldsp_imm}(sp)'),
+    ('c.lwsp', 0x4002, 0xe003, '{crd_nz},{clwsp_imm}(sp)'),
+    ('c.ldsp', 0x6002, 0xe003, '{crd_nz},{cldsp_imm}(sp)'),
+    ('c.jr', 0x8002, 0xf07f, '{crd_nz}'),
+    ('c.mv', 0x8002, 0xf003, '{crd},{crs2_nz}'),
+    ('c.ebreak', 0x9002, 0xffff, ''),
+    ('c.jalr', 0x9002, 0xf07f, '{crd}'),
+    ('c.add', 0x9002, 0xf003, '{crd},{crs2}'),
+    ('c.fsdsp', 0xa002, 0xe003, '{cfrs2},{csdsp_imm}(sp)'),
+    ('c.swsp', 0xc002, 0xe003, '{crs2},{cswsp_imm}(sp)'),
+    ('c.sdsp', 0xe002, 0xe003, '{crs2},{csdsp_imm}(sp)'),
+]
+
+def amo_table():
+    amos = [('lr', 0b00010), ('sc', 0b00011), ('amoswap', 0b00001), ('amoadd', 0b00000), ('amoxor', 0b00100),
+            ('amoand', 0b01100), ('amoor', 0b01000), ('amomin', 0b10000), ('amomax', 0b10100),
+            ('amominu', 0b11000), ('amomaxu', 0b11100)]
+    table = []
+    for name, funct5 in amos:
+        for width, funct3 in [('w', 2), ('d', 3)]:
+            for ordering, aqrl in [('', 0), ('.rl', 1), ('.aq', 2), ('.aqrl', 3)]:
+                match = (funct5 << 27) | (aqrl << 25) | (funct3 << 12) | 0x2f
+                if name == 'lr':
+                    table.append((f'{name}.{width}{ordering}', match, 0xfff0707f, '{rd},({rs1})'))
+                else:
+                    table.append((f'{name}.{width}{ordering}', match, 0xfe00707f, '{rd},{rs2},({rs1})'))
+    return table
+
+def fp_table():
+    table = []
+    for fmt, suffix in [(0, 's'), (1, 'd')]:
+        f = fmt << 25
+        table += [
+            (f'fmadd.{suffix}', 0x43 | f, 0x0600007f, '{fd},{fs1},{fs2},{fs3}{rm}'),
+            (f'fmsub.{suffix}', 0x47 | f, 0x0600007f, '{fd},{fs1},{fs2},{fs3}{rm}'),
+            (f'fnmsub.{suffix}', 0x4b | f, 0x0600007f, '{fd},{fs1},{fs2},{fs3}{rm}'),
+            (f'fnmadd.{suffix}', 0x4f | f, 0x0600007f, '{fd},{fs1},{fs2},{fs3}{rm}'),
+            (f'fadd.{suffix}', 0x00000053 | f, 0xfe00007f, '{fd},{fs1},{fs2}{rm}'),
+            (f'fsub.{suffix}', 0x08000053 | f, 0xfe00007f, '{fd},{fs1},{fs2}{rm}'),
+            (f'fmul.{suffix}', 0x10000053 | f, 0xfe00007f, '{fd},{fs1},{fs2}{rm}'),
+            (f'fdiv.{suffix}', 0x18000053 | f, 0xfe00007f, '{fd},{fs1},{fs2}{rm}'),
+            (f'fsqrt.{suffix}', 0x58000053 | f, 0xfff0007f, '{fd},{fs1}{rm}'),
+            (f'fsgnj.{suffix}', 0x20000053 | f, 0xfe00707f, '{fd},{fs1},{fs2}'),
+            (f'fsgnjn.{suffix}', 0x20001053 | f, 0xfe00707f, '{fd},{fs1},{fs2}'),
+            (f'fsgnjx.{suffix}', 0x20002053 | f, 0xfe00707f, '{fd},{fs1},{fs2}'),
+            (f'fmin.{suffix}', 0x28000053 | f, 0xfe00707f, '{fd},{fs1},{fs2}'),
+            (f'fmax.{suffix}', 0x28001053 | f, 0xfe00707f, '{fd},{fs1},{fs2}'),
+            (f'feq.{suffix}', 0xa0002053 | f, 0xfe00707f, '{rd},{fs1},{fs2}'),
+            (f'flt.{suffix}', 0xa0001053 | f, 0xfe00707f, '{rd},{fs1},{fs2}'),
+            (f'fle.{suffix}', 0xa0000053 | f, 0xfe00707f, '{rd},{fs1},{fs2}'),
+            (f'fclass.{suffix}', 0xe0001053 | f, 0xfff0707f, '{rd},{fs1}'),
+            (f'fcvt.w.{suffix}', 0xc0000053 | f, 0xfff0007f, '{rd},{fs1}{rm}'),
+            (f'fcvt.wu.{suffix}', 0xc0100053 | f, 0xfff0007f, '{rd},{fs1}{rm}'),
+            (f'fcvt.l.{suffix}', 0xc0200053 | f, 0xfff0007f, '{rd},{fs1}{rm}'),
+            (f'fcvt.lu.{suffix}', 0xc0300053 | f, 0xfff0007f, '{rd},{fs1}{rm}'),
+            (f'fcvt.{suffix}.l', 0xd0200053 | f, 0xfff0007f, '{fd},{rs1}{rm}'),
+            (f'fcvt.{suffix}.lu', 0xd0300053 | f, 0xfff0007f, '{fd},{rs1}{rm}'),
+        ]
+        # int32 to double is exact
+        w_rm = '{rm_exact}' if suffix == 'd' else '{rm}'
+        table += [
+            (f'fcvt.{suffix}.w', 0xd0000053 | f, 0xfff0007f, '{fd},{rs1}' + w_rm),
+            (f'fcvt.{suffix}.wu', 0xd0100053 | f, 0xfff0007f, '{fd},{rs1}' + w_rm),
+        ]
+    table += [
+        ('fmv.x.w', 0xe0000053, 0xfff0707f, '{rd},{fs1}'),
+        ('fmv.w.x', 0xf0000053, 0xfff0707f, '{fd},{rs1}'),
+        ('fmv.x.d', 0xe2000053, 0xfff0707f, '{rd},{fs1}'),
+        ('fmv.d.x', 0xf2000053, 0xfff0707f, '{fd},{rs1}'),
+    ]
+    return table
+
+OPIVV, OPFVV, OPMVV, OPIVI, OPIVX, OPFVF, OPMVX = 0, 1, 2, 3, 4, 5, 6
+
+def op_v(funct6, funct3, vm=None, rs1=None, rs2=None):
+    match = (funct6 << 26) | (funct3 << 12) | 0x57
+    mask = 0xfc00707f
+    if vm is not None:
+        match |= vm << 25
+        mask |= 1 << 25
+    if rs1 is not None:
+        match |= rs1 << 15
+        mask |= 0x1f << 15
+    if rs2 is not None:
+        match |= rs2 << 20
+        mask |= 0x1f << 20
+    return (match, mask)
+
+# Operand suffix => (funct3, operand template), 'u' is the .vi form with an unsigned immediate
+v_forms = {
+    'vv': (OPIVV, '{vd},{vs2},{vs1}{vm}'), 'vx': (OPIVX, '{vd},{vs2},{rs1}{vm}'),
+    'vi': (OPIVI, '{vd},{vs2},{simm5}{vm}'), 'vu': (OPIVI, '{vd},{vs2},{uimm5}{vm}'),
+    'wv': (OPIVV, '{vd},{vs2},{vs1}{vm}'), 'wx': (OPIVX, '{vd},{vs2},{rs1}{vm}'),
+    'wu': (OPIVI, '{vd},{vs2},{uimm5}{vm}'), 'vs': (OPIVV, '{vd},{vs2},{vs1}{vm}'),
+}
+vm_forms = {
+    'vv': (OPMVV, '{vd},{vs2},{vs1}{vm}'), 'vx': (OPMVX, '{vd},{vs2},{rs1}{vm}'),
+    'wv': (OPMVV, '{vd},{vs2},{vs1}{vm}'), 'wx': (OPMVX, '{vd},{vs2},{rs1}{vm}'),
+    'vs': (OPMVV, '{vd},{vs2},{vs1}{vm}'), 'mm': (OPMVV, '{vd},{vs2},{vs1}'),
+    # multiply-add takes the multiplier first
+    'vv*': (OPMVV, '{vd},{vs1},{vs2}{vm}'), 'vx*': (OPMVX, '{vd},{rs1},{vs2}{vm}'),
+}
+vf_forms = {
+    'vv': (OPFVV, '{vd},{vs2},{vs1}{vm}'), 'vf': (OPFVF, '{vd},{vs2},{fs1}{vm}'),
+    'wv': (OPFVV, '{vd},{vs2},{vs1}{vm}'), 'wf': (OPFVF, '{vd},{vs2},{fs1}{vm}'),
+    'vs': (OPFVV, '{vd},{vs2},{vs1}{vm}'),
+    'vv*': (OPFVV, '{vd},{vs1},{vs2}{vm}'), 'vf*': (OPFVF, '{vd},{fs1},{vs2}{vm}'),
+}
+
+# (funct6, name, operand suffixes)
+opi_ops = [
+    (0b000000, 'vadd', ['vv', 'vx', 'vi']), (0b000010, 'vsub', ['vv', 'vx']), (0b000011, 'vrsub', ['vx', 'vi']),
+    (0b000100, 'vminu', ['vv', 'vx']), (0b000101, 'vmin', ['vv', 'vx']), (0b000110, 'vmaxu', ['vv', 'vx']),
+    (0b000111, 'vmax', ['vv', 'vx']), (0b001001, 'vand', ['vv', 'vx', 'vi']), (0b001010, 'vor', ['vv', 'vx', 'vi']),
+    (0b001011, 'vxor', ['vv', 'vx', 'vi']), (0b001100, 'vrgather', ['vv', 'vx', 'vu']),
+    (0b001110, 'vslideup', ['vx', 'vu']), (0b001110, 'vrgatherei16', ['vv']), (0b001111, 'vslidedown', ['vx', 'vu']),
+    (0b011000, 'vmseq', ['vv', 'vx', 'vi']), (0b011001, 'vmsne', ['vv', 'vx', 'vi']),
+    (0b011010, 'vmsltu', ['vv', 'vx']), (0b011011, 'vmslt', ['vv', 'vx']), (0b011100, 'vmsleu', ['vv', 'vx', 'vi']),
+    (0b011101, 'vmsle', ['vv', 'vx', 'vi']), (0b011110, 'vmsgtu', ['vx', 'vi']), (0b011111, 'vmsgt', ['vx', 'vi']),
+    (0b100000, 'vsaddu', ['vv', 'vx', 'vi']), (0b100001, 'vsadd', ['vv', 'vx', 'vi']),
+    (0b100010, 'vssubu', ['vv', 'vx']), (0b100011, 'vssub', ['vv', 'vx']), (0b100101, 'vsll', ['vv', 'vx', 'vu']),
+    (0b100111, 'vsmul', ['vv', 'vx']), (0b101000, 'vsrl', ['vv', 'vx', 'vu']), (0b101001, 'vsra', ['vv', 'vx', 'vu']),
+    (0b101010, 'vssrl', ['vv', 'vx', 'vu']), (0b101011, 'vssra', ['vv', 'vx', 'vu']),
+    (0b101100, 'vnsrl', ['wv', 'wx', 'wu']), (0b101101, 'vnsra', ['wv', 'wx', 'wu']),
+    (0b101110, 'vnclipu', ['wv', 'wx', 'wu']), (0b101111, 'vnclip', ['wv', 'wx', 'wu']),
+    (0b110000, 'vwredsumu', ['vs']), (0b110001, 'vwredsum', ['vs']),
+]
+opm_ops = [
+    (0b000000, 'vredsum', ['vs']), (0b000001, 'vredand', ['vs']), (0b000010, 'vredor', ['vs']),
+    (0b000011, 'vredxor', ['vs']), (0b000100, 'vredminu', ['vs']), (0b000101, 'vredmin', ['vs']),
+    (0b000110, 'vredmaxu', ['vs']), (0b000111, 'vredmax', ['vs']), (0b001000, 'vaaddu', ['vv', 'vx']),
+    (0b001001, 'vaadd', ['vv', 'vx']), (0b001010, 'vasubu', ['vv', 'vx']), (0b001011, 'vasub', ['vv', 'vx']),
+    (0b001110, 'vslide1up', ['vx']), (0b001111, 'vslide1down', ['vx']),
+    (0b011000, 'vmandn', ['mm']), (0b011001, 'vmand', ['mm']), (0b011010, 'vmor', ['mm']), (0b011011, 'vmxor', ['mm']),
+    (0b011100, 'vmorn', ['mm']), (0b011101, 'vmnand', ['mm']), (0b011110, 'vmnor', ['mm']), (0b011111, 'vmxnor', ['mm']),
+    (0b100000, 'vdivu', ['vv', 'vx']), (0b100001, 'vdiv', ['vv', 'vx']), (0b100010, 'vremu', ['vv', 'vx']),
+    (0b100011, 'vrem', ['vv', 'vx']), (0b100100, 'vmulhu', ['vv', 'vx']), (0b100101, 'vmul', ['vv', 'vx']),
+    (0b100110, 'vmulhsu', ['vv', 'vx']), (0b100111, 'vmulh', ['vv', 'vx']), (0b101001, 'vmadd', ['vv*', 'vx*']),
+    (0b101011, 'vnmsub', ['vv*', 'vx*']), (0b101101, 'vmacc', ['vv*', 'vx*']), (0b101111, 'vnmsac', ['vv*', 'vx*']),
+    (0b110000, 'vwaddu', ['vv', 'vx']), (0b110001, 'vwadd', ['vv', 'vx']), (0b110010, 'vwsubu', ['vv', 'vx']),
+    (0b110011, 'vwsub', ['vv', 'vx']), (0b110100, 'vwaddu.w', ['wv', 'wx']), (0b110101, 'vwadd.w', ['wv', 'wx']),
+    (0b110110, 'vwsubu.w', ['wv', 'wx']), (0b110111, 'vwsub.w', ['wv', 'wx']), (0b111000, 'vwmulu', ['vv', 'vx']),
+    (0b111010, 'vwmulsu', ['vv', 'vx']), (0b111011, 'vwmul', ['vv', 'vx']), (0b111100, 'vwmaccu', ['vv*', 'vx*']),
+    (0b111101, 'vwmacc', ['vv*', 'vx*']), (0b111110, 'vwmaccus', ['vx*']), (0b111111, 'vwmaccsu', ['vv*', 'vx*']),
+]
+opf_ops = [
+    (0b000000, 'vfadd', ['vv', 'vf']), (0b000001, 'vfredusum', ['vs']), (0b000010, 'vfsub', ['vv', 'vf']),
+    (0b000011, 'vfredosum', ['vs']), (0b000100, 'vfmin', ['vv', 'vf']), (0b000101, 'vfredmin', ['vs']),
+    (0b000110, 'vfmax', ['vv', 'vf']), (0b000111, 'vfredmax', ['vs']), (0b001000, 'vfsgnj', ['vv', 'vf']),
+    (0b001001, 'vfsgnjn', ['vv', 'vf']), (0b001010, 'vfsgnjx', ['vv', 'vf']), (0b001110, 'vfslide1up', ['vf']),
+    (0b001111, 'vfslide1down', ['vf']), (0b011000, 'vmfeq', ['vv', 'vf']), (0b011001, 'vmfle', ['vv', 'vf']),
+    (0b011011, 'vmflt', ['vv', 'vf']), (0b011100, 'vmfne', ['vv', 'vf']), (0b011101, 'vmfgt', ['vf']),
+    (0b011111, 'vmfge', ['vf']), (0b100000, 'vfdiv', ['vv', 'vf']), (0b100001, 'vfrdiv', ['vf']),
+    (0b100100, 'vfmul', ['vv', 'vf']), (0b100111, 'vfrsub', ['vf']), (0b101000, 'vfmadd', ['vv*', 'vf*']),
+    (0b101001, 'vfnmadd', ['vv*', 'vf*']), (0b101010, 'vfmsub', ['vv*', 'vf*']), (0b101011, 'vfnmsub', ['vv*', 'vf*']),
+    (0b101100, 'vfmacc', ['vv*', 'vf*']), (0b101101, 'vfnmacc', ['vv*', 'vf*']), (0b101110, 'vfmsac', ['vv*', 'vf*']),
+    (0b101111, 'vfnmsac', ['vv*', 'vf*']), (0b110000, 'vfwadd', ['vv', 'vf']), (0b110001, 'vfwredusum', ['vs']),
+    (0b110010, 'vfwsub', ['vv', 'vf']), (0b110011, 'vfwredosum', ['vs']), (0b110100, 'vfwadd.w', ['wv', 'wf']),
+    (0b110110, 'vfwsub.w', ['wv', 'wf']), (0b111000, 'vfwmul', ['vv', 'vf']), (0b111100, 'vfwmacc', ['vv*', 'vf*']),
+    (0b111101, 'vfwnmacc', ['vv*', 'vf*']), (0b111110, 'vfwmsac', ['vv*', 'vf*']), (0b111111, 'vfwnmsac', ['vv*', 'vf*']),
+]
+# (funct6, funct3, vs1 or rs2 selector, name, operand template) of the unary groups
+v_unary_ops = [
+    (0b010000, OPMVV, 0b00000, 'vmv.x.s', '{rd},{vs2}'), (0b010000, OPMVV, 0b10000, 'vcpop.m', '{rd},{vs2}{vm}'),
+    (0b010000, OPMVV, 0b10001, 'vfirst.m', '{rd},{vs2}{vm}'),
+    (0b010010, OPMVV, 0b00010, 'vzext.vf8', '{vd},{vs2}{vm}'), (0b010010, OPMVV, 0b00011, 'vsext.vf8', '{vd},{vs2}{vm}'),
+    (0b010010, OPMVV, 0b00100, 'vzext.vf4', '{vd},{vs2}{vm}'), (0b010010, OPMVV, 0b00101, 'vsext.vf4', '{vd},{vs2}{vm}'),
+    (0b010010, OPMVV, 0b00110, 'vzext.vf2', '{vd},{vs2}{vm}'), (0b010010, OPMVV, 0b00111, 'vsext.vf2', '{vd},{vs2}{vm}'),
+    (0b010100, OPMVV, 0b00001, 'vmsbf.m', '{vd},{vs2}{vm}'), (0b010100, OPMVV, 0b00010, 'vmsof.m', '{vd},{vs2}{vm}'),
+    (0b010100, OPMVV, 0b00011, 'vmsif.m', '{vd},{vs2}{vm}'), (0b010100, OPMVV, 0b10000, 'viota.m', '{vd},{vs2}{vm}'),
+    (0b010000, OPFVV, 0b00000, 'vfmv.f.s', '{fd},{vs2}'),
+]
+vfunary0_ops = ['vfcvt.xu.f.v', 'vfcvt.x.f.v', 'vfcvt.f.xu.v', 'vfcvt.f.x.v', None, None, 'vfcvt.rtz.xu.f.v',
+                'vfcvt.rtz.x.f.v', 'vfwcvt.xu.f.v', 'vfwcvt.x.f.v', 'vfwcvt.f.xu.v', 'vfwcvt.f.x.v', 'vfwcvt.f.f.v',
+                None, 'vfwcvt.rtz.xu.f.v', 'vfwcvt.rtz.x.f.v', 'vfncvt.xu.f.w', 'vfncvt.x.f.w', 'vfncvt.f.xu.w',
+                'vfncvt.f.x.w', 'vfncvt.f.f.w', 'vfncvt.rod.f.f.w', 'vfncvt.rtz.xu.f.w', 'vfncvt.rtz.x.f.w']
+vfunary1_ops = {0b00000: 'vfsqrt.v', 0b00100: 'vfrsqrt7.v', 0b00101: 'vfrec7.v', 0b10000: 'vfclass.v'}
+
+def v_arith_table():
+    table = []
+    for ops, forms in [(opi_ops, v_forms), (opm_ops, vm_forms), (opf_ops, vf_forms)]:
+        for funct6, name, suffixes in ops:
+            for suffix in suffixes:
+                funct3, template = forms[suffix]
+                op_suffix = suffix.rstrip('*').replace('u', 'i')
+                if name.endswith('.w'):
+                    table.append((f'{name[:-2]}.{op_suffix}', *op_v(funct6, funct3), template))
+                elif suffix == 'mm':
+                    table.append((f'{name}.mm', *op_v(funct6, funct3, vm=1), template))
+                else:
+                    table.append((f'{name}.{op_suffix}', *op_v(funct6, funct3), template))
+    # Add/subtract with carry and merge take v0 as an operand instead of a mask
+    for funct6, name, masked, unmasked in [(0b010000, 'vadc', True, False), (0b010001, 'vmadc', True, True),
+                                           (0b010010, 'vsbc', True, False), (0b010011, 'vmsbc', True, True)]:
+        for suffix, funct3, src in [('v', OPIVV, '{vs1}'), ('x', OPIVX, '{rs1}'), ('i', OPIVI, '{simm5}')]:
+            if suffix == 'i' and name in ['vsbc', 'vmsbc']:
+                continue
+            if masked:
+                table.append((f'{name}.v{suffix}m', *op_v(funct6, funct3, vm=0), f'{{vd}},{{vs2}},{src},v0'))
+            if unmasked:
+                table.append((f'{name}.v{suffix}', *op_v(funct6, funct3, vm=1), f'{{vd}},{{vs2}},{src}'))
+    for suffix, funct3, src in [('v', OPIVV, '{vs1}'), ('x', OPIVX, '{rs1}'), ('i', OPIVI, '{simm5}')]:
+        table.append((f'vmerge.v{suffix}m', *op_v(0b010111, funct3, vm=0), f'{{vd}},{{vs2}},{src},v0'))
+        table.append((f'vmv.v.{suffix}', *op_v(0b010111, funct3, vm=1, rs2=0), f'{{vd}},{src}'))
+    table.append(('vfmerge.vfm', *op_v(0b010111, OPFVF, vm=0), '{vd},{vs2},{fs1},v0'))
+    table.append(('vfmv.v.f', *op_v(0b010111, OPFVF, vm=1, rs2=0), '{vd},{fs1}'))
+    table.append(('vcompress.vm', *op_v(0b010111, OPMVV, vm=1), '{vd},{vs2},{vs1}'))
+    for nr in [1, 2, 4, 8]:
+        table.append((f'vmv{nr}r.v', *op_v(0b100111, OPIVI, vm=1, rs1=nr - 1), '{vd},{vs2}'))
+    table.append(('vmv.s.x', *op_v(0b010000, OPMVX, vm=1, rs2=0), '{vd},{rs1}'))
+    table.append(('vfmv.s.f', *op_v(0b010000, OPFVF, vm=1, rs2=0), '{vd},{fs1}'))
+    table.append(('vid.v', *op_v(0b010100, OPMVV, rs1=0b10001, rs2=0), '{vd}{vm}'))
+    for funct6, funct3, sel, name, template in v_unary_ops:
+        table.append((name, *op_v(funct6, funct3, rs1=sel), template))
+    for sel, name in enumerate(vfunary0_ops):
+        if name:
+            table.append((name, *op_v(0b010010, OPFVV, rs1=sel), '{vd},{vs2}{vm}'))
+    for sel, name in vfunary1_ops.items():
+        table.append((name, *op_v(0b010011, OPFVV, rs1=sel), '{vd},{vs2}{vm}'))
+    return table
+
+def v_mem_table():
+    table = []
+    nf_mask = 0x7 << 29
+    for load, opcode in [(True, 0x07), (False, 0x27)]:
+        op = 'vl' if load else 'vs'
+        for funct3, eew in [(0, 8), (5, 16), (6, 32), (7, 64)]:
+            base = opcode | (funct3 << 12)
+            base_mask = 0x7f | (0x7 << 12) | nf_mask | (1 << 28) | (0x3 << 26)
+            for nf in range(8):
+                seg = f'seg{nf + 1}' if nf else ''
+                match = base | (nf << 29)
+                # unit-stride, fault-only-first, strided, indexed-unordered and indexed-ordered
+                table.append((f'{op}{seg}e{eew}.v', match, base_mask | (0x1f << 20), '{vd},({rs1}){vm}'))
+                if load:
+                    table.append((f'vl{seg}e{eew}ff.v', match | (0x10 << 20), base_mask | (0x1f << 20), '{vd},({rs1}){vm}'))
+                table.append((f'{op}s{seg}e{eew}.v', match | (2 << 26), base_mask, '{vd},({rs1}),{rs2}{vm}'))
+                table.append((f'{op}ux{seg}ei{eew}.v', match | (1 << 26), base_mask, '{vd},({rs1}),{vs2}{vm}'))
+                table.append((f'{op}ox{seg}ei{eew}.v', match | (3 << 26), base_mask, '{vd},({rs1}),{vs2}{vm}'))
+            # whole register
+            for nf in [0, 1, 3, 7]:
+                match = base | (nf << 29) | (1 << 25) | (0x08 << 20)
+                mask = base_mask | (1 << 25) | (0x1f << 20)
+                if load:
+                    table.append((f'vl{nf + 1}re{eew}.v', match, mask, '{vd},({rs1})'))
+                elif eew == 8:
+                    table.append((f'vs{nf + 1}r.v', match, mask, '{vd},({rs1})'))
+        table.append((f'{op}m.v', opcode | (1 << 25) | (0x0b << 20), 0x7f | (0x7 << 12) | nf_mask | (1 << 28) | (0x3 << 26) | (1 << 25) | (0x1f << 20), '{vd},({rs1})'))
+    return table
+
+# Opcode => bits used to pick the bucket of candidate entries, besides the opcode and funct3
+bucket_bits = {0x07: 0xec000000, 0x27: 0xec000000, 0x13: 0xfc000000, 0x1b: 0xfe000000, 0x2f: 0xf8000000,
+               0x33: 0xfe000000, 0x3b: 0xfe000000, 0x53: 0xfe000000, 0x57: 0xfc000000}
+COMPRESSED_BUCKET_MASK = 0xe003
+
+class riscv64_decoder:
+    def __init__(self):
+        self.key_masks = [0x707f | bucket_bits.get(opcode, 0) for opcode in range(128)]
+        self.buckets = dict() # (length, key) => [entry, ...]
+        for name, match, mask, template in base_table + amo_table() + fp_table() + v_arith_table() + v_mem_table():
+            self.__add(4, self.key_masks[match & 0x7f], (name, match, mask, template))
+        for name, match, mask, template in compressed_table:
+            self.__add(2, COMPRESSED_BUCKET_MASK, (name, match, mask, template))
+        for bucket in self.buckets.values():
+            # Most specific first
+            bucket.sort(key=lambda entry: -bin(entry[2]).count('1'))
+        self.memo = dict() # encoding => (mnemonic, operands) or (mnemonic, template, field names)
+
+    def __add(self, length, key_mask, entry):
+        name, match, mask, template = entry
+        names = [field for _, field, _, _ in Formatter().parse(template) if field]
+        reserved = [reserved_fields[field] for field in names if field in reserved_fields]
+        compiled = (name, match, mask, template, names, any(field in target_fields for field in names), reserved)
+        # Enumerate every bucket key the entry can match
+        free = key_mask & ~mask
+        sub = free
+        while True:
+            self.buckets.setdefault((length, (match & key_mask) | sub), []).append(compiled)
+            if sub == 0:
+                break
+            sub = (sub - 1) & free
+
+    def lookup(self, x, length):
+        key_mask = self.key_masks[x & 0x7f] if length == 4 else COMPRESSED_BUCKET_MASK
+        for entry in self.buckets.get((length, x & key_mask), []):
+            if x & entry[2] == entry[1] and not any(is_reserved(x) for is_reserved in entry[6]):
+                return entry
+        return None
+
+    # Return (mnemonic, operands) of the instruction x at addr, symbolize(target) formats branch targets
+    def disassemble(self, x, length, addr, symbolize):
+        res = self.memo.get(x)
+        if res is None:
+            entry = self.lookup(x, length)
+            if entry is None:
+                res = ('.insn', f'{length}, {hex(x)}')
+            else:
+                name, match, mask, template, names, has_target, reserved = entry
+                if has_target:
+                    res = (name, template, names)
+                else:
+                    res = (name, template.format(**{field: fields[field](x, addr, symbolize) for field in names}))
+            self.memo[x] = res
+        if len(res) == 3:
+            name, template, names = res
+            return (name, template.format(**{field: fields[field](x, addr, symbolize) for field in names}))
+        return res
+
+    # Yield (addr, hex_digits, instr) for the code in data (a memoryview) loaded at addr, like objdump prints them
+    def iter_instrs(self, data, addr, symbolize):
+        pos = 0
+        end = len(data) & ~1
+        while pos < end:
+            x = data[pos] | (data[pos + 1] << 8)
+            if x & 0x3 == 0x3:
+                if pos + 4 > end:
+                    break
+                x |= (data[pos + 2] << 16) | (data[pos + 3] << 24)
+                length = 4
+                hex_digits = f'{x:08x}'
+            else:
+                length = 2
+                hex_digits = f'{x:04x}'
+            mnemonic, operands = self.disassemble(x, length, addr + pos, symbolize)
+            yield (addr + pos, hex_digits, f'{mnemonic}\t{operands}' if operands else mnemonic)
+            pos += length
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+from collections.abc import Mapping
+import numpy as np
+from elftools.elf.enums import ENUM_ST_INFO_TYPE, ENUM_ST_INFO_BIND
+
+STT_FUNC = ENUM_ST_INFO_TYPE['STT_FUNC']
+STT_SECTION = ENUM_ST_INFO_TYPE['STT_SECTION']
+STT_FILE = ENUM_ST_INFO_TYPE['STT_FILE']
+STB_GLOBAL = ENUM_ST_INFO_BIND['STB_GLOBAL']
+STB_WEAK = ENUM_ST_INFO_BIND['STB_WEAK']
+
+# Value to name maps, pyelftools leaves values without a name as ints
+type_names = {v: k for k, v in ENUM_ST_INFO_TYPE.items() if isinstance(v, int)}
+bind_names = {v: k for k, v in ENUM_ST_INFO_BIND.items() if isinstance(v, int)}
+# SHN_UNDEF, SHN_ABS and SHN_COMMON
+special_shndx = (0, 0xfff1, 0xfff2)
+
+def sym_dtype(elfclass, little_endian):
+    e = '<' if little_endian else '>'
+    if elfclass == 64:
+        fields = [('st_name', 'u4'), ('st_info', 'u1'), ('st_other', 'u1'), ('st_shndx', 'u2'),
+                  ('st_value', 'u8'), ('st_size', 'u8')]
+    else:
+        fields = [('st_name', 'u4'), ('st_value', 'u4'), ('st_size', 'u4'), ('st_info', 'u1'),
+                  ('st_other', 'u1'), ('st_shndx', 'u2')]
+    return np.dtype([(name, e + t) for name, t in fields])
+
+# Symbols of all symbol table sections (.symtab, .dynsym) of an elf_image, decoded as NumPy arrays
+# straight from the mapped section contents. Like read_symbol_table always did, symbols without a
+# name or with value 0 are dropped. Row i has name bytes at name_offsets[i] of strtabs[strtab_ids[i]],
+# values, sizes, types, binds and shndx; section(i) is its section name or None.
+# As a Mapping it is {symbol_name: [{'addr', 'size', 'type', 'bind', 'section'}, ...]}, the name
+# index behind it is only built on first use.
+class symbol_table(Mapping):
+    def __init__(self, image):
+        elf = image.elf
+        dtype = sym_dtype(elf.elfclass, elf.little_endian)
+        section_names = [section.name for section in elf.iter_sections()]
+        self.strtabs = []
+        parts = []
+        for section in elf.iter_sections():
+            if section['sh_type'] not in ['SHT_SYMTAB', 'SHT_DYNSYM']:
+                continue
+            data = image.section_view(section)
+            syms = np.frombuffer(data, dtype=dtype, count=len(data) // dtype.itemsize)
+            strtab = image.section_view(elf.get_section(section['sh_link']))
+            strtab_bytes = np.frombuffer(strtab, dtype=np.uint8)
+            names = syms['st_name']
+            keep = (names < len(strtab)) & (syms['st_value'] != 0)
+            keep[keep] = strtab_bytes[names[keep]] != 0
+            parts.append((syms[keep], len(self.strtabs)))
+            self.strtabs.append(strtab)
+        syms = np.concatenate([part for part, _ in parts]) if parts else np.zeros(0, dtype=dtype)
+        self.name_offsets = syms['st_name'].astype(np.uint32)
+        self.strtab_ids = np.concatenate([np.full(len(part), idx, dtype=np.uint8) for part, idx in parts]) if parts else np.zeros(0, dtype=np.uint8)
+        self.values = syms['st_value'].astype(np.uint64)
+        self.sizes = syms['st_size'].astype(np.uint64)
+        self.types = (syms['st_info'] & 0xf).astype(np.uint8)
+        self.binds = (syms['st_info'] >> 4).astype(np.uint8)
+        self.shndx = syms['st_shndx'].astype(np.uint16)
+        self.section_names = section_names
+        self.strtab_bytes = [None] * len(self.strtabs)
+        self.index = None
+
+    def __len__(self):
+        return len(self.__name_index())
+
+    def __iter__(self):
+        return iter(self.__name_index())
+
+    def __contains__(self, name):
+        return name in self.__name_index()
+
+    def __getitem__(self, name):
+        return [self.entry(row) for row in self.__name_index()[name]]
+
+    def name(self, row):
+        strtab = self.__strtab_bytes(int(self.strtab_ids[row]))
+        start = int(self.name_offsets[row])
+        # A name not terminated before the end of a corrupt strtab ends with it
+        end = strtab.find(b'\0', start)
+        return strtab[start:end if end != -1 else len(strtab)].decode(errors='replace')
+
+    # Return strtab strtab_id as bytes, copied once from the mapped section
+    def __strtab_bytes(self, strtab_id):
+        if self.strtab_bytes[strtab_id] is None:
+            self.strtab_bytes[strtab_id] = bytes(self.strtabs[strtab_id])
+        return self.strtab_bytes[strtab_id]
+
+    def section(self, row):
+        shndx = int(self.shndx[row])
+        if shndx in special_shndx or shndx >= len(self.section_names):
+            return None
+        return self.section_names[shndx]
+
+    # Return a boolean array of the rows whose name starts with prefix (bytes)
+    def name_startswith(self, prefix):
+        res = np.ones(len(self.values), dtype=bool)
+        for strtab_id, strtab in enumerate(self.strtabs):
+            rows = self.strtab_ids == strtab_id
+            strtab_bytes = np.frombuffer(strtab, dtype=np.uint8)
+            offsets = self.name_offsets[rows].astype(np.int64)
+            match = np.ones(len(offsets), dtype=bool)
+            for i, c in enumerate(prefix):
+                pos = np.minimum(offsets + i, len(strtab_bytes) - 1)
+                match &= strtab_bytes[pos] == c
+            res[rows] = match
+        return res
+
+    # Return a boolean array of the rows in section `name`
+    def in_section(self, name):
+        indexes = [idx for idx, section_name in enumerate(self.section_names) if section_name == name and idx not in special_shndx]
+        return np.isin(self.shndx, indexes)
+
+    def entry(self, row):
+        return {
+            'addr': int(self.values[row]),
+            'size': int(self.sizes[row]),
+            'type': type_names.get(int(self.types[row]), int(self.types[row])),
+            'bind': bind_names.get(int(self.binds[row]), int(self.binds[row])),
+            'section': self.section(row),
+        }
+
+    # {name: [row, ...]} in symbol table order
+    def __name_index(self):
+        if self.index is None:
+            self.index = dict()
+            for strtab_id, strtab in enumerate(self.strtabs):
+                rows = np.flatnonzero(self.strtab_ids == strtab_id)
+                if len(rows) == 0:
+                    continue
+                # Names end at the first NUL at or after their offset
+                nuls = np.append(np.flatnonzero(np.frombuffer(strtab, dtype=np.uint8) == 0), len(strtab))
+                starts = self.name_offsets[rows]
+                ends = nuls[np.searchsorted(nuls, starts)]
+                raw = self.__strtab_bytes(strtab_id)
+                for row, start, end in zip(rows.tolist(), starts.tolist(), ends.tolist()):
+                    self.index.setdefault(raw[start:end].decode(errors='replace'), []).append(row)
+        return self.index
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 
 from arch.arch import arch_tools, insn_db_path
-from elftools.elf.elffile import ELFFile
+from arch.cache import cache_dir_path
+from arch.insn import cf_kind, MASK64
+from arch.elf_image import elf_image
+import dbm
 import subprocess
 import tempfile
 import os
@@ -288,6 +291,15 @@ def translate_isa_type(extension, isa_set):
     else:
         return next_key
 
+x86_prefixes = {'bnd', 'notrack', 'lock', 'rep', 'repz', 'repe', 'repnz', 'repne', 'xacquire', 'xrelease',
+                'cs', 'ds', 'es', 'fs', 'gs', 'ss', 'data16', 'data32', 'addr16', 'addr32'}
+x86_returns = {'ret', 'retq', 'retl', 'retw'}
+# Legacy prefix bytes, REX (0x40-0x4f) is checked separately
+x86_prefix_bytes = {0x26, 0x2e, 0x36, 0x3e, 0x64, 0x65, 0x66, 0x67, 0xf0, 0xf2, 0xf3}
+
+def is_x86_prefix(mnemonic):
+    return mnemonic in x86_prefixes or mnemonic.startswith('rex')
+
 class x86_64_tools(arch_tools):
     def __init__(self, elf_path, ldflags='-no-pie', ld='x86_64-linux-gnu-ld', objdump='x86_64-linux-gnu-objdump', xed_cmd='xed'):
         self.elf_path = elf_path
@@ -295,41 +307,113 @@ class x86_64_tools(arch_tools):
         self.xed_cmd = xed_cmd
         self.openfiles = []
         self.tmpfiles = []
-        f = open(self.elf_path, 'rb')
-        self.elf = ELFFile(f)
+        self.cache = None
+        self.symtab = None
+        self.func_index = None
+        self.dwarf_dies = None
+        image = elf_image(self.elf_path)
+        self.elf = image.elf
         if self.elf['e_type'] == 'ET_REL':
             tf = tempfile.NamedTemporaryFile(delete=False)
             self.elf_path = tf.name
             self.tmpfiles.append(tf.name)
             if os.system(f'{ld} -o {tf.name} {elf_path} {ldflags} --warn-unresolved-symbols 2>/dev/null') != 0:
                 raise Exception('Failed to compile ELF file')
-            f.close()
-            f = open(tf.name, 'rb')
-            self.elf = ELFFile(f)
-        self.openfiles.append(f)
+            image.close()
+            image = elf_image(tf.name)
+            self.elf = image.elf
+        self.image = image
+        self.openfiles.append(image)
         self.xed_result = None
     
-    def __init_xed(self):
-        self.xed_result = dict()
-        result = subprocess.run(
-            f'{self.xed_cmd} -64 -isa-set -i {self.elf_path}',
-            shell=True, capture_output=True, text=True
-        )
-        if result.returncode != 0:
-            raise Exception('Failed to disassemble ELF file')
-        xed_lines = result.stdout.splitlines()
-        for line in xed_lines:
-            if line.startswith('XDIS '):
-                cur_line = line.split(': ')
-                pc = int(cur_line[0][5:], 16)
-                instr_info = cur_line[1].strip().split()
-                iclass = instr_info[0]
-                extension = instr_info[1]
-                isa_set = instr_info[2]
-                instr_hex = instr_info[3]
-                instr = int(instr_hex, 16)
-                isa = translate_isa_type(extension, isa_set)
-                self.xed_result[instr] = isa
+    # Classify the unique encodings of textdump with xed, xed_result maps encoding bytes to their isa.
+    # Encodings are written back to back to a raw file for `xed -ir`, whose output is streamed,
+    # and the results are kept in a dbm file under the analysis cache directory shared by all
+    # binaries, so an encoding is only sent to xed once. Encodings xed cannot classify are cached as null.
+    def prepare_insn_class(self, textdump):
+        if self.xed_result is None:
+            self.xed_result = dict()
+        encodings = dict() # encoding bytes => None, in textdump order
+        for sym in textdump:
+            instrs = textdump[sym]['instr']
+            store = instrs.store
+            for row in instrs.rows():
+                code = store.encoding(row)
+                if code not in self.xed_result:
+                    encodings[code] = None
+        if not encodings:
+            return
+        db = self.__open_xed_db()
+        try:
+            missing = []
+            for code in encodings:
+                isa = db.get(code.hex()) if db is not None else None
+                if isa is None:
+                    missing.append(code)
+                else:
+                    self.xed_result[code] = json.loads(isa)
+            for code, isa in self.__classify(missing):
+                self.xed_result[code] = isa
+                if db is not None:
+                    db[code.hex()] = json.dumps(isa)
+        finally:
+            if db is not None:
+                db.close()
+
+    def __open_xed_db(self):
+        cache_dir = cache_dir_path()
+        if cache_dir is None:
+            return None
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            return dbm.open(str(cache_dir / f'xed-isa-{os.path.basename(self.xed_cmd)}'), 'c')
+        except (OSError, dbm.error):
+            # Locked by another process or not writable, classify without it
+            return None
+
+    # Yield (encoding bytes, isa) for each of codes, isa is None for the ones xed cannot classify.
+    # xed decodes the raw file sequentially and skips a byte when it fails, so after a failure it can
+    # decode misaligned. A code was decoded from its first byte when xed reports an instruction at its
+    # offset, or ending there or at offset 0 (then it failed on the code). The other codes are sent again,
+    # every run resolves at least its first code.
+    def __classify(self, codes):
+        while codes:
+            decoded = self.__run_xed(codes)
+            ends = {offset + len(hex_digits) // 2 for offset, (hex_digits, isa) in decoded.items()}
+            retry = []
+            offset = 0
+            for code in codes:
+                if offset in decoded:
+                    hex_digits, isa = decoded[offset]
+                    # Decoded to other bytes: xed does not take the instruction objdump printed
+                    yield (code, isa if hex_digits == code.hex() else None)
+                elif offset == 0 or offset in ends:
+                    yield (code, None)
+                else:
+                    retry.append(code)
+                offset += len(code)
+            codes = retry
+
+    # Return {offset: (hex digits, isa)} of the instructions xed decodes in codes written back to back
+    def __run_xed(self, codes):
+        with tempfile.NamedTemporaryFile(delete=False) as tf:
+            for code in codes:
+                tf.write(code)
+        try:
+            res = dict()
+            proc = subprocess.Popen([self.xed_cmd, '-64', '-isa-set', '-ir', tf.name],
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            for line in proc.stdout:
+                if not line.startswith('XDIS '):
+                    continue
+                cur_line = line.split(': ', 1)
+                instr_info = cur_line[1].split()
+                res[int(cur_line[0][5:], 16)] = (instr_info[3].lower(), translate_isa_type(instr_info[1], instr_info[2]))
+            if proc.wait() != 0:
+                raise Exception('Failed to disassemble ELF file')
+            return res
+        finally:
+            os.remove(tf.name)
 
     def __del__(self):
         for f in self.openfiles:
@@ -337,27 +421,78 @@ class x86_64_tools(arch_tools):
         for f in self.tmpfiles:
             os.remove(f)
 
-    def read_dwarf(self):
-        return super().read_dwarf()
+    def analysis_params(self):
+        return super().analysis_params() + (self.xed_cmd,)
 
-    def read_textdump(self):
-        return super().read_textdump('-M no-aliases --insn-width=20')
+    def read_dwarf(self, pcs=None):
+        return super().read_dwarf(pcs)
+
+    def read_textdump(self, jobs=None, symbols=None):
+        return super().read_textdump('-M no-aliases --insn-width=20', jobs, symbols)
+
+    def may_change_control_flow(self, mnemonic):
+        return (is_x86_prefix(mnemonic) or mnemonic in x86_returns or mnemonic.startswith('j')
+                or mnemonic.startswith('call') or mnemonic.startswith('loop'))
+
+    def decode_control_flow(self, mnemonic, operands):
+        # objdump prints prefixes (bnd, notrack, repz, ...) as separate words before the mnemonic
+        while is_x86_prefix(mnemonic) and operands:
+            mnemonic, _, operands = operands.partition(' ')
+            operands = operands.strip()
+        if mnemonic in x86_returns:
+            return cf_kind.RETURN
+        indirect = operands.startswith('*')
+        if mnemonic in ['jmp', 'jmpq']:
+            return cf_kind.INDIRECT_JUMP if indirect else cf_kind.JUMP
+        if mnemonic in ['call', 'callq']:
+            return cf_kind.INDIRECT_CALL if indirect else cf_kind.CALL
+        # jcc, jrcxz and loop
+        if mnemonic.startswith('j') or mnemonic.startswith('loop'):
+            return cf_kind.BRANCH
+        return cf_kind.NONE
+
+    def branch_target(self, addr, hex_code, length):
+        code = hex_code.to_bytes(length, 'big')
+        pos = 0
+        while pos < length and (code[pos] in x86_prefix_bytes or 0x40 <= code[pos] <= 0x4f):
+            # The operand size prefix would make rel32 a rel16
+            if code[pos] == 0x66:
+                return None
+            pos += 1
+        if pos >= length:
+            return None
+        opcode = code[pos]
+        if opcode in [0xeb, 0xe0, 0xe1, 0xe2, 0xe3] or 0x70 <= opcode <= 0x7f:
+            disp_len = 1
+        elif opcode in [0xe8, 0xe9]:
+            disp_len = 4
+        elif opcode == 0x0f and pos + 1 < length and 0x80 <= code[pos + 1] <= 0x8f:
+            pos += 1
+            disp_len = 4
+        else:
+            return None
+        if pos + 1 + disp_len != length:
+            return None
+        disp = int.from_bytes(code[pos + 1:], 'little', signed=True)
+        return (addr + length + disp) & MASK64
 
     def is_control_flow_instr(self, instr):
-        # instr should be (hex_code, instr, control_flow_dir) from read_textdump
+        # instr should be an insn from read_textdump
         if self.is_control_flow_end(instr):
             return True
-        if instr[2] == 'X' or instr[2] == '-':
+        if instr.control_flow_dir == 'X' or instr.control_flow_dir == '-':
             return True
         return False
 
     def is_control_flow_end(self, instr):
-        instr = instr[1].split("\t")[0].strip()
-        if '.' in instr:
-            instr = instr.split('.')[0]
-        return instr in ['ret'] # TODO: check other return instructions
+        return instr.kind == cf_kind.RETURN
 
     def get_insn_class_by_instr(self, instr):
         if self.xed_result is None:
-            self.__init_xed()
-        return self.xed_result.get(instr[0], None)
+            self.prepare_insn_class(self.read_textdump())
+        return self.xed_result.get(instr.hex_code.to_bytes(instr.length, 'big'), None)
+
+    def get_insn_classes(self, store, rows):
+        if self.xed_result is None:
+            self.prepare_insn_class(self.read_textdump())
+        return [self.xed_result.get(store.encoding(row)) for row in rows]
@@ -3,25 +3,10 @@
 import argparse
 import sys
 from arch.arch import arch_tools
-from analyze.bb_utils import basic_block_size
+from analyze.bb_utils import basic_block_size, perf_to_bb_count
 from analyze.cfg import CFG
 from analyze.perfutil import extract_perf_from_file, perf_extract_deaslr_per_file
 
-def perf_to_bb_count(perf_extract, bb_size: basic_block_size, instr_event):
-    # Count how many time a basic block is executed
-    res = dict() # event => bb_addr => count
-    for event in perf_extract:
-        res[event] = dict()
-        for pc in perf_extract[event]:
-            bb_index = bb_size.query_bb_id(pc)
-            if bb_index is None:
-                continue
-            bb_addr = bb_size.query_bb_addr(bb_index)
-            if bb_addr not in res[event]:
-                res[event][bb_addr] = 0
-            res[event][bb_addr] += perf_extract[event][pc] / (bb_size.query_bb_size(bb_index) if event == instr_event else 1)
-    return res
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Draw CFG and Dominator Tree from ELF file')
     parser.add_argument('-e', '--elf', type=str, help='ELF file')
@@ -49,7 +34,7 @@ if __name__ == "__main__":
                 continue
             try:
                 curelf = arch_tools.open_elf(file)
-                if args.symbol in curelf.read_textdump():
+                if args.symbol in curelf.read_symbol_table():
                     elf = curelf
                     cur_elf_path = file
                     perf_file = perf_extract[file]
@@ -60,11 +45,15 @@ if __name__ == "__main__":
             exit(1)
     else:
         elf = arch_tools.open_elf(args.elf)
-    textdump = elf.read_textdump()
+    # Only the requested function is disassembled and split into basic blocks
+    textdump = elf.read_textdump(symbols=[args.symbol])
+    if args.symbol not in textdump:
+        print(f"Error: Symbol {args.symbol} not found", file=sys.stderr)
+        exit(1)
     if perf_file:
         perf_file = perf_extract_deaslr_per_file(perf_file, aslr_map[cur_elf_path], textdump)
     bb, trans_edge = elf.read_basic_blocks(textdump)
-    dwarf = elf.read_dwarf()
+    dwarf = elf.read_dwarf(arch_tools.textdump_addrs(textdump))
     bb_size = basic_block_size(bb)
     bb_count = None
     bb_count_a = None
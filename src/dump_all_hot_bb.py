@@ -5,24 +5,10 @@ import sys
 import os
 import math
 from arch.arch import arch_tools
-from analyze.bb_utils import basic_block_size
-from analyze.perfutil import extract_perf_from_file_with_symbol, extract_perf_from_file, perf_extract_deaslr_per_file
+from analyze.bb_utils import basic_block_size, perf_to_bb_count
+from analyze.perfutil import extract_perf, perf_extract_deaslr_per_file
 from analyze.source_cache import source_cache
 
-def perf_to_bb_count(perf_extract, bb_size: basic_block_size):
-    res = dict() # event => bb_addr => count
-    for event in perf_extract:
-        res[event] = dict()
-        for pc in perf_extract[event]:
-            bb_index = bb_size.query_bb_id(pc)
-            if bb_index is None:
-                continue
-            bb_addr = bb_size.query_bb_addr(bb_index)
-            if bb_addr not in res[event]:
-                res[event][bb_addr] = 0
-            res[event][bb_addr] += perf_extract[event][pc]
-    return res
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Dump func_hotspot from perf data file')
     parser.add_argument('-p', '--perf', type=str, help='Perf data file')
@@ -40,7 +26,9 @@ if __name__ == "__main__":
         exit(1)
     if not os.path.exists(args.output):
         os.makedirs(args.output)
-    perf_extract_symbol = extract_perf_from_file_with_symbol(args.perf)
+    # One pass over the samples for the symbol and pc counts and the ASLR map
+    perf = extract_perf(args.perf)
+    perf_extract_symbol = perf['symbol']
     func_hotspots_mainevent = [] # (file, symbol, count)
     event_count = dict()
     events = set()
@@ -55,36 +43,33 @@ if __name__ == "__main__":
                     event_count[event] = 0
                 event_count[event] += perf_extract_symbol[file][event][symbol]
     func_hotspots_mainevent.sort(key=lambda x: x[2], reverse=True)
+    hot_symbols = dict() # file => [symbol, ...], only these are disassembled
+    for file, symbol, count in func_hotspots_mainevent:
+        if count / event_count[args.event] >= args.threshold:
+            hot_symbols.setdefault(file, []).append(symbol)
     # func hotspots
-    aslr_map = dict()
-    perf_extract = extract_perf_from_file(args.perf, aslr_map)
+    aslr_map = perf['aslr_map']
+    perf_extract = perf['pc']
     elf_files = dict()
     bbs = dict()
     trans_edges = dict()
     dwarfs = dict() # source_file => dwarf
     bb_sizes = dict()
     bb_count = dict()
-    dwarf_indecies = dict()
     for file in perf_extract:
+        if file not in hot_symbols:
+            continue
         # elf
         try:
             curelf = arch_tools.open_elf(file)
             elf_files[file] = curelf
-            textdump = curelf.read_textdump()
+            textdump = curelf.read_textdump(symbols=hot_symbols[file])
             perf_extract[file] = perf_extract_deaslr_per_file(perf_extract[file], aslr_map.get(file, dict()), textdump)
             bbs[file], trans_edges[file] = curelf.read_basic_blocks(textdump)
-            dwarfs[file] = curelf.read_dwarf()
+            # Only the CUs of the hot symbols (all their copies) are decoded
+            dwarfs[file] = curelf.read_dwarf(arch_tools.textdump_addrs(textdump))
             bb_sizes[file] = basic_block_size(bbs[file])
             bb_count[file] = perf_to_bb_count(perf_extract[file], bb_sizes[file])
-            # build dwarf index
-            dwarf_indecies[file] = dict()
-            for source_file in dwarfs[file]:
-                for entry in dwarfs[file][source_file]:
-                    pc = entry['pc']
-                    if pc not in dwarf_indecies[file]:
-                        dwarf_indecies[file][pc] = []
-                    entry['filename'] = source_file
-                    dwarf_indecies[file][pc].append(entry)
         except:
             print(f"Warning: Unable to process {file}", file=sys.stderr)
             elf_files[file] = None
@@ -92,7 +77,8 @@ if __name__ == "__main__":
             trans_edges[file] = None
             dwarfs[file] = None
             bb_sizes[file] = None
-    src_cache = source_cache()
+    # Select the hot basic blocks first, so the inline stacks of their instructions are queried at once per ELF
+    hot_bbs = [] # (file, symbol, function event count, bb_addr)
     func_coverage = 0
     nr_func = 0
     for func_hotspot in func_hotspots_mainevent:
@@ -121,36 +107,48 @@ if __name__ == "__main__":
                 break
             if len(top_bbs) >= args.max_bb:
                 break
-        for bb_addr in top_bbs:
-            bb_size = None
-            if file in bb_sizes and bb_sizes[file] is not None:
-                bb_id = bb_sizes[file].query_bb_id(bb_addr)
-                if bb_id is not None:
-                    bb_size = bb_sizes[file].query_bb_size(bb_id)
-            bb_freq = f"2**{math.log2(bb_count[file][args.event][bb_addr] / bb_size):.2f}" if bb_size is not None else "N/A"
-            outbuf = [
-                f"# function hotness: {cur_event_count / event_count[args.event] * 100:.2f}%",
-                f"# basic block hotness: {bb_count[file][args.event][bb_addr] / cur_event_count * 100:.2f}%",
-                f"# basic block frequency: {bb_freq}",
-            ]
-            # cal dwarf
-            instr_addrs = bbs[file][symbol]['bb'][bb_addr]
-            for instr_addr in instr_addrs:
-                if instr_addr in dwarf_indecies[file]:
-                    for entry in dwarf_indecies[file][instr_addr]:
-                        filename, line, col = entry['filename'], entry['line'], entry['col']
-                        flags = []
-                        for key in entry:
-                            if key not in ['filename', 'line', 'col', 'pc']:
-                                if entry[key]:
-                                    flags += [key]
-                        outbuf.append(f"# {filename.split('/')[-1]}:{line}:{col}:{' '.join(flags)}")
-                        outbuf.append(f"# {src_cache.get_source(filename, line).strip()}")
-                outbuf.append(f"{instr_addrs[instr_addr][1]}")
-            with open(f"{args.output}/{symbol}_{hex(bb_addr)}.s", 'w') as f:
-                f.write("\n".join(outbuf))
+        hot_bbs.extend((file, symbol, cur_event_count, bb_addr) for bb_addr in top_bbs)
         nr_func += 1
         if nr_func >= args.max_func:
             break
         if func_coverage >= args.coverage:
             break
+    inline_stacks = dict() # file => {instr_addr: inline stack}
+    for file in dict.fromkeys(file for file, _, _, _ in hot_bbs):
+        instr_addrs = [instr_addr for each_file, symbol, _, bb_addr in hot_bbs if each_file == file
+                       for instr_addr in bbs[file][symbol]['bb'][bb_addr]]
+        inline_stacks[file] = dict(zip(instr_addrs, elf_files[file].inline_stack(instr_addrs)))
+    src_cache = source_cache()
+    for file, symbol, cur_event_count, bb_addr in hot_bbs:
+        bb_size = None
+        if file in bb_sizes and bb_sizes[file] is not None:
+            bb_id = bb_sizes[file].query_bb_id(bb_addr)
+            if bb_id is not None:
+                bb_size = bb_sizes[file].query_bb_size(bb_id)
+        bb_freq = f"2**{math.log2(bb_count[file][args.event][bb_addr] / bb_size):.2f}" if bb_size is not None else "N/A"
+        outbuf = [
+            f"# function hotness: {cur_event_count / event_count[args.event] * 100:.2f}%",
+            f"# basic block hotness: {bb_count[file][args.event][bb_addr] / cur_event_count * 100:.2f}%",
+            f"# basic block frequency: {bb_freq}",
+        ]
+        # cal dwarf
+        instr_addrs = bbs[file][symbol]['bb'][bb_addr]
+        prev_inline = []
+        for instr_addr in instr_addrs:
+            inline_stack = inline_stacks[file][instr_addr]
+            if inline_stack != prev_inline:
+                chain = [f"{each['name']} ({(each['call_file'] or '??').split('/')[-1]}:{each['call_line']})" for each in inline_stack]
+                outbuf.append(f"# inlined: {' > '.join(chain) if chain else '-'}")
+                prev_inline = inline_stack
+            for entry in dwarfs[file].entries_at(instr_addr):
+                filename, line, col = entry['filename'], entry['line'], entry['col']
+                flags = []
+                for key in entry:
+                    if key not in ['filename', 'line', 'col', 'pc']:
+                        if entry[key]:
+                            flags += [key]
+                outbuf.append(f"# {filename.split('/')[-1]}:{line}:{col}:{' '.join(flags)}")
+                outbuf.append(f"# {src_cache.get_source(filename, line).strip()}")
+            outbuf.append(f"{instr_addrs[instr_addr][1]}")
+        with open(f"{args.output}/{symbol}_{hex(bb_addr)}.s", 'w') as f:
+            f.write("\n".join(outbuf))
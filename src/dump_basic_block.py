@@ -14,7 +14,6 @@ if __name__ == "__main__":
     parser.add_argument('-m', '--mca', action='store_true')
     args = parser.parse_args()
     elf = None
-    elf_textdump = None
     if args.elf is None:
         # Try to find PC from perf data
         if args.perf is None:
@@ -26,11 +25,9 @@ if __name__ == "__main__":
                 continue
             try:
                 curelf = arch_tools.open_elf(file)
-                elf_textdump = curelf.read_textdump()
-                for symbol in elf_textdump:
-                    if args.location in elf_textdump[symbol]['instr']:
-                        elf = curelf
-                        break
+                if curelf.function_index().lookup([args.location])[0] >= 0:
+                    elf = curelf
+                    break
             except:
                 print(f"Warning: Unable to process {file}", file=sys.stderr)
         if elf is None:
@@ -38,19 +35,21 @@ if __name__ == "__main__":
             exit(1)
     else:
         elf = arch_tools.open_elf(args.elf)
-    textdump = elf.read_textdump()
+    # Only the function containing the location is disassembled, or everything when no sized symbol covers it
+    symbol = elf.function_index().lookup_labels([args.location])[0]
+    textdump = elf.read_textdump(symbols=[symbol] if symbol is not None else None)
     bb, trans_edge = elf.read_basic_blocks(textdump)
     dumped = False
-    for symbol in bb:
-        for bbstart in bb[symbol]['bb']:
-            cur_bb = bb[symbol]['bb'][bbstart]
-            if args.location in cur_bb:
-                assert not dumped, "Basic block found multiple times"
-                for addr, instr_tuple in cur_bb.items():
-                    if args.mca:
-                        buf = instr_tuple[1].strip()
-                        print(buf)
-                    else:
-                        print(f"  {str(hex(addr))[2:]}:\t{instr_tuple[0]:08x} \t{instr_tuple[1].strip()}")
-                dumped = True
-    assert dumped, "Basic block not found"
\ No newline at end of file
+    label = elf.basic_block_index(bb).lookup_labels([args.location])[0]
+    if label is not None:
+        symbol, bbstart = label
+        cur_bb = bb[symbol]['bb'][bbstart]
+        if args.location in cur_bb:
+            for addr, instr_tuple in cur_bb.items():
+                if args.mca:
+                    buf = instr_tuple[1].strip()
+                    print(buf)
+                else:
+                    print(f"  {str(hex(addr))[2:]}:\t{instr_tuple[0]:08x} \t{instr_tuple[1].strip()}")
+            dumped = True
+    assert dumped, "Basic block not found"
@@ -0,0 +1,5 @@
+import pathlib
+import sys
+
+# The modules under src/ import each other as top-level packages (arch, analyze)
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / 'src'))
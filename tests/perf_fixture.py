@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+# Writer of the perf.data fixture of test_perf_data.py and of the perf script output expected for it.
+# There is no perf binary where the fixture was made, so the file is synthesized record by record the
+# way perf record lays it out (PERFILE2 header, attrs with sample ids, sample_id_all trailers) and the
+# expected output is derived from the scenario below, not from perfutil. Run it to regenerate
+# data/perf.data and data/perf.data.script; with perf installed, `perf script -i data/perf.data` must
+# print the same samples (test_perf_script_matches_fixture checks it).
+
+import pathlib
+import random
+import struct
+import sys
+
+DATA_DIR = pathlib.Path(__file__).parent / 'data'
+
+PERF_MAGIC = b'PERFILE2'
+ATTR_SIZE = 128
+# PERF_SAMPLE_IDENTIFIER | IP | TID | TIME | PERIOD
+SAMPLE_TYPE = (1 << 16) | (1 << 0) | (1 << 1) | (1 << 2) | (1 << 8)
+SAMPLE_ID_ALL = 1 << 18
+MISC_KERNEL = 1
+MISC_USER = 2
+MISC_COMM_EXEC = 1 << 13
+# (type, config, sample id): PERF_TYPE_HARDWARE cycles and instructions, named by perf without HEADER_EVENT_DESC
+EVENTS = [(0, 0, 100, 'cycles'), (0, 1, 200, 'instructions')]
+
+BASE = 0x555555554000
+LIBS = 0x7f0000000000
+KERNEL = 0xffffffff81000000
+START_NS = 1_000_000_000_000
+
+# (time in us, kind, args) of the side band records, the DSOs do not exist so perf and perfutil both
+# report the runtime pc of the samples
+SIDEBAND = [
+    (0, 'comm', (42, 'prog', False)),
+    (0, 'mmap', (42, BASE, 0x100000, 0, '/opt/fixture/prog')),
+    (0, 'mmap', (-1, KERNEL, 0x1000000, KERNEL, '[kernel.kallsyms]_text')),
+    (500, 'fork', (43, 42)),
+    (1000, 'mmap', (42, LIBS, 0x1000, 0, '[vdso]')),
+    (2000, 'mmap', (42, LIBS + 0x10000, 0x10000, 0x2000, '/opt/fixture/libfoo.so')),
+    (3000, 'comm', (43, 'worker', True)),
+    (3001, 'mmap', (43, BASE, 0x100000, 0, '/opt/fixture/worker')),
+    (4000, 'mmap', (42, LIBS + 0x10000, 0x10000, 0, '/opt/fixture/libbar.so')),
+]
+PCS = [BASE + 0x1139, LIBS + 0x10, LIBS + 0x10100, KERNEL + 0x1234]
+
+# Return (comm, dso) perf reports for a sample of pid at time (us) on pc, following SIDEBAND by hand:
+# 43 shares the maps of 42 it forked from until its exec at 3000, 42 maps [vdso] at 1000, libfoo.so at
+# 2000 replaced by libbar.so at 4000, 43 maps the worker at 3001
+def expected_sample(pid, time, pc):
+    comm = 'worker' if pid == 43 and time >= 3000 else 'prog'
+    if pc >= KERNEL:
+        return (comm, '[kernel.kallsyms]')
+    if pc == BASE + 0x1139:
+        if pid == 43 and time >= 3000:
+            return (comm, '/opt/fixture/worker' if time >= 3001 else '[unknown]')
+        return (comm, '/opt/fixture/prog')
+    if pid == 43:
+        return (comm, '[unknown]')
+    if pc == LIBS + 0x10:
+        return (comm, '[vdso]' if time >= 1000 else '[unknown]')
+    if time < 2000:
+        return (comm, '[unknown]')
+    return (comm, '/opt/fixture/libfoo.so' if time < 4000 else '/opt/fixture/libbar.so')
+
+# Return [(time, pid, event index, pc, period), ...] in time order, 43 only runs after its fork
+def samples(count=300, seed=1):
+    rnd = random.Random(seed)
+    res = []
+    for _ in range(count):
+        pid = rnd.choice([42, 43])
+        res.append((rnd.randrange(501 if pid == 43 else 1, 5000), pid, rnd.randrange(len(EVENTS)), rnd.choice(PCS),
+                    rnd.randrange(1, 10000)))
+    return sorted(res)
+
+def cstr(text):
+    data = text.encode() + b'\0'
+    return data + b'\0' * ((-len(data)) % 8)
+
+def attr(event_type, config, sample_type, flags):
+    data = struct.pack('<IIQQQQQ', event_type, ATTR_SIZE, config, 4000, sample_type, 0, flags)
+    return data + b'\0' * (ATTR_SIZE - len(data))
+
+# Return the perf.data bytes of records [(time in us, kind, args), ...] in file order. Kinds are those of
+# SIDEBAND, 'sample' (pid, event index, pc, period) and 'compressed' (payload bytes).
+def perf_data_bytes(records):
+    recs = []
+    def record(record_type, body, time, pid, misc=0, trailer=True):
+        body += b'\0' * ((-len(body)) % 8)
+        if trailer:
+            body += struct.pack('<iiQQ', pid, pid, START_NS + time * 1000, EVENTS[0][2])
+        recs.append(struct.pack('<IHH', record_type, misc, 8 + len(body)) + body)
+    for time, kind, args in records:
+        if kind == 'comm':
+            pid, name, is_exec = args
+            record(3, struct.pack('<ii', pid, pid) + cstr(name), time, pid, MISC_COMM_EXEC if is_exec else 0)
+        elif kind == 'mmap':
+            # MMAP2 with zero maj, min, ino and ino_generation, r-x and MAP_PRIVATE
+            pid, start, length, pgoff, name = args
+            record(10, struct.pack('<iiQQQ', pid, pid, start, length, pgoff) + b'\0' * 24 + struct.pack('<II', 5, 2) +
+                   cstr(name), time, pid, MISC_KERNEL if pid == -1 else MISC_USER)
+        elif kind == 'fork':
+            pid, ppid = args
+            record(7, struct.pack('<iiiiQ', pid, ppid, pid, ppid, START_NS + time * 1000), time, pid)
+        elif kind == 'sample':
+            pid, event, pc, period = args
+            record(9, struct.pack('<QQiiQQ', EVENTS[event][2], pc, pid, pid, START_NS + time * 1000, period), time,
+                   pid, MISC_KERNEL if pc >= KERNEL else MISC_USER, trailer=False)
+        elif kind == 'compressed':
+            record(81, args, time, 0, trailer=False)
+    data = b''.join(recs)
+    header_size = 104
+    attr_file_size = ATTR_SIZE + 16
+    attrs_offset = header_size
+    ids_offset = attrs_offset + attr_file_size * len(EVENTS)
+    attrs = b''
+    ids = b''
+    for event_type, config, sample_id, _ in EVENTS:
+        attrs += attr(event_type, config, SAMPLE_TYPE, SAMPLE_ID_ALL) + struct.pack('<QQ', ids_offset + len(ids), 8)
+        ids += struct.pack('<Q', sample_id)
+    data_offset = ids_offset + len(ids)
+    header = PERF_MAGIC + struct.pack('<QQQQQQQQ', header_size, attr_file_size, attrs_offset, len(attrs), data_offset,
+                                      len(data), 0, 0) + bytes(32)
+    return header + attrs + ids + data
+
+# Return the fixture records: SIDEBAND and the samples by time, except the first samples which are
+# written last like samples flushed late from another CPU buffer
+def fixture_records():
+    sample_records = [(time, 'sample', (pid, event, pc, period)) for time, pid, event, pc, period in samples()]
+    records = sorted(SIDEBAND + sample_records, key=lambda record: (record[0], record[1] == 'sample'))
+    late = sample_records[:10]
+    return [record for record in records if record not in late] + late
+
+# Return the lines perf script prints for the fixture (default fields: comm, tid, time, period, event, ip,
+# sym, dso)
+def perf_script_lines():
+    lines = []
+    for time, pid, event, pc, period in samples():
+        comm, dso = expected_sample(pid, time, pc)
+        ns = START_NS + time * 1000
+        lines.append(f'{comm:>16} {pid:>6} {ns // 10**9:>5}.{ns % 10**9 // 1000:06d}: {period:>10} '
+                     f'{EVENTS[event][3]}: {pc:>16x} [unknown] ({dso})\n')
+    return lines
+
+def main(out_dir=DATA_DIR):
+    out_dir = pathlib.Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / 'perf.data').write_bytes(perf_data_bytes(fixture_records()))
+    with open(out_dir / 'perf.data.script', 'w') as f:
+        f.writelines(perf_script_lines())
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
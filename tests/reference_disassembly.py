@@ -0,0 +1,65 @@
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from arch.elf_image import elf_image
+
+# Snippets are assembled with llvm-mc and compared with the GNU objdump of the target when it is installed,
+# otherwise with llvm-objdump. GNU and LLVM print operands differently (hex or decimal immediates, spaces,
+# register case), so operands are compared as tokens with numbers parsed.
+
+# Return the ELF object of snippet assembled for triple
+def assemble(tmp_path, triple, mattr, snippet):
+    if shutil.which('llvm-mc') is None:
+        pytest.skip('llvm-mc is not installed')
+    source = tmp_path / 'snippet.s'
+    source.write_text(snippet)
+    obj = tmp_path / 'snippet.o'
+    subprocess.run(['llvm-mc', f'-triple={triple}', f'-mattr={mattr}', '-filetype=obj', '-o', str(obj), str(source)],
+                   check=True)
+    return obj
+
+# Return {addr: (mnemonic, operands)} printed by objdump for obj, and whether it is LLVM's
+def reference_disassembly(obj, gnu_objdump, gnu_opts, mattr):
+    if shutil.which(gnu_objdump):
+        cmd, llvm = [gnu_objdump, '-d', *gnu_opts, str(obj)], False
+    elif shutil.which('llvm-objdump'):
+        cmd, llvm = ['llvm-objdump', '-d', '-M', 'no-aliases', f'--mattr={mattr}', str(obj)], True
+    else:
+        pytest.skip(f'neither {gnu_objdump} nor llvm-objdump is installed')
+    res = dict()
+    for line in subprocess.run(cmd, capture_output=True, text=True, check=True).stdout.splitlines():
+        match = re.match(r'\s*([0-9a-f]+):\s+(?:[0-9a-f]{2,8} ?)+\s*\t(\S+)\s*(.*)$', line)
+        if match:
+            res[int(match.group(1), 16)] = (match.group(2), match.group(3))
+    return res, llvm
+
+# Return the operands as a list of lowercase tokens, numbers as numbers. Branch targets, printed as
+# "addr <symbol>", are hex with or without 0x.
+def operand_tokens(operands):
+    operands = re.sub(r'(?:0x)?([0-9a-f]+) <[^>]*>', lambda match: str(int(match.group(1), 16)), operands)
+    operands = re.sub(r'\s*(//|#\s|;).*$', '', operands)
+    res = []
+    for token in re.split(r'[\s,()\[\]{}!#]+', operands.lower()):
+        if not token:
+            continue
+        try:
+            res.append(int(token, 0))
+        except ValueError:
+            try:
+                res.append(float(token))
+            except ValueError:
+                res.append(token)
+    return res
+
+# Return {addr: (mnemonic, operands)} decoded by decoder from the .text of obj
+def decode(decoder, obj):
+    image = elf_image(str(obj))
+    try:
+        text = image.section_data('.text')
+        return {addr: tuple((instr.split('\t', 1) + [''])[:2])
+                for addr, _, instr in decoder.iter_instrs(text, 0, lambda target: f'{target:x} <f>')}
+    finally:
+        image.close()
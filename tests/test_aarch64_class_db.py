@@ -0,0 +1,91 @@
+import json
+import random
+
+import pytest
+
+import arch.aarch64
+from arch.aarch64 import aarch64_class_db
+from arch.arch import insn_db_path
+from arch.insn import instr_store
+
+# Return a random aarch64-class.json-like database. Masks of a mnemonic share a few fixed bits
+# (so that lookups are bucketed) and some entries are refinements of earlier ones (so that the
+# database order decides between them)
+def random_db(rnd, nr_mnemonics=20):
+    db = dict()
+    for idx in range(nr_mnemonics):
+        shared = rnd.getrandbits(32) & rnd.getrandbits(32)
+        entries = dict()
+        for _ in range(rnd.randrange(1, 12)):
+            mask = shared | (rnd.getrandbits(32) & rnd.getrandbits(32))
+            if entries and rnd.random() < 0.3:
+                op, mask = [int(field, 16) for field in rnd.choice(list(entries)).split(',')]
+                mask |= rnd.getrandbits(32) & rnd.getrandbits(32)
+                op |= rnd.getrandbits(32) & mask & ~op
+            else:
+                op = rnd.getrandbits(32) & mask
+            entries.setdefault(f'{op:x},{mask:x}', [f'class{rnd.randrange(8)}', f'grp{rnd.randrange(3)}'])
+        db[f'insn{idx}'] = entries
+    return db
+
+# Return the classes of the first entry of mnemonic matching x, scanning the database in order
+def linear_lookup(db, mnemonic, x):
+    for key, classes in db.get(mnemonic, dict()).items():
+        op, mask = [int(field, 16) for field in key.split(',')]
+        if x & mask == op:
+            return classes
+    return None
+
+# Return random (mnemonic, encoding) pairs: encodings of the entries with random free bits,
+# random encodings and unknown mnemonics
+def random_encodings(rnd, db, nr=5000):
+    mnemonics = list(db)
+    res = []
+    for _ in range(nr):
+        mnemonic = rnd.choice(mnemonics)
+        if rnd.random() < 0.7:
+            op, mask = [int(field, 16) for field in rnd.choice(list(db[mnemonic])).split(',')]
+            res.append((mnemonic, op | (rnd.getrandbits(32) & ~mask)))
+        elif rnd.random() < 0.9:
+            res.append((mnemonic, rnd.getrandbits(32)))
+        else:
+            res.append(('unknown', rnd.getrandbits(32)))
+    # Repeated encodings are served by the memo
+    return res + rnd.sample(res, nr // 5)
+
+def check_db(rnd, db):
+    class_db = aarch64_class_db(db)
+    encodings = random_encodings(rnd, db)
+    expected = [linear_lookup(db, mnemonic, x) for mnemonic, x in encodings]
+    assert any(classes is None for classes in expected) and any(classes is not None for classes in expected)
+    assert [class_db.lookup(mnemonic, x) for mnemonic, x in encodings] == expected
+    store = instr_store()
+    for addr, (mnemonic, x) in enumerate(encodings):
+        store.append(addr * 4, f'{x:08x}', f'{mnemonic}\tx0', None)
+    rows = list(range(len(store)))
+    rnd.shuffle(rows)
+    assert aarch64_class_db(db).lookup_rows(store, rows) == [expected[row] for row in rows]
+    assert class_db.lookup_rows(store, rows) == [expected[row] for row in rows]
+
+def test_lookup_matches_linear_scan():
+    rnd = random.Random(0)
+    for _ in range(5):
+        check_db(rnd, random_db(rnd))
+
+def test_lookup_with_a_bounded_memo(monkeypatch):
+    monkeypatch.setattr(arch.aarch64, 'CLASS_MEMO_ENTRIES', 64)
+    rnd = random.Random(1)
+    db = random_db(rnd)
+    check_db(rnd, db)
+    class_db = aarch64_class_db(db)
+    for mnemonic, x in random_encodings(rnd, db):
+        class_db.lookup(mnemonic, x)
+        assert len(class_db.memo) <= 64
+
+def test_lookup_matches_linear_scan_of_the_insn_db():
+    path = insn_db_path()
+    if path is None or not (path / 'aarch64-class.json').exists():
+        pytest.skip('aarch64-class.json of insn-db is not available (INSN_DB or ext/insn-db/out)')
+    with open(path / 'aarch64-class.json') as f:
+        db = json.load(f)
+    check_db(random.Random(2), db)
@@ -0,0 +1,102 @@
+import re
+
+from arch.aarch64_decoder import aarch64_decoder
+from reference_disassembly import assemble, reference_disassembly, operand_tokens, decode
+
+AARCH64_MATTR = '+v8.2a,+lse,+neon'
+AARCH64_SNIPPET = '''
+f:
+    add x0, x1, #16
+    sub w2, w3, w4, lsl #2
+    adds x0, x1, x2
+    and x0, x1, #0xff
+    orr w0, w1, w2
+    madd x0, x1, x2, x3
+    sdiv w0, w1, w2
+    csel x0, x1, x2, eq
+    movk x0, #0xbeef
+    adrp x0, f
+    ldr x0, [x1, #8]
+    ldr w2, [x3], #4
+    str x0, [sp, #-16]!
+    ldp x29, x30, [sp], #16
+    stp x29, x30, [sp, #-32]!
+    ldrb w0, [x1, x2]
+    ldr x0, [x1, x2, lsl #3]
+    ldur x0, [x1, #-8]
+    ldxr x0, [x1]
+    ldxp x0, x1, [x2]
+    ldaxp w0, w1, [sp]
+    stxp w3, x0, x1, [x2]
+    stlxp w3, w0, w1, [x2]
+    stllr x0, [x1]
+    stllrb w0, [x1]
+    ldlar w0, [x1]
+    ldlarh w0, [sp]
+    ldtr x0, [x1, #8]
+    ldtr w0, [x1, #-4]
+    sttr x0, [sp]
+    ldtrb w0, [x1, #1]
+    sttrh w0, [x1, #2]
+    ldtrsb x0, [x1]
+    ldtrsh w0, [x1, #-256]
+    ldtrsw x0, [x1, #255]
+    ld1 {v0.b}[15], [x0]
+    ld1 {v1.h}[3], [x1], #2
+    st1 {v2.s}[1], [x2], x3
+    st1 {v3.d}[1], [sp]
+    ld2 {v4.s, v5.s}[2], [x0]
+    st2 {v31.d, v0.d}[0], [x1], #16
+    ld3 {v6.h, v7.h, v8.h}[7], [x2], #6
+    st3 {v9.b, v10.b, v11.b}[0], [x3], x4
+    ld4 {v12.s, v13.s, v14.s, v15.s}[3], [x5]
+    st4 {v30.b, v31.b, v0.b, v1.b}[9], [x6], #4
+    ld1r {v0.4s}, [x0]
+    ld1r {v1.1d}, [x1], #8
+    ld2r {v2.8h, v3.8h}, [x2], x3
+    ld3r {v4.16b, v5.16b, v6.16b}, [x4], #3
+    ld4r {v28.2d, v29.2d, v30.2d, v31.2d}, [sp], #32
+    ldadd w0, w1, [x2]
+    fadd d0, d1, d2
+    fmov s0, #1.0
+    add v0.4s, v1.4s, v2.4s
+    b f
+    bl f
+    b.ne f
+    cbz x0, f
+    tbnz w1, #3, f
+    br x16
+    blr x1
+    ret
+    hint #34
+    dmb ish
+    mrs x0, tpidr_el0
+    svc #0
+'''
+# Besides all zeros and ones: ld1 of an h lane with size<0> set, of an s lane with size<1> set, ld1r with S set,
+# st1 with the replicate opcode
+AARCH64_RESERVED = [0x00000000, 0xffffffff, 0x0d404400, 0x0d408800, 0x0d40d000, 0x0d00c000]
+
+# Return the list of more than two registers of match as a range, like GNU objdump prints ascending ones
+def register_range(match):
+    first, suffix, last = match.groups()
+    if int(last[1:]) < int(first[1:]):
+        return match.group(0)
+    return f'{{{first}{suffix}-{last}{suffix}}}'
+
+def test_aarch64_decoder_matches_objdump(tmp_path):
+    obj = assemble(tmp_path, 'aarch64', AARCH64_MATTR, AARCH64_SNIPPET)
+    reference, llvm = reference_disassembly(obj, 'aarch64-linux-gnu-objdump', ['-M', 'no-aliases'], AARCH64_MATTR)
+    decoded = decode(aarch64_decoder(), obj)
+    assert decoded.keys() == reference.keys()
+    for addr, (mnemonic, operands) in reference.items():
+        if llvm:
+            # LLVM spells out the default ret register, zero offsets and register offset shifts, and every register of a list
+            operands = re.sub(r'^x30$', '', operands) if mnemonic == 'ret' else re.sub(r', (?:lsl )?#0\]', ']', operands)
+            operands = re.sub(r'\{ (v\d+)(\.\w+), (?:v\d+\2, )+(v\d+)\2 \}', register_range, operands)
+        assert (decoded[addr][0], operand_tokens(decoded[addr][1])) == (mnemonic, operand_tokens(operands)), hex(addr)
+
+def test_aarch64_undefined_encodings_are_not_instructions():
+    decoder = aarch64_decoder()
+    for x in AARCH64_RESERVED:
+        assert decoder.disassemble(x, 0, hex)[0] == '.inst'
@@ -0,0 +1,127 @@
+import random
+from bisect import bisect_right
+
+import numpy as np
+import pytest
+
+from analyze.bb_utils import basic_block_size, perf_to_bb_count
+
+# Return a read_basic_blocks-like {symbol: {'bb': {bb_addr: [instruction addresses]}}}, blocks of 1 to 8
+# instructions of 1 to 7 bytes, some of them with gaps between them
+def random_bb(rnd, nr_symbols=5, nr_bbs=20):
+    bb = dict()
+    addr = 0x1000
+    for symbol in range(nr_symbols):
+        blocks = dict()
+        for _ in range(nr_bbs):
+            bb_addr = addr
+            instrs = []
+            for _ in range(rnd.randrange(1, 9)):
+                instrs.append(addr)
+                addr += rnd.randrange(1, 8)
+            blocks[bb_addr] = instrs
+            if rnd.random() < 0.3:
+                addr += rnd.randrange(1, 32)
+        bb[f'f{symbol}'] = {'bb': blocks}
+        addr += 0x100
+    return bb
+
+# Return the (bb_addr, size, last instruction) of the block containing pc, or None, one pc at a time
+def brute_lookup(bb, pc):
+    blocks = sorted((bb_addr, len(instrs), max(instrs)) for symbol in bb for bb_addr, instrs in bb[symbol]['bb'].items())
+    idx = bisect_right([bb_addr for bb_addr, size, last in blocks], pc) - 1
+    if idx < 0 or pc > blocks[idx][2]:
+        return None
+    return blocks[idx]
+
+# The per-sample loop perf_to_bb_count replaced, with integer sums where it divided counts by 1
+def brute_perf_to_bb_count(perf_extract, bb, instr_event):
+    res = dict()
+    for event in perf_extract:
+        res[event] = dict()
+        for pc, count in perf_extract[event].items():
+            block = brute_lookup(bb, pc)
+            if block is None:
+                continue
+            bb_addr, size, last = block
+            res[event][bb_addr] = res[event].get(bb_addr, 0) + (count / size if event == instr_event else count)
+    return res
+
+# Return pcs around all the blocks of bb: starts, last instructions, one past them, and random pcs
+def probe_pcs(rnd, bb):
+    pcs = []
+    for symbol in bb:
+        for bb_addr, instrs in bb[symbol]['bb'].items():
+            pcs.extend([bb_addr - 1, bb_addr, max(instrs), max(instrs) + 1])
+    lo = min(pcs)
+    hi = max(pcs)
+    return pcs + [rnd.randrange(lo - 0x100, hi + 0x100) for _ in range(2000)] + [0, 2**64 - 1]
+
+def test_lookup_matches_per_pc_search():
+    rnd = random.Random(0)
+    bb = random_bb(rnd)
+    bb_size = basic_block_size(bb)
+    pcs = probe_pcs(rnd, bb)
+    ids = bb_size.lookup(pcs).tolist()
+    for pc, bb_id in zip(pcs, ids):
+        block = brute_lookup(bb, pc)
+        if block is None:
+            assert bb_id == -1 and bb_size.query_bb_id(pc) is None
+        else:
+            assert bb_size.query_bb_id(pc) == bb_id
+            assert (bb_size.query_bb_addr(bb_id), bb_size.query_bb_size(bb_id), int(bb_size.last_instrs[bb_id])) == block
+
+def test_aggregate_matches_per_sample_sums():
+    rnd = random.Random(1)
+    bb = random_bb(rnd)
+    bb_size = basic_block_size(bb)
+    pcs = probe_pcs(rnd, bb)
+    # Counts above 2**53 are not exact in float64, their sums must still be
+    counts = [rnd.randrange(2**54, 2**55) for _ in pcs]
+    event_ids = [rnd.randrange(3) for _ in pcs]
+    expected = [[0] * len(bb_size.starts) for _ in range(3)]
+    for pc, count, event_id in zip(pcs, counts, event_ids):
+        block = brute_lookup(bb, pc)
+        if block is not None:
+            expected[event_id][bb_size.query_bb_id(pc)] += count
+    totals = bb_size.aggregate(pcs, np.array(counts, dtype=np.int64), event_ids)
+    assert totals.dtype == np.int64 and totals.tolist() == expected
+    assert bb_size.aggregate(pcs, np.array(counts, dtype=np.int64)).tolist() == [sum(column) for column in zip(*expected)]
+    assert bb_size.aggregate(pcs, counts, event_ids, nr_events=5).tolist() == expected + [[0] * len(bb_size.starts)] * 2
+
+def test_aggregate_of_float_counts():
+    rnd = random.Random(2)
+    bb = random_bb(rnd)
+    bb_size = basic_block_size(bb)
+    pcs = probe_pcs(rnd, bb)
+    weights = [rnd.random() for _ in pcs]
+    expected = [0.0] * len(bb_size.starts)
+    for pc, weight in zip(pcs, weights):
+        bb_id = bb_size.query_bb_id(pc)
+        if bb_id is not None:
+            expected[bb_id] += weight
+    assert bb_size.aggregate(pcs, weights).tolist() == pytest.approx(expected)
+
+def test_perf_to_bb_count_matches_per_sample_loop():
+    rnd = random.Random(3)
+    bb = random_bb(rnd)
+    bb_size = basic_block_size(bb)
+    pcs = probe_pcs(rnd, bb)
+    perf_extract = {event: {pc: rnd.randrange(1, 2**55) for pc in rnd.sample(pcs, 500)}
+                    for event in ['cycles', 'instructions', 'branch-misses']}
+    perf_extract['empty'] = dict()
+    res = perf_to_bb_count(perf_extract, bb_size, 'instructions')
+    expected = brute_perf_to_bb_count(perf_extract, bb, 'instructions')
+    assert list(res) == list(expected)
+    for event in expected:
+        assert set(res[event]) == set(expected[event])
+        if event == 'instructions':
+            assert res[event] == pytest.approx(expected[event])
+        else:
+            assert res[event] == expected[event]
+
+def test_empty_basic_blocks():
+    bb_size = basic_block_size(dict())
+    assert bb_size.lookup([0, 0x1000]).tolist() == [-1, -1]
+    assert bb_size.aggregate([0x1000], [1]).tolist() == []
+    assert perf_to_bb_count({'cycles': {0x1000: 1}}, bb_size) == {'cycles': dict()}
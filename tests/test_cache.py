@@ -0,0 +1,146 @@
+import shutil
+import subprocess
+
+import pytest
+
+import arch.arch
+import arch.cache
+from arch.arch import arch_tools
+from arch.cache import analysis_cache, cache_dir_path
+from arch.elf_image import elf_image
+
+PROGRAM = r'''
+static inline int step(int x) { return x & 1 ? 3 * x + 1 : x / 2; }
+
+int collatz(int x) {
+    int n = 0;
+    while (x != 1) {
+        x = step(x);
+        n++;
+    }
+    return n;
+}
+
+int main(int argc, char **argv) {
+    return collatz(argc + 26);
+}
+'''
+
+@pytest.fixture(scope='module')
+def program(tmp_path_factory):
+    if shutil.which('gcc') is None or shutil.which('x86_64-linux-gnu-objdump') is None:
+        pytest.skip('gcc and x86_64-linux-gnu-objdump are needed to build and disassemble the test program')
+    tmp_path = tmp_path_factory.mktemp('program')
+    (tmp_path / 'program.c').write_text(PROGRAM)
+    subprocess.run(['gcc', '-g', '-O1', '-o', str(tmp_path / 'program'), str(tmp_path / 'program.c')], check=True)
+    return tmp_path / 'program'
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.delenv('PYBINUTILS_NO_CACHE', raising=False)
+    monkeypatch.setenv('PYBINUTILS_CACHE_DIR', str(tmp_path / 'cache'))
+    return tmp_path / 'cache'
+
+def open_cache(path):
+    image = elf_image(str(path))
+    try:
+        return analysis_cache(str(path), image.elf)
+    finally:
+        image.close()
+
+def textdump_rows(textdump):
+    return [(symbol, textdump[symbol]['addr'], [(addr, tuple(instr)) for addr, instr in textdump[symbol]['instr'].items()])
+            for symbol in textdump]
+
+def line_rows(table):
+    return (table.filenames, table.pcs.tolist(), table.file_ids.tolist(), table.lines.tolist(), table.cols.tolist(),
+            table.flags.tolist())
+
+def test_entries_round_trip(program, cache_dir):
+    data = {'answer': [1, 2, 3]}
+    open_cache(program).store('result', data, ('params', 1))
+    assert any(cache_dir.iterdir())
+    cache = open_cache(program)
+    assert cache.load('result', ('params', 1)) == data
+    assert cache.load('result', ('params', 2)) is None
+    assert cache.load('other', ('params', 1)) is None
+
+def test_entries_of_another_version_or_elf_size_are_ignored(program, cache_dir, monkeypatch, tmp_path):
+    open_cache(program).store('result', 'data')
+    monkeypatch.setattr(arch.cache, 'CACHE_VERSION', arch.cache.CACHE_VERSION + 1)
+    assert open_cache(program).load('result') is None
+    monkeypatch.undo()
+    monkeypatch.setenv('PYBINUTILS_CACHE_DIR', str(cache_dir))
+    # Same build-id, different size: e.g. stripped in place
+    copy = tmp_path / 'copy'
+    shutil.copy(program, copy)
+    with open(copy, 'ab') as f:
+        f.write(bytes(16))
+    assert open_cache(copy).load('result') is None
+    assert open_cache(program).load('result') == 'data'
+
+def test_disabled_cache(program, monkeypatch):
+    monkeypatch.setenv('PYBINUTILS_NO_CACHE', '1')
+    assert cache_dir_path() is None
+    cache = open_cache(program)
+    cache.store('result', 'data')
+    assert cache.load('result') is None
+    assert cache.get('result', lambda: 'built') == 'built'
+
+def test_textdump_and_dwarf_round_trip(program, cache_dir, monkeypatch):
+    tools = arch_tools.open_elf(str(program))
+    textdump = tools.read_textdump()
+    lines = tools.read_dwarf()
+    assert 'collatz' in textdump and len(lines.pcs)
+    assert {entry.name.split('-')[0] for entry in cache_dir.glob('*/*.pickle')} >= {'textdump', 'dwarf'}
+    # A new instance must load both from disk without disassembling or decoding DWARF again
+    tools = arch_tools.open_elf(str(program))
+    monkeypatch.setattr(type(tools), 'iter_textdump', lambda *args, **kwargs: pytest.fail('textdump was rebuilt'))
+    cached_textdump = tools.read_textdump()
+    cached_lines = tools.read_dwarf()
+    assert textdump_rows(cached_textdump) == textdump_rows(textdump)
+    assert line_rows(cached_lines) == line_rows(lines)
+    assert dict(cached_lines) == dict(lines)
+    # Symbol subsets come from the cached full textdump
+    assert textdump_rows(tools.read_textdump(symbols=['collatz'])) == textdump_rows({'collatz': textdump['collatz']})
+
+@pytest.mark.skipif(shutil.which('xed') is None, reason='xed is needed to classify x86 instructions')
+def test_basic_blocks_round_trip(program, cache_dir, monkeypatch):
+    tools = arch_tools.open_elf(str(program))
+    bb, trans_edge = tools.read_basic_blocks(tools.read_textdump())
+    # The entry holds row ranges, not views pickling the whole instr_store of the textdump
+    [entry] = cache_dir.glob('*/basic_blocks-*.pickle')
+    assert b'instr_store' not in entry.read_bytes()
+    tools = arch_tools.open_elf(str(program))
+    monkeypatch.setattr(arch_tools, '_arch_tools__read_basic_blocks', lambda *args: pytest.fail('basic blocks were rebuilt'))
+    textdump = tools.read_textdump()
+    cached_bb, cached_trans_edge = tools.read_basic_blocks(textdump)
+    assert cached_trans_edge == trans_edge
+    assert {symbol: {addr: list(instrs) for addr, instrs in cached_bb[symbol]['bb'].items()} for symbol in cached_bb} == \
+        {symbol: {addr: list(instrs) for addr, instrs in bb[symbol]['bb'].items()} for symbol in bb}
+    # The cached blocks are views of the caller's textdump
+    symbol = 'collatz'
+    for addr, instrs in cached_bb[symbol]['bb'].items():
+        assert instrs.store is textdump[symbol]['instr'].store
+
+def test_textdump_subsets_are_bounded(program, cache_dir, monkeypatch):
+    monkeypatch.setattr(arch.arch, 'TEXTDUMP_SUBSET_ENTRIES', 2)
+    tools = arch_tools.open_elf(str(program))
+    for symbols in (['main'], ['collatz'], ['main', 'collatz']):
+        assert list(tools.read_textdump(symbols=symbols)) == [symbol for symbol in ('collatz', 'main') if symbol in symbols]
+    assert len(list(cache_dir.glob('*/textdump_subset-*.pickle'))) == 2
+    assert not any(cache_dir.glob('*/textdump-*.pickle'))
+    # The most recent subsets are still served from disk
+    tools = arch_tools.open_elf(str(program))
+    monkeypatch.setattr(type(tools), 'iter_textdump', lambda *args, **kwargs: pytest.fail('textdump was rebuilt'))
+    assert list(tools.read_textdump(symbols=['collatz', 'main'])) == ['collatz', 'main']
+
+def test_textdump_of_another_disassembler_version_is_rebuilt(program, cache_dir, monkeypatch):
+    arch_tools.open_elf(str(program)).read_textdump()
+    tools = arch_tools.open_elf(str(program))
+    monkeypatch.setattr(type(tools), 'disassembler_version', lambda self: 'GNU objdump (GNU Binutils) 0.1')
+    rebuilt = []
+    iter_textdump = type(tools).iter_textdump
+    monkeypatch.setattr(type(tools), 'iter_textdump', lambda *args, **kwargs: rebuilt.append(1) or iter_textdump(*args, **kwargs))
+    assert 'collatz' in tools.read_textdump()
+    assert rebuilt
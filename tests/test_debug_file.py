@@ -0,0 +1,105 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from arch.arch import arch_tools
+from arch.cache import elf_build_id
+from arch.dwarf import find_debug_file
+from arch.elf_image import elf_image
+
+PROGRAM = r'''
+static int square(int x) { return x * x; }
+int sum(int n) { int s = 0; for (int i = 0; i < n; i++) s += square(i); return s; }
+int main(int argc, char **argv) { return sum(argc); }
+'''
+
+@pytest.fixture(scope='module')
+def program(tmp_path_factory):
+    if shutil.which('gcc') is None or shutil.which('objcopy') is None:
+        pytest.skip('gcc and objcopy are needed to build and split the test program')
+    tmp_path = tmp_path_factory.mktemp('program')
+    (tmp_path / 'program.c').write_text(PROGRAM)
+    subprocess.run(['gcc', '-O2', '-g', '-Wl,--build-id', '-o', str(tmp_path / 'program'), str(tmp_path / 'program.c')],
+                   check=True)
+    subprocess.run(['objcopy', '--only-keep-debug', str(tmp_path / 'program'), str(tmp_path / 'program.debug')], check=True)
+    return tmp_path / 'program'
+
+# Return the stripped copy of program in directory, linked to the debug file named debuglink by .gnu_debuglink
+def stripped(program, directory, debuglink=None):
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / 'program'
+    cmd = ['objcopy', '--strip-debug']
+    if debuglink is not None:
+        # objcopy records the CRC of the debug file it is given
+        cmd.append(f'--add-gnu-debuglink={program.parent / "program.debug"}')
+        shutil.copy(program.parent / 'program.debug', directory / debuglink)
+    subprocess.run(cmd + [str(program), str(path)], check=True)
+    return path
+
+def lookup(path):
+    image = elf_image(str(path))
+    try:
+        return find_debug_file(str(path), image.elf)
+    finally:
+        image.close()
+
+def build_id(path):
+    image = elf_image(str(path))
+    try:
+        return elf_build_id(image.elf)
+    finally:
+        image.close()
+
+def line_rows(path, pcs=None):
+    table = arch_tools.open_elf(str(path)).read_dwarf(pcs)
+    return [(int(table.pcs[row]), table.filenames[table.file_ids[row]], int(table.lines[row]), int(table.cols[row]),
+             int(table.flags[row])) for row in range(len(table.pcs))]
+
+@pytest.fixture
+def debug_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('PYBINUTILS_NO_CACHE', '1')
+    monkeypatch.setenv('PYBINUTILS_DEBUG_DIRS', str(tmp_path / 'debug'))
+    return tmp_path / 'debug'
+
+def check_dwarf(program, path):
+    expected = line_rows(program)
+    assert expected
+    assert line_rows(path) == expected
+    pcs = [pc for pc, filename, line, col, flags in expected[:3]]
+    assert line_rows(path, pcs) == line_rows(program, pcs)
+
+def test_debug_file_by_build_id(program, tmp_path, debug_dir):
+    path = stripped(program, tmp_path / 'bin')
+    assert lookup(path) is None
+    assert line_rows(path) == []
+    build_id_path = debug_dir / '.build-id' / build_id(path)[:2] / (build_id(path)[2:] + '.debug')
+    build_id_path.parent.mkdir(parents=True)
+    shutil.copy(program.parent / 'program.debug', build_id_path)
+    assert lookup(path) == str(build_id_path)
+    check_dwarf(program, path)
+
+@pytest.mark.parametrize('location', ['next to the binary', '.debug subdirectory', 'debug dir'])
+def test_debug_file_by_debuglink(program, tmp_path, debug_dir, location):
+    bin_dir = tmp_path / 'bin'
+    path = stripped(program, bin_dir, 'program.debug')
+    debug_path = {'next to the binary': bin_dir / 'program.debug',
+                  '.debug subdirectory': bin_dir / '.debug' / 'program.debug',
+                  'debug dir': debug_dir / str(bin_dir.resolve()).lstrip('/') / 'program.debug'}[location]
+    if debug_path != bin_dir / 'program.debug':
+        debug_path.parent.mkdir(parents=True)
+        os.rename(bin_dir / 'program.debug', debug_path)
+    assert lookup(path) == str(debug_path)
+    check_dwarf(program, path)
+
+def test_debuglink_with_another_crc_is_ignored(program, tmp_path, debug_dir):
+    path = stripped(program, tmp_path / 'bin', 'program.debug')
+    with open(tmp_path / 'bin' / 'program.debug', 'ab') as f:
+        f.write(b'\0')
+    assert lookup(path) is None
+    # The build-id directory is searched first and has no CRC
+    build_id_path = debug_dir / '.build-id' / build_id(path)[:2] / (build_id(path)[2:] + '.debug')
+    build_id_path.parent.mkdir(parents=True)
+    shutil.copy(program.parent / 'program.debug', build_id_path)
+    assert lookup(path) == str(build_id_path)
@@ -0,0 +1,92 @@
+import shutil
+import subprocess
+
+import pytest
+
+from arch.arch import arch_tools
+
+# Three levels of always_inline functions inlined at several call sites of non-inlined functions
+PROGRAM = r'''
+volatile int sink;
+static inline __attribute__((always_inline)) int leaf(int x) { sink = x; return x * 3 + sink; }
+static inline __attribute__((always_inline)) int middle(int x) { int s = leaf(x); sink = s; return leaf(s + 1) - sink; }
+static inline __attribute__((always_inline)) int outer(int x) { int s = 0; for (int i = 0; i < x; i++) s += middle(i); return s; }
+__attribute__((noinline)) int f(int x) { return outer(x) + leaf(x); }
+__attribute__((noinline)) int g(int x) { sink = x; return middle(x) * outer(x + 1); }
+int main(int argc, char **argv) { return f(argc) + g(argc) + outer(argc); }
+'''
+
+@pytest.fixture(scope='module')
+def program(tmp_path_factory):
+    if shutil.which('gcc') is None:
+        pytest.skip('gcc is needed to build the test program')
+    tmp_path = tmp_path_factory.mktemp('program')
+    (tmp_path / 'program.c').write_text(PROGRAM)
+    subprocess.run(['gcc', '-O2', '-g', '-o', str(tmp_path / 'program'), str(tmp_path / 'program.c')], check=True)
+    return tmp_path / 'program'
+
+@pytest.fixture
+def open_tools(program, monkeypatch):
+    monkeypatch.setenv('PYBINUTILS_NO_CACHE', '1')
+    return lambda: arch_tools.open_elf(str(program))
+
+# Return {pc: {inlined symbol, ...}} of every pc of the functions of read_inline_info, one pc at a time
+def per_pc_inline_names(tools):
+    functions = tools.read_functions_ranges()
+    res = dict()
+    for func_name, inline_info in tools.read_inline_info().items():
+        base = min(start for start, end in functions[func_name])
+        for start, end in functions[func_name]:
+            for pc in range(start, end):
+                res[pc] = {name for name, offsets in inline_info.items()
+                           if any(lo <= pc - base < hi for lo, hi in offsets)}
+    return res
+
+# Return the range containing pc of the inlined subroutine of frame
+def frame_range(inlined, frame, pc):
+    ranges = [(start, end) for name, ranges, call_file, call_line in inlined
+              if (name, call_file, call_line) == (frame['name'], frame['call_file'], frame['call_line'])
+              for start, end in ranges if start <= pc < end]
+    assert len(ranges) == 1
+    return ranges[0]
+
+def check_stacks(tools, expected, stacks):
+    inlined = tools.read_dwarf_dies()['inlined']
+    for (pc, names), stack in zip(expected.items(), stacks):
+        assert {frame['name'] for frame in stack} == names
+        # No inlined subroutine is its own caller here, so each name is inlined at most once at a pc
+        assert len(stack) == len(names)
+        # Outermost first: the range containing pc of each frame is within the one of its caller
+        ranges = [frame_range(inlined, frame, pc) for frame in stack]
+        for (outer_start, outer_end), (inner_start, inner_end) in zip(ranges, ranges[1:]):
+            assert outer_start <= inner_start and inner_end <= outer_end
+
+def test_inline_stack_matches_read_inline_info(open_tools):
+    expected = per_pc_inline_names(open_tools())
+    assert max(len(names) for names in expected.values()) == 3
+    assert any(len(names) == 1 for names in expected.values())
+    assert any(len(names) == 0 for names in expected.values())
+    pcs = list(expected)
+    # Lazy: only the CUs containing pcs are walked
+    tools = open_tools()
+    stacks = tools.inline_stack(pcs + [0, 2**64 - 1])
+    assert 'subprograms' not in tools._dwarf_state()
+    assert stacks[-2:] == [[], []]
+    check_stacks(tools, expected, stacks)
+    # After all DIEs were walked
+    tools = open_tools()
+    tools.read_dwarf_dies()
+    assert tools.inline_stack(pcs) == stacks[:-2]
+
+def test_inline_stack_nesting(open_tools):
+    tools = open_tools()
+    pcs = list(per_pc_inline_names(tools))
+    depth = {'outer': 0, 'middle': 1, 'leaf': 2}
+    for stack in tools.inline_stack(pcs):
+        names = [frame['name'] for frame in stack]
+        # leaf is inlined alone in f, middle alone in g, outer in f, g and main
+        assert [depth[name] for name in names] == sorted(depth[name] for name in names)
+        if 'leaf' in names and 'middle' not in names:
+            assert names == ['leaf']
+        if 'middle' in names and 'outer' not in names:
+            assert names in (['middle'], ['middle', 'leaf'])
@@ -0,0 +1,121 @@
+import random
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+from elftools.elf.elffile import ELFFile
+
+from arch.arch import arch_tools
+from arch.interval import interval_index
+
+PROGRAM = r'''
+int table[64];
+
+int sum(int n) {
+    int s = 0;
+    for (int i = 0; i < n; i++)
+        s += table[i & 63] > 0 ? table[i & 63] : -table[i & 63];
+    return s;
+}
+
+int main(int argc, char **argv) {
+    for (int i = 0; i < 64; i++)
+        table[i] = argc - i;
+    return sum(argc * 1000);
+}
+'''
+
+# Return [(start, end, label), ...] of count random intervals, some nested in others and some empty
+def random_intervals(rnd, count):
+    intervals = []
+    for _ in range(count):
+        kind = rnd.random()
+        if kind < 0.2 and intervals:
+            start, end, _ = rnd.choice(intervals)
+            start = rnd.randrange(start, end + 1)
+            intervals.append((start, rnd.randrange(start, end + 1), len(intervals)))
+        elif kind < 0.3:
+            start = rnd.randrange(0, 200)
+            intervals.append((start, start, len(intervals)))
+        else:
+            start = rnd.randrange(0, 200)
+            intervals.append((start, start + rnd.randrange(1, 60), len(intervals)))
+    return intervals
+
+def brute_stabbing(intervals, addr):
+    return [idx for idx, (start, end, label) in enumerate(intervals) if start <= addr < end]
+
+def brute_overlapping(intervals, start, end):
+    return [idx for idx, (lo, hi, label) in enumerate(intervals) if lo < end and hi > start]
+
+def test_stabbing_and_overlapping_match_brute_force():
+    rnd = random.Random(0)
+    for _ in range(300):
+        intervals = random_intervals(rnd, rnd.randrange(0, 40))
+        index = interval_index(intervals)
+        # Indexes refer to the intervals ordered by start, ties in input order
+        ordered = sorted(intervals, key=lambda x: x[0])
+        assert index.labels == [label for start, end, label in ordered]
+        addrs = [rnd.randrange(0, 300) for _ in range(100)] + [start for start, end, label in intervals] + \
+            [end for start, end, label in intervals]
+        assert index.stabbing(addrs) == [brute_stabbing(ordered, addr) for addr in addrs]
+        for _ in range(50):
+            start = rnd.randrange(0, 300)
+            end = start + rnd.randrange(0, 40)
+            assert index.overlapping(start, end) == brute_overlapping(ordered, start, end)
+
+def test_lookup_of_disjoint_intervals_matches_brute_force():
+    rnd = random.Random(1)
+    for _ in range(100):
+        bounds = sorted(rnd.sample(range(1000), 2 * rnd.randrange(0, 20)))
+        intervals = [(bounds[i], bounds[i + 1], i // 2) for i in range(0, len(bounds), 2)]
+        index = interval_index(reversed(intervals))
+        addrs = list(range(0, 1001))
+        expected = [(brute_stabbing(intervals, addr) or [-1])[0] for addr in addrs]
+        assert index.lookup(addrs).tolist() == expected
+        assert index.lookup_labels(addrs) == [intervals[idx][2] if idx >= 0 else None for idx in expected]
+
+def test_empty_index():
+    index = interval_index([])
+    assert len(index) == 0
+    assert index.lookup([0, 5]).tolist() == [-1, -1]
+    assert index.stabbing([0, 5]) == [[], []]
+    assert index.overlapping(0, 10) == []
+
+@pytest.fixture(scope='module')
+def program(tmp_path_factory):
+    if shutil.which('gcc') is None or shutil.which('x86_64-linux-gnu-objdump') is None:
+        pytest.skip('gcc and x86_64-linux-gnu-objdump are needed to build and disassemble the test program')
+    tmp_path = tmp_path_factory.mktemp('program')
+    (tmp_path / 'program.c').write_text(PROGRAM)
+    subprocess.run(['gcc', '-g', '-O2', '-o', str(tmp_path / 'program'), str(tmp_path / 'program.c')], check=True)
+    return tmp_path / 'program'
+
+def test_function_index_matches_symbol_table(program, monkeypatch):
+    monkeypatch.setenv('PYBINUTILS_NO_CACHE', '1')
+    with open(program, 'rb') as f:
+        functions = [(symbol['st_value'], symbol['st_value'] + symbol['st_size'], symbol.name)
+                     for symbol in ELFFile(f).get_section_by_name('.symtab').iter_symbols()
+                     if symbol['st_info']['type'] == 'STT_FUNC' and symbol['st_size']]
+    assert {'main', 'sum'} <= {name for start, end, name in functions}
+    index = arch_tools.open_elf(str(program)).function_index()
+    addrs = sorted({addr for start, end, name in functions for addr in (start - 1, start, end - 1, end)})
+    expected = [[name for start, end, name in functions if start <= addr < end] for addr in addrs]
+    assert [[label] if label is not None else [] for label in index.lookup_labels(addrs)] == expected
+
+@pytest.mark.skipif(shutil.which('xed') is None, reason='xed is needed to classify x86 instructions')
+def test_basic_block_index_maps_instructions_to_their_block(program, monkeypatch):
+    monkeypatch.setenv('PYBINUTILS_NO_CACHE', '1')
+    tools = arch_tools.open_elf(str(program))
+    bb, trans_edge = tools.read_basic_blocks(tools.read_textdump())
+    index = tools.basic_block_index(bb)
+    addrs = []
+    expected = []
+    for symbol in bb:
+        for bb_addr, instrs in bb[symbol]['bb'].items():
+            addrs.extend(instrs)
+            expected.extend([(symbol, bb_addr)] * len(instrs))
+    assert len(addrs) > 10
+    assert index.lookup_labels(addrs) == expected
+    assert index.stabbing(addrs) == [[idx] for idx in index.lookup(addrs).tolist()]
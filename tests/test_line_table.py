@@ -0,0 +1,77 @@
+import pickle
+import random
+
+import numpy as np
+
+from arch.line_table import line_table, IS_STMT, END_SEQUENCE, PROLOGUE_END
+
+# Return a line_table of nr_sequences sequences of random rows over files
+def random_table(rnd, files, nr_sequences=20):
+    pcs, file_ids, lines, cols, flags = [], [], [], [], []
+    pc = 0x1000
+    for _ in range(nr_sequences):
+        for _ in range(rnd.randrange(1, 30)):
+            pcs.append(pc)
+            file_ids.append(rnd.randrange(len(files)))
+            lines.append(rnd.randrange(1, 5000))
+            cols.append(rnd.choice([0, 1, 80, 65535, 65536, 1 << 20]))
+            flags.append(rnd.choice([0, IS_STMT, IS_STMT | PROLOGUE_END]))
+            pc += rnd.choice([0, 2, 4, 7])
+        # The next sequence may start at the end of this one
+        pcs.append(pc)
+        file_ids.append(file_ids[-1])
+        lines.append(lines[-1])
+        cols.append(0)
+        flags.append(END_SEQUENCE)
+        pc += rnd.choice([0, 16])
+    return line_table(list(files), pcs, file_ids, lines, cols, flags)
+
+def rows(table):
+    return [(int(table.pcs[row]), table.filenames[table.file_ids[row]], int(table.lines[row]), int(table.cols[row]),
+             int(table.flags[row])) for row in range(len(table.pcs))]
+
+# Return the line_table of rows[lo:hi] of table with its own file list
+def part(table, lo, hi, rnd):
+    used = sorted(set(table.file_ids[lo:hi].tolist()))
+    rnd.shuffle(used)
+    filenames = [table.filenames[file_id] for file_id in used]
+    remap = {file_id: idx for idx, file_id in enumerate(used)}
+    return line_table(filenames, table.pcs[lo:hi], [remap[file_id] for file_id in table.file_ids[lo:hi].tolist()],
+                      table.lines[lo:hi], table.cols[lo:hi], table.flags[lo:hi])
+
+def test_merge_of_parts_round_trips():
+    rnd = random.Random(0)
+    for _ in range(20):
+        table = random_table(rnd, [f'/src/file{idx}.c' for idx in range(8)])
+        cuts = sorted(rnd.sample(range(1, len(table.pcs)), rnd.randrange(0, 6)))
+        bounds = [0] + cuts + [len(table.pcs)]
+        merged = line_table.merge([part(table, lo, hi, rnd) for lo, hi in zip(bounds, bounds[1:])])
+        assert rows(merged) == rows(table)
+        assert dict(merged) == dict(table)
+        assert merged.cols.dtype == np.uint32
+        addrs = np.arange(0xff0, int(table.pcs[-1]) + 8)
+        assert np.array_equal(np.where(merged.lookup(addrs) >= 0, merged.lines[merged.lookup(addrs)], 0),
+                              np.where(table.lookup(addrs) >= 0, table.lines[table.lookup(addrs)], 0))
+
+def test_merge_keeps_table_order_at_the_same_pc():
+    first = line_table(['a.c'], [0x10, 0x20], [0, 0], [1, 2], [0, 0], [IS_STMT, END_SEQUENCE])
+    second = line_table(['b.c', 'a.c'], [0x10, 0x18], [0, 1], [7, 3], [5, 70000], [IS_STMT, IS_STMT])
+    merged = line_table.merge([first, second])
+    assert merged.filenames == ['a.c', 'b.c']
+    assert rows(merged) == [(0x10, 'a.c', 1, 0, IS_STMT), (0x10, 'b.c', 7, 5, IS_STMT), (0x18, 'a.c', 3, 70000, IS_STMT),
+                            (0x20, 'a.c', 2, 0, END_SEQUENCE)]
+
+def test_merge_of_nothing():
+    for merged in (line_table.merge([]), line_table.merge([line_table([], [], [], [], [], [])])):
+        assert len(merged.pcs) == 0 and len(merged) == 0
+        assert merged.cols.dtype == np.uint32
+        assert merged.lookup([0x10]).tolist() == [-1]
+
+def test_pickle_round_trip():
+    table = random_table(random.Random(1), ['x.c', 'y.h'])
+    # Build the file index, it must not be pickled
+    dict(table)
+    loaded = pickle.loads(pickle.dumps(table))
+    assert loaded.index is None
+    assert rows(loaded) == rows(table)
+    assert dict(loaded) == dict(table)
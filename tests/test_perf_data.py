@@ -0,0 +1,60 @@
+import collections
+import shutil
+
+import pytest
+
+import perf_fixture
+from analyze.perfutil import perf_data, extract_perf_native, aggregate_perf_script, perf_script_lines
+
+FIXTURE = perf_fixture.DATA_DIR / 'perf.data'
+EXPECTED = perf_fixture.DATA_DIR / 'perf.data.script'
+
+# Return a Counter of (pid, time in us, event, pc, period, dso) of perf script output lines
+def script_samples(lines):
+    res = collections.Counter()
+    for line in lines:
+        head, tail = line.split(':', 1)
+        head = head.split()
+        tail = tail.split()
+        sec, usec = head[-1].split('.')
+        res[(int(head[-2]), int(sec) * 10**6 + int(usec), tail[1][:-1], int(tail[2], 16), int(tail[0]), tail[-1][1:-1])] += 1
+    return res
+
+def test_fixture_is_up_to_date(tmp_path):
+    perf_fixture.main(tmp_path)
+    assert (tmp_path / 'perf.data').read_bytes() == FIXTURE.read_bytes()
+    assert (tmp_path / 'perf.data.script').read_text() == EXPECTED.read_text()
+
+def test_samples_match_perf_script():
+    data = perf_data(str(FIXTURE))
+    dsos, dso_ids, addrs = data.resolve()
+    assert data.timed
+    assert data.events == [name for _, _, _, name in perf_fixture.EVENTS]
+    samples = data.samples
+    # The DSOs of the fixture do not exist, their samples keep their runtime pc like in perf script
+    assert (addrs == samples['pc']).all()
+    native = collections.Counter(zip(samples['pid'].tolist(), (samples['time'] // 1000).tolist(),
+                                     [data.events[event] for event in samples['event'].tolist()],
+                                     samples['pc'].tolist(), samples['period'].tolist(),
+                                     [dsos[dso_id] for dso_id in dso_ids.tolist()]))
+    with open(EXPECTED) as f:
+        assert native == script_samples(f)
+
+def test_extract_perf_native_matches_perf_script_aggregation():
+    with open(EXPECTED) as f:
+        expected = aggregate_perf_script(f)
+    assert extract_perf_native(str(FIXTURE)) == expected
+    assert set(expected['pc']) == {'/opt/fixture/prog', '/opt/fixture/worker', '/opt/fixture/libfoo.so',
+                                   '/opt/fixture/libbar.so', '[vdso]', '[kernel.kallsyms]', '[unknown]'}
+
+@pytest.mark.skipif(shutil.which('perf') is None, reason='perf is not installed')
+def test_perf_script_matches_fixture():
+    with open(EXPECTED) as f:
+        expected = script_samples(f)
+    assert script_samples(perf_script_lines(str(FIXTURE))) == expected
+
+def test_compressed_records_are_rejected(tmp_path):
+    path = tmp_path / 'perf.data'
+    path.write_bytes(perf_fixture.perf_data_bytes(perf_fixture.SIDEBAND + [(10, 'compressed', bytes(8))]))
+    with pytest.raises(Exception, match='Compressed'):
+        perf_data(str(path))
@@ -0,0 +1,103 @@
+import os
+import sys
+
+import pytest
+
+import perf_fixture
+from analyze import perfutil
+from analyze.perfutil import aggregate_perf_script, merge_perf_counts, perf_script_lines, perf_time_slices
+
+FIXTURE = perf_fixture.DATA_DIR / 'perf.data'
+
+# Stand-in for perf script: prints the <file>.script next to the -i file, only the samples within
+# --time start,end (both ends included, like perf), and fails after its output when $FAKE_PERF_FAIL
+# is 'all' or the --time argument
+FAKE_PERF = r'''#!{python}
+import sys, os
+args = sys.argv[1:]
+file = args[args.index('-i') + 1]
+time_range = args[args.index('--time') + 1] if '--time' in args else None
+with open(file + '.script') as f:
+    for line in f:
+        if time_range is not None:
+            start, end = [int(bound.replace('.', '')) for bound in time_range.split(',')]
+            sec, usec = line.split(':', 1)[0].split()[-1].split('.')
+            if not start <= int(sec) * 10**9 + int(usec) * 1000 <= end:
+                continue
+        sys.stdout.write(line)
+if os.environ.get('FAKE_PERF_FAIL', '') in ('all', time_range):
+    sys.stderr.write(f'failed to process {{time_range}}\n')
+    sys.exit(2)
+'''
+
+@pytest.fixture
+def fake_perf(tmp_path, monkeypatch):
+    perf = tmp_path / 'bin' / 'perf'
+    perf.parent.mkdir()
+    perf.write_text(FAKE_PERF.format(python=sys.executable))
+    perf.chmod(0o755)
+    monkeypatch.setenv('PATH', f"{perf.parent}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv('PYBINUTILS_PERF_READER', 'perf')
+    monkeypatch.delenv('FAKE_PERF_FAIL', raising=False)
+    return perf
+
+def test_perf_script_lines_streams_perf_output(fake_perf):
+    assert list(perf_script_lines(str(FIXTURE))) == perf_fixture.perf_script_lines()
+
+def test_perf_script_failure_is_raised_with_its_stderr(fake_perf, monkeypatch):
+    monkeypatch.setenv('FAKE_PERF_FAIL', 'all')
+    lines = perf_script_lines(str(FIXTURE))
+    with pytest.raises(Exception, match=r'exit code 2\): failed to process None'):
+        aggregate_perf_script(lines)
+    with pytest.raises(Exception, match='failed to process'):
+        perfutil.extract_perf(str(FIXTURE), jobs=1)
+
+def test_perf_script_lines_closed_early_does_not_raise(fake_perf, monkeypatch):
+    monkeypatch.setenv('FAKE_PERF_FAIL', 'all')
+    lines = perf_script_lines(str(FIXTURE))
+    assert next(lines) == perf_fixture.perf_script_lines()[0]
+    lines.close()
+
+# Return the (first, last) sample time in ns of the fixture, which has no HEADER_SAMPLE_TIME feature
+def fixture_time_span():
+    times = [time for time, pid, event, pc, period in perf_fixture.samples()]
+    return (perf_fixture.START_NS + min(times) * 1000, perf_fixture.START_NS + max(times) * 1000)
+
+# Return the lines of perf script output within a perf_time_slices slice, both ends included
+def slice_lines(lines, time_range):
+    start, end = [int(bound.replace('.', '')) for bound in time_range.split(',')]
+    res = []
+    for line in lines:
+        sec, usec = line.split(':', 1)[0].split()[-1].split('.')
+        if start <= int(sec) * 10**9 + int(usec) * 1000 <= end:
+            res.append(line)
+    return res
+
+@pytest.mark.parametrize('nr', [1, 2, 3, 7, 1000])
+def test_sliced_aggregation_equals_unsliced(nr):
+    lines = perf_fixture.perf_script_lines()
+    slices = perf_time_slices(*fixture_time_span(), nr)
+    parts = [slice_lines(lines, time_range) for time_range in slices]
+    # Every sample falls in exactly one slice
+    assert sorted(line for part in parts for line in part) == sorted(lines)
+    res = {'pc': dict(), 'symbol': dict(), 'symbol_offset': dict(), 'aslr_map': dict()}
+    for part in parts:
+        merge_perf_counts(res, aggregate_perf_script(part, flush_lines=7))
+    assert res == aggregate_perf_script(lines)
+
+@pytest.fixture
+def parallel_perf(fake_perf, monkeypatch):
+    monkeypatch.setattr(perfutil, 'PARALLEL_PERF_MIN_SIZE', 0)
+    monkeypatch.setattr(perfutil, 'perf_time_span', lambda file: fixture_time_span())
+
+def test_parallel_extract_perf_equals_serial(parallel_perf):
+    res = perfutil.extract_perf(str(FIXTURE), jobs=3)
+    assert res == perfutil.extract_perf(str(FIXTURE), jobs=1)
+    assert sum(sum(counts.values()) for events in res['pc'].values() for counts in events.values()) == \
+        sum(period for time, pid, event, pc, period in perf_fixture.samples())
+
+def test_parallel_extract_perf_raises_slice_failures(parallel_perf, monkeypatch):
+    time_range = perf_time_slices(*fixture_time_span(), 3)[1]
+    monkeypatch.setenv('FAKE_PERF_FAIL', time_range)
+    with pytest.raises(Exception, match=f'--time {time_range} .*failed to process {time_range}'):
+        perfutil.extract_perf(str(FIXTURE), jobs=3)
@@ -0,0 +1,69 @@
+from arch.riscv64_decoder import riscv64_decoder
+from reference_disassembly import assemble, reference_disassembly, operand_tokens, decode
+
+RISCV64_MATTR = '+m,+a,+f,+d,+c,+v,+zba,+zbb,+zbs'
+RISCV64_SNIPPET = '''
+f:
+    addi a0, a1, -12
+    lui t0, 0x12345
+    auipc ra, 0
+    ld s0, 16(sp)
+    sd ra, -8(s0)
+    lw a2, 0(a3)
+    lwu a2, 4(a3)
+    slli a0, a0, 3
+    srai a1, a1, 63
+    addw a0, a1, a2
+    sraiw a0, a0, 31
+    mul a0, a1, a2
+    divu a3, a4, a5
+    lr.d.aqrl a0, (a1)
+    amoadd.w a0, a1, (a2)
+    fadd.d fa0, fa1, fa2
+    fmadd.s fa0, fa1, fa2, fa3, rtz
+    fcvt.w.d a0, fa0, rtz
+    fld fs0, 8(sp)
+    fsw fa1, -4(s1)
+    fence rw, rw
+    fence.i
+    csrrs a0, fcsr, zero
+    beq a0, a1, f
+    bltu t0, t1, f
+    jal ra, f
+    jalr zero, 0(ra)
+    sh1add a0, a1, a2
+    rev8 a0, a1
+    bexti a0, a1, 5
+    vsetvli t0, a0, e32, m1, ta, ma
+    vle32.v v1, (a0)
+    vadd.vv v1, v2, v3
+    c.addi a0, 1
+    c.addiw a2, -1
+    c.addi4spn a3, sp, 1020
+    c.li a1, -3
+    c.ldsp ra, 8(sp)
+    c.sdsp s0, 0(sp)
+    c.mv a0, a1
+    c.jr ra
+    c.beqz a0, f
+    c.j f
+'''
+# fence with rd set, fadd.s with rm=5, c.lwsp, c.jr and c.addiw with rd=0, c.addi4spn with a zero immediate
+RISCV64_RESERVED = [(0x0ff0008f, 4), (0x00c5d553, 4), (0x4002, 2), (0x8002, 2), (0x2005, 2), (0x0004, 2)]
+
+def test_riscv64_decoder_matches_objdump(tmp_path):
+    obj = assemble(tmp_path, 'riscv64', RISCV64_MATTR, RISCV64_SNIPPET)
+    reference, llvm = reference_disassembly(obj, 'riscv64-linux-gnu-objdump', ['-M', 'no-aliases'], RISCV64_MATTR)
+    decoded = decode(riscv64_decoder(), obj)
+    assert decoded.keys() == reference.keys()
+    for addr, (mnemonic, operands) in reference.items():
+        tokens = operand_tokens(operands)
+        # GNU omits the default dynamic rounding mode
+        if llvm and tokens and tokens[-1] == 'dyn':
+            tokens.pop()
+        assert (decoded[addr][0], operand_tokens(decoded[addr][1])) == (mnemonic, tokens), hex(addr)
+
+def test_riscv64_reserved_encodings_are_not_instructions():
+    decoder = riscv64_decoder()
+    for x, length in RISCV64_RESERVED:
+        assert decoder.disassemble(x, length, 0, hex) == ('.insn', f'{length}, {hex(x)}')
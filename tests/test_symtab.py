@@ -0,0 +1,71 @@
+import shutil
+import subprocess
+
+import pytest
+from elftools.elf.elffile import ELFFile
+
+from arch.elf_image import elf_image
+from arch.symtab import symbol_table
+
+PROGRAM = r'''
+static int counter;
+static void bump(void) { counter++; }
+int sum(int n) { int s = 0; for (int i = 0; i < n; i++) { bump(); s += i; } return s; }
+int main(int argc, char **argv) { return sum(argc) + counter; }
+'''
+
+@pytest.fixture(scope='module')
+def program(tmp_path_factory):
+    if shutil.which('gcc') is None:
+        pytest.skip('gcc is needed to build the test program')
+    tmp_path = tmp_path_factory.mktemp('program')
+    (tmp_path / 'program.c').write_text(PROGRAM)
+    subprocess.run(['gcc', '-g', '-O0', '-o', str(tmp_path / 'program'), str(tmp_path / 'program.c')], check=True)
+    return tmp_path / 'program'
+
+# Return [(name, value, size, type), ...] of the named, non-zero symbols of all symbol tables by pyelftools
+def elftools_symbols(path):
+    with open(path, 'rb') as f:
+        elf = ELFFile(f)
+        return [(symbol.name, symbol['st_value'], symbol['st_size'], symbol['st_info']['type'])
+                for section in elf.iter_sections() if section['sh_type'] in ('SHT_SYMTAB', 'SHT_DYNSYM')
+                for symbol in section.iter_symbols() if symbol.name and symbol['st_value']]
+
+def table_symbols(symtab):
+    return [(symtab.name(row), int(symtab.values[row]), int(symtab.sizes[row]), symtab.entry(row)['type'])
+            for row in range(len(symtab.values))]
+
+def test_symbols_match_pyelftools(program):
+    image = elf_image(str(program))
+    try:
+        symtab = symbol_table(image)
+        symbols = table_symbols(symtab)
+        assert symbols == elftools_symbols(program)
+        assert {'main', 'sum', 'bump', 'counter'} <= set(symtab)
+        assert sorted(symtab) == sorted({name for name, value, size, type in symbols})
+    finally:
+        image.close()
+
+def test_name_at_the_end_of_an_unterminated_strtab(program, tmp_path):
+    corrupt = tmp_path / 'corrupt'
+    shutil.copy(program, corrupt)
+    with open(program, 'rb') as f:
+        strtab = ELFFile(f).get_section_by_name('.strtab')
+        offset = strtab['sh_offset']
+        data = strtab.data()
+    # The last name of .strtab loses its terminating NUL
+    last = data.rindex(b'\0', 0, len(data) - 1) + 1
+    with open(corrupt, 'r+b') as f:
+        f.seek(offset + len(data) - 1)
+        f.write(b'X')
+    image = elf_image(str(corrupt))
+    try:
+        symtab = symbol_table(image)
+        rows = [row for row in range(len(symtab.values)) if symtab.strtabs[symtab.strtab_ids[row]].nbytes == len(data)
+                and symtab.name_offsets[row] == last]
+        assert rows
+        expected = data[last:-1].decode() + 'X'
+        assert [symtab.name(row) for row in rows] == [expected] * len(rows)
+        assert expected in symtab
+    finally:
+        image.close()
@@ -0,0 +1,62 @@
+import shutil
+import subprocess
+
+import pytest
+
+import arch.arch
+from arch.arch import arch_tools
+
+# Functions with loops, calls and a jump table so that objdump draws jumps in most of them
+FUNCTION = r'''
+int f{idx}(int x) {{
+    int s = 0;
+    for (int i = 0; i < x; i++) {{
+        switch ((i + {idx}) % 5) {{
+        case 0: s += i; break;
+        case 1: s ^= x; break;
+        case 2: s -= {idx}; break;
+        case 3: s = s * 3 + 1; break;
+        default: s >>= 1;
+        }}
+    }}
+    return s + (x > {idx} ? f{prev}(x - 1) : 0);
+}}
+'''
+
+@pytest.fixture(scope='module')
+def program(tmp_path_factory):
+    if shutil.which('gcc') is None or shutil.which('x86_64-linux-gnu-objdump') is None:
+        pytest.skip('gcc and x86_64-linux-gnu-objdump are needed to build and disassemble the test program')
+    tmp_path = tmp_path_factory.mktemp('program')
+    source = 'int f0(int x) { return x; }\n' + ''.join(FUNCTION.format(idx=idx, prev=idx - 1) for idx in range(1, 40))
+    source += 'int main(int argc, char **argv) { return f39(argc); }\n'
+    (tmp_path / 'program.c').write_text(source)
+    subprocess.run(['gcc', '-O1', '-fno-inline', '-o', str(tmp_path / 'program'), str(tmp_path / 'program.c')], check=True)
+    return tmp_path / 'program'
+
+def textdump_rows(textdump):
+    return [(symbol, textdump[symbol]['addr'], [(addr, tuple(instr)) for addr, instr in textdump[symbol]['instr'].items()])
+            for symbol in textdump]
+
+@pytest.fixture
+def tools(program, monkeypatch):
+    monkeypatch.setenv('PYBINUTILS_NO_CACHE', '1')
+    # Cut the small .text of the program into several chunks
+    monkeypatch.setattr(arch.arch, 'PARALLEL_CHUNK_MIN_SIZE', 256)
+    return arch_tools.open_elf(str(program))
+
+def test_parallel_textdump_equals_serial(tools):
+    assert len(tools._disassembly_jobs(4)) > 3
+    serial = tools.read_textdump(jobs=1)
+    assert {'main', 'f1', 'f39'} <= set(serial)
+    assert textdump_rows(tools.read_textdump(jobs=4)) == textdump_rows(serial)
+
+def test_parallel_symbol_textdump_equals_serial(tools):
+    symbols = ['f3', 'f17', 'f18', 'main', 'missing']
+    assert len(tools._disassembly_jobs(4, symbols)) == 4
+    serial = tools.read_textdump(jobs=1, symbols=symbols)
+    assert list(serial) == ['f3', 'f17', 'f18', 'main']
+    assert textdump_rows(tools.read_textdump(jobs=4, symbols=symbols)) == textdump_rows(serial)
+    # The same instructions as in the full disassembly
+    full = tools.read_textdump(jobs=1)
+    assert textdump_rows(serial) == textdump_rows({symbol: full[symbol] for symbol in serial})
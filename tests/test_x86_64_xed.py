@@ -0,0 +1,76 @@
+import json
+import random
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from arch.insn import instr_store, instr_view
+from arch.x86_64 import x86_64_tools
+
+# Stand-in for `xed -64 -isa-set -ir file`: decodes file sequentially with the encodings of $FAKE_XED_TABLE
+# ({hex: [extension, isa set]}), printing an XDIS line per instruction, and like xed skips one byte
+# where none matches
+FAKE_XED = r'''#!{python}
+import json, os, sys
+table = json.load(open(os.environ['FAKE_XED_TABLE']))
+data = open(sys.argv[-1], 'rb').read()
+pos = 0
+while pos < len(data):
+    for hex_digits, (extension, isa_set) in table.items():
+        if data[pos:pos + len(hex_digits) // 2] == bytes.fromhex(hex_digits):
+            print(f'XDIS {{pos:x}}: INSN {{extension}} {{isa_set}} {{hex_digits.upper()}} insn')
+            pos += len(hex_digits) // 2
+            break
+    else:
+        print('ERROR: GENERAL_ERROR Could not decode at offset')
+        pos += 1
+'''
+
+# Extensions of translate_isa_type with a fixed class list, whatever the isa set
+EXTENSIONS = {'AES': ['aes'], 'AVX': ['avx'], 'AVX2': ['avx2'], 'ADOX_ADCX': ['adx'], '3DNOW': ['3dnow']}
+
+PROGRAM = 'int main(void) { return 0; }\n'
+
+@pytest.fixture
+def tools(tmp_path, monkeypatch):
+    if shutil.which('gcc') is None:
+        pytest.skip('gcc is needed to build an x86-64 ELF')
+    (tmp_path / 'program.c').write_text(PROGRAM)
+    subprocess.run(['gcc', '-o', str(tmp_path / 'program'), str(tmp_path / 'program.c')], check=True)
+    xed = tmp_path / 'xed'
+    xed.write_text(FAKE_XED.format(python=sys.executable))
+    xed.chmod(0o755)
+    monkeypatch.setenv('PYBINUTILS_NO_CACHE', '1')
+    return x86_64_tools(str(tmp_path / 'program'), xed_cmd=str(xed))
+
+def use_table(tmp_path, monkeypatch, table):
+    path = tmp_path / 'table.json'
+    path.write_text(json.dumps({code.hex(): [extension, extension] for code, extension in table.items()}))
+    monkeypatch.setenv('FAKE_XED_TABLE', str(path))
+
+def test_classify_resynchronizes_after_undecodable_encodings(tools, tmp_path, monkeypatch):
+    rnd = random.Random(0)
+    known = {bytes([0x00, 0x00]): 'AES', bytes([0x90]): 'AVX', bytes([0x48, 0x89, 0xe5]): 'AVX2',
+             bytes([0x0f, 0x0b]): 'ADOX_ADCX', bytes([0x00, 0xc4, 0x90]): '3DNOW'}
+    use_table(tmp_path, monkeypatch, known)
+    # Undecodable encodings, some starting like known ones so that xed resumes misaligned after them
+    unknown = [bytes([0x48]), bytes([0x0f, 0x00]), bytes([0x48, 0x89]), bytes([0x00]), bytes([0xc4, 0x90, 0x00]),
+               bytes([0x90, 0x90]), bytes([0x00, 0x00, 0x90])]
+    for _ in range(20):
+        codes = list(known) + unknown
+        rnd.shuffle(codes)
+        res = dict(tools._x86_64_tools__classify(codes))
+        assert res == {code: EXTENSIONS[known[code]] if code in known else None for code in codes}
+
+def test_classes_of_encodings_with_leading_zero_bytes(tools, tmp_path, monkeypatch):
+    # 00 05 and 05 are the same integer
+    use_table(tmp_path, monkeypatch, {bytes([0x00, 0x05]): 'AES', bytes([0x05]): 'AVX'})
+    store = instr_store()
+    for addr, hex_digits in [(0, '0005'), (2, '05'), (3, '0005'), (5, 'c3')]:
+        store.append(addr, hex_digits, 'insn', None)
+    textdump = {'f': {'addr': 0, 'instr': instr_view(store, 0, len(store))}}
+    tools.prepare_insn_class(textdump)
+    assert tools.get_insn_classes(store, range(len(store))) == [['aes'], ['avx'], ['aes'], None]
+    assert [tools.get_insn_class_by_instr(store.record(row)) for row in range(len(store))] == [['aes'], ['avx'], ['aes'], None]